@@ -0,0 +1,111 @@
+from typing import Any, Dict, Optional
+import docker
+
+from domain.repositories.message_repository import MessageRepository
+from domain.repositories.session_repository import SessionRepository
+from application.services.ai_service import AIService
+from application.services.chat_service import ChatService
+from application.services.chat_stream_service import ChatStreamService, chat_stream_service
+from application.services.sandbox_service import SandboxService
+from application.services.session_service import SessionService
+from application.services.tool_engine import ToolExecutionEngine
+from infrastructure.batch_writer import batch_writer
+from infrastructure.config import get_settings
+from infrastructure.database import init_database, close_database
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.http_client import upstream_clients
+from infrastructure.redis_client import redis_client
+from infrastructure.repositories.cached_session_repository import CachedSessionRepository
+from infrastructure.repositories.mongodb_message_repository import MongoDBMessageRepository
+from infrastructure.repositories.mongodb_session_repository import MongoDBSessionRepository
+from infrastructure.repositories.mongodb_tool_repository import MongoDBToolRepository
+from infrastructure.session_cache import session_cache
+from infrastructure.session_stream_broker import session_stream_broker
+from infrastructure.tool_result_cache import tool_result_cache
+from infrastructure.vnc_relay import vnc_relay_metrics
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+class ServiceContainer:
+    """App-lifetime owner of shared clients, repositories and services.
+
+    Built once in the FastAPI lifespan and exposed on app.state, so requests reuse
+    the same objects instead of constructing them per call.
+    """
+
+    def __init__(self):
+        self.docker_client: Optional[docker.DockerClient] = None
+        self.docker_executor = DockerExecutor()
+        self.session_repo: Optional[SessionRepository] = None
+        self.message_repo: Optional[MessageRepository] = None
+        self.ai_service: Optional[AIService] = None
+        self.session_service: Optional[SessionService] = None
+        self.chat_service: Optional[ChatService] = None
+        self.chat_stream_service: ChatStreamService = chat_stream_service
+        self.sandbox_service: Optional[SandboxService] = None
+        self.tool_engine: Optional[ToolExecutionEngine] = None
+
+    async def startup(self):
+        """Connect shared clients, then wire repositories and services"""
+        await init_database()
+        await redis_client.connect()
+        await upstream_clients.connect()
+        await session_stream_broker.start()
+        await batch_writer.start()
+        await session_cache.start()
+
+        try:
+            self.docker_client = docker.from_env()
+        except Exception as e:
+            logger.error("Docker is not available, sandbox tools are disabled", error=str(e))
+
+        self.session_repo = MongoDBSessionRepository()
+        if settings.session_cache_enabled:
+            self.session_repo = CachedSessionRepository(self.session_repo)
+        self.message_repo = MongoDBMessageRepository()
+
+        if self.docker_client is not None:
+            self.sandbox_service = SandboxService(self.docker_client, self.docker_executor)
+            await self.sandbox_service.start()
+
+        self.ai_service = AIService()
+        self.session_service = SessionService(self.session_repo, self.message_repo, self.sandbox_service)
+        self.tool_engine = ToolExecutionEngine(self.sandbox_service, MongoDBToolRepository())
+        self.chat_service = ChatService(self.message_repo, self.ai_service, self.session_service, self.tool_engine)
+
+        logger.info("Service container started")
+
+    async def shutdown(self):
+        """Stop background work, flush pending writes and close shared clients"""
+        await self.chat_stream_service.close()
+        await session_stream_broker.close()
+        await batch_writer.close()
+        await session_cache.close()
+        await upstream_clients.close()
+        if self.sandbox_service is not None:
+            await self.sandbox_service.close()
+        self.docker_executor.close()
+        if self.docker_client is not None:
+            self.docker_client.close()
+        await close_database()
+        await redis_client.close()
+        logger.info("Service container stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "upstream": upstream_clients.stats(),
+            "session_cache": session_cache.stats(),
+            "batch_writer": batch_writer.stats(),
+            "docker": self.docker_executor.stats(),
+            "warm_pool": self.sandbox_service.warm_pool.stats() if self.sandbox_service and self.sandbox_service.warm_pool else None,
+            "sandbox_registry": self.sandbox_service.registry.stats() if self.sandbox_service else None,
+            "sandbox_reaper": self.sandbox_service.reaper.stats() if self.sandbox_service else None,
+            "shells": self.sandbox_service.shells.stats() if self.sandbox_service else None,
+            "file_cache": self.sandbox_service.file_cache.stats() if self.sandbox_service else None,
+            "snapshots": self.sandbox_service.snapshots.stats() if self.sandbox_service and self.sandbox_service.snapshots else None,
+            "vnc_relay": vnc_relay_metrics.stats(),
+            "tools": self.tool_engine.stats() if self.tool_engine else None,
+            "tool_result_cache": tool_result_cache.stats()
+        }
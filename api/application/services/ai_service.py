@@ -1,7 +1,7 @@
-import httpx
 import json
-from typing import AsyncGenerator, Dict, Any
+from typing import AsyncGenerator, Dict, Any, List, Optional
 from infrastructure.config import get_settings
+from infrastructure.http_client import upstream_clients
 import structlog
 
 logger = structlog.get_logger()
@@ -12,15 +12,23 @@ class AIService:
         self.openai_api_key = settings.openai_api_key
         self.gemini_api_key = settings.gemini_api_key
     
-    async def generate_streaming_response(self, message: str) -> AsyncGenerator[Dict[str, Any], None]:
-        """Generate streaming AI response"""
+    async def generate_streaming_response(
+        self,
+        message: str,
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Generate streaming AI response.
+
+        With tools, the model may also call them; the calls are yielded once, after
+        the text, as {"type": "tool_calls", "calls": [{"id", "name", "arguments"}]}.
+        """
         try:
             # Use Gemini through OpenAI-compatible API
             if self.gemini_api_key:
-                async for chunk in self._generate_gemini_response(message):
+                async for chunk in self._generate_gemini_response(message, tools):
                     yield chunk
             elif self.openai_api_key:
-                async for chunk in self._generate_openai_response(message):
+                async for chunk in self._generate_openai_response(message, tools):
                     yield chunk
             else:
                 # Fallback to mock response
@@ -31,7 +39,7 @@ class AIService:
             logger.error("AI service error", error=str(e))
             yield {"type": "error", "data": {"error": str(e)}}
     
-    async def _generate_gemini_response(self, message: str) -> AsyncGenerator[Dict[str, Any], None]:
+    async def _generate_gemini_response(self, message: str, tools: Optional[List[Dict[str, Any]]]) -> AsyncGenerator[Dict[str, Any], None]:
         """Generate response using Gemini API"""
         try:
             # Gemini through OpenAI-compatible endpoint
@@ -45,33 +53,24 @@ class AIService:
                 "messages": [{"role": "user", "content": message}],
                 "stream": True
             }
+            if tools:
+                payload["tools"] = tools
             
-            async with httpx.AsyncClient() as client:
-                async with client.stream(
-                    "POST",
-                    "https://generativelanguage.googleapis.com/v1beta/openai/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data == "[DONE]":
-                                break
-                            try:
-                                chunk = json.loads(data)
-                                if chunk.get("choices") and chunk["choices"][0].get("delta"):
-                                    content = chunk["choices"][0]["delta"].get("content", "")
-                                    if content:
-                                        yield {"type": "message", "content": content}
-                            except json.JSONDecodeError:
-                                continue
+            client = upstream_clients.get("gemini")
+            async with client.stream(
+                "POST",
+                "/openai/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
+                async for chunk in self._parse_stream(response):
+                    yield chunk
                                 
         except Exception as e:
             logger.error("Gemini API error", error=str(e))
             yield {"type": "error", "data": {"error": str(e)}}
     
-    async def _generate_openai_response(self, message: str) -> AsyncGenerator[Dict[str, Any], None]:
+    async def _generate_openai_response(self, message: str, tools: Optional[List[Dict[str, Any]]]) -> AsyncGenerator[Dict[str, Any], None]:
         """Generate response using OpenAI API"""
         try:
             headers = {
@@ -84,32 +83,52 @@ class AIService:
                 "messages": [{"role": "user", "content": message}],
                 "stream": True
             }
+            if tools:
+                payload["tools"] = tools
             
-            async with httpx.AsyncClient() as client:
-                async with client.stream(
-                    "POST",
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data == "[DONE]":
-                                break
-                            try:
-                                chunk = json.loads(data)
-                                if chunk.get("choices") and chunk["choices"][0].get("delta"):
-                                    content = chunk["choices"][0]["delta"].get("content", "")
-                                    if content:
-                                        yield {"type": "message", "content": content}
-                            except json.JSONDecodeError:
-                                continue
+            client = upstream_clients.get("openai")
+            async with client.stream(
+                "POST",
+                "/chat/completions",
+                headers=headers,
+                json=payload
+            ) as response:
+                async for chunk in self._parse_stream(response):
+                    yield chunk
                                 
         except Exception as e:
             logger.error("OpenAI API error", error=str(e))
             yield {"type": "error", "data": {"error": str(e)}}
     
+    async def _parse_stream(self, response: Any) -> AsyncGenerator[Dict[str, Any], None]:
+        """Text deltas of an OpenAI-style SSE stream, then any tool calls it assembled"""
+        # Tool call names and arguments arrive in fragments keyed by the call's index
+        calls: Dict[int, Dict[str, Any]] = {}
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if not chunk.get("choices") or not chunk["choices"][0].get("delta"):
+                continue
+            delta = chunk["choices"][0]["delta"]
+            content = delta.get("content", "")
+            if content:
+                yield {"type": "message", "content": content}
+            for fragment in delta.get("tool_calls") or []:
+                call = calls.setdefault(fragment.get("index", len(calls)), {"id": None, "name": "", "arguments": ""})
+                call["id"] = fragment.get("id") or call["id"]
+                function = fragment.get("function") or {}
+                call["name"] += function.get("name") or ""
+                call["arguments"] += function.get("arguments") or ""
+        if calls:
+            yield {"type": "tool_calls", "calls": [calls[index] for index in sorted(calls)]}
+    
     async def _generate_mock_response(self, message: str) -> AsyncGenerator[Dict[str, Any], None]:
         """Generate mock response for testing"""
         import asyncio
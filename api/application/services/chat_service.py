@@ -1,27 +1,57 @@
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, List, Optional
 import uuid
-import json
 from datetime import datetime
 
-from domain.entities.message import MessageEntity, MessageType, ChatRequest, ChatEvent
+from domain.entities.message import MessageEntity, MessageType, ChatRequest
 from domain.entities.session import SessionEntity
+from domain.entities.tool import ToolEntity
 from domain.repositories.message_repository import MessageRepository
 from infrastructure.repositories.mongodb_message_repository import MongoDBMessageRepository
 from application.services.ai_service import AIService
 from application.services.session_service import SessionService
+from application.services.stream_coalescer import coalesce_message_chunks
+from application.services.tool_engine import ToolExecutionEngine
+from infrastructure.config import get_settings
+from infrastructure.batch_writer import batch_writer
+from infrastructure import sse_encoder
 import structlog
 
 logger = structlog.get_logger()
+settings = get_settings()
+
+# Plan and step frames never change apart from their timestamp, so serialize them once
+PLAN_FRAME = sse_encoder.static_frame("plan", {
+    "steps": [
+        {"id": "analyze", "description": "Analyzing your request", "status": "running"},
+        {"id": "generate", "description": "Generating response", "status": "pending"},
+        {"id": "complete", "description": "Finalizing response", "status": "pending"}
+    ]
+})
+ANALYZE_COMPLETED_FRAME = sse_encoder.static_frame("step", {"step_id": "analyze", "status": "completed"})
+GENERATE_RUNNING_FRAME = sse_encoder.static_frame("step", {"step_id": "generate", "status": "running"})
+GENERATE_COMPLETED_FRAME = sse_encoder.static_frame("step", {"step_id": "generate", "status": "completed"})
+COMPLETE_COMPLETED_FRAME = sse_encoder.static_frame("step", {"step_id": "complete", "status": "completed"})
+DONE_FRAME = sse_encoder.static_frame("done", {"message": "Conversation completed successfully"})
 
 class ChatService:
-    def __init__(self):
-        self.message_repo: MessageRepository = MongoDBMessageRepository()
-        self.ai_service = AIService()
-        self.session_service = SessionService()
+    def __init__(
+        self,
+        message_repo: Optional[MessageRepository] = None,
+        ai_service: Optional[AIService] = None,
+        session_service: Optional[SessionService] = None,
+        tool_engine: Optional[ToolExecutionEngine] = None
+    ):
+        self.message_repo: MessageRepository = message_repo or MongoDBMessageRepository()
+        self.ai_service = ai_service or AIService()
+        self.session_service = session_service or SessionService()
+        self.tool_engine = tool_engine
     
-    async def process_chat_message(self, session_id: str, request: ChatRequest) -> AsyncGenerator[str, None]:
+    async def process_chat_message(self, session_id: str, request: ChatRequest) -> AsyncGenerator[bytes, None]:
         """Process chat message and return SSE stream"""
         try:
+            # The first message sets the title; check before saving so the count stays O(1)
+            is_first_message = not await self._has_messages(session_id)
+            
             # Save user message
             user_message = MessageEntity(
                 message_id=str(uuid.uuid4()),
@@ -31,64 +61,49 @@ class ChatService:
                 timestamp=datetime.utcnow(),
                 event_id=request.event_id
             )
-            await self.message_repo.create(user_message)
+            await self._save_message(user_message)
             
             # Update session with latest message
             await self.session_service.update_session_message(session_id, request.message)
             
             # Send title event (first message sets title)
-            messages = await self.message_repo.get_by_session_id(session_id)
-            if len(messages) <= 1:
+            if is_first_message:
                 title = request.message[:50] + "..." if len(request.message) > 50 else request.message
-                event = ChatEvent(event="title", data={"title": title})
-                yield f"event: title\ndata: {json.dumps(event.dict())}\n\n"
+                yield sse_encoder.encode("title", {"title": title})
             
             # Send plan event
-            plan_event = ChatEvent(
-                event="plan",
-                data={
-                    "steps": [
-                        {"id": "analyze", "description": "Analyzing your request", "status": "running"},
-                        {"id": "generate", "description": "Generating response", "status": "pending"},
-                        {"id": "complete", "description": "Finalizing response", "status": "pending"}
-                    ]
-                }
-            )
-            yield f"event: plan\ndata: {json.dumps(plan_event.dict())}\n\n"
+            yield PLAN_FRAME.render()
             
             # Update step status
-            step_event = ChatEvent(
-                event="step",
-                data={"step_id": "analyze", "status": "completed"}
-            )
-            yield f"event: step\ndata: {json.dumps(step_event.dict())}\n\n"
-            
-            step_event = ChatEvent(
-                event="step", 
-                data={"step_id": "generate", "status": "running"}
-            )
-            yield f"event: step\ndata: {json.dumps(step_event.dict())}\n\n"
+            yield ANALYZE_COMPLETED_FRAME.render()
+            yield GENERATE_RUNNING_FRAME.render()
             
             # Generate AI response stream
             full_response = ""
-            async for chunk in self.ai_service.generate_streaming_response(request.message):
+            tool_calls: List[Dict[str, Any]] = []
+            tools = self.tool_engine.definitions() if self.tool_engine and settings.tool_calling_enabled else None
+            window_ms = request.coalesce_ms if request.coalesce_ms is not None else settings.sse_coalesce_window_ms
+            chunks = coalesce_message_chunks(
+                self.ai_service.generate_streaming_response(request.message, tools=tools or None),
+                window_ms,
+                settings.sse_coalesce_max_bytes
+            )
+            async for chunk in chunks:
                 if chunk.get("type") == "message":
                     content = chunk.get("content", "")
                     full_response += content
-                    
-                    message_event = ChatEvent(
-                        event="message",
-                        data={"content": content, "partial": True}
-                    )
-                    yield f"event: message\ndata: {json.dumps(message_event.dict())}\n\n"
+                    yield sse_encoder.encode_message(content)
+                elif chunk.get("type") == "tool_calls":
+                    tool_calls = chunk["calls"]
                 elif chunk.get("type") == "error":
-                    error_event = ChatEvent(
-                        event="error",
-                        data=chunk.get("data", {})
-                    )
-                    yield f"event: error\ndata: {json.dumps(error_event.dict())}\n\n"
+                    yield sse_encoder.encode("error", chunk.get("data", {}))
                     return
             
+            # Run the turn's tool calls, emitting an event as each is queued and finishes
+            if tool_calls:
+                async for tool in self.tool_engine.execute(session_id, tool_calls):
+                    yield sse_encoder.encode("tool", self._tool_event(tool))
+            
             # Save AI response
             ai_message = MessageEntity(
                 message_id=str(uuid.uuid4()),
@@ -97,35 +112,43 @@ class ChatService:
                 message_type=MessageType.ASSISTANT,
                 timestamp=datetime.utcnow()
             )
-            await self.message_repo.create(ai_message)
+            await self._save_message(ai_message)
             
             # Update session with AI response
-            await self.session_service.update_session_message(session_id, full_response)
+            await self.session_service.update_session_message(session_id, full_response, unread=True)
             
             # Complete step
-            step_event = ChatEvent(
-                event="step",
-                data={"step_id": "generate", "status": "completed"}
-            )
-            yield f"event: step\ndata: {json.dumps(step_event.dict())}\n\n"
-            
-            step_event = ChatEvent(
-                event="step",
-                data={"step_id": "complete", "status": "completed"}
-            )
-            yield f"event: step\ndata: {json.dumps(step_event.dict())}\n\n"
+            yield GENERATE_COMPLETED_FRAME.render()
+            yield COMPLETE_COMPLETED_FRAME.render()
             
             # Send done event
-            done_event = ChatEvent(
-                event="done",
-                data={"message": "Conversation completed successfully"}
-            )
-            yield f"event: done\ndata: {json.dumps(done_event.dict())}\n\n"
+            yield DONE_FRAME.render()
             
         except Exception as e:
             logger.error("Chat processing error", error=str(e))
-            error_event = ChatEvent(
-                event="error",
-                data={"error": str(e)}
-            )
-            yield f"event: error\ndata: {json.dumps(error_event.dict())}\n\n"
+            yield sse_encoder.encode("error", {"error": str(e)})
+    
+    def _tool_event(self, tool: ToolEntity) -> Dict[str, Any]:
+        return {
+            "tool_id": tool.tool_id,
+            "tool_call_id": tool.input_data.get("tool_call_id"),
+            "name": tool.input_data.get("name"),
+            "tool_type": tool.tool_type.value,
+            "status": tool.status.value,
+            "input": tool.input_data.get("arguments"),
+            "output": tool.output_data,
+            "error": tool.error_message
+        }
+    
+    async def _has_messages(self, session_id: str) -> bool:
+        """Whether the session already has any message, queued or stored"""
+        if batch_writer.pending_message_count(session_id):
+            return True
+        return await self.message_repo.count_by_session_id(session_id, limit=1) > 0
+    
+    async def _save_message(self, message: MessageEntity):
+        """Persist a message, off the request path when write-behind is enabled"""
+        if settings.write_behind_enabled:
+            await batch_writer.add_message(message)
+        else:
+            await self.message_repo.create(message)
@@ -0,0 +1,231 @@
+import asyncio
+import re
+from typing import AsyncGenerator, Optional, Set, Tuple
+
+from domain.entities.message import ChatRequest
+from application.services.chat_service import ChatService
+from infrastructure.chat_stream_buffer import ChatStreamBuffer
+from infrastructure.session_stream_broker import SessionStreamBroker, Subscription, session_stream_broker
+from infrastructure.config import get_settings
+from infrastructure import sse_encoder
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+TERMINAL_EVENTS = {"done", "error"}
+EVENT_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+def _parse_event_id(event_id: str) -> Tuple[int, int]:
+    turn, seq = event_id.split("-")
+    return int(turn), int(seq)
+
+class TurnInProgress(Exception):
+    pass
+
+class ChatStreamService:
+    """Runs chat turns detached from the client connection and fans their frames out.
+
+    Every frame is appended to the session's stream buffer, so a client can resume
+    with Last-Event-ID, and published through the session stream broker, so any
+    number of viewers on any worker can follow a turn that runs exactly once.
+    A session generates one turn at a time; its buffered ids only ever increase.
+    """
+
+    def __init__(self, broker: SessionStreamBroker = session_stream_broker):
+        self.stream_buffer = ChatStreamBuffer()
+        self.broker = broker
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def start_turn(
+        self,
+        chat_service: ChatService,
+        session_id: str,
+        request: ChatRequest
+    ) -> AsyncGenerator[bytes, None]:
+        """Start generating a turn in the background and return the stream of its frames.
+
+        Raises TurnInProgress while an earlier turn of the session is still generating.
+        """
+        # Subscribe before producing so no frame can be missed
+        subscription = await self.broker.subscribe(session_id)
+        turn: Optional[int] = None
+        try:
+            turn = await self.stream_buffer.begin_turn(session_id)
+        except Exception as e:
+            logger.warning("Chat stream not resumable", session_id=session_id, error=str(e))
+        else:
+            if turn is None:
+                await self.broker.unsubscribe(subscription)
+                raise TurnInProgress("A response is already being generated for this session")
+
+        task = asyncio.create_task(self._produce(chat_service, session_id, request, turn))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        # The generation keeps running if the client goes away, so it can be resumed.
+        # Without a turn nothing is buffered either, so there is nothing to catch up from.
+        last_id = f"{turn}-0" if turn is not None else None
+        return self._follow(session_id, subscription, last_id, turn=turn)
+
+    def resume(self, session_id: str, last_event_id: str) -> AsyncGenerator[bytes, None]:
+        """Replay frames after last_event_id, then follow the live tail until the turn ends"""
+        if not EVENT_ID_PATTERN.match(last_event_id):
+            raise ValueError(f"Invalid Last-Event-ID: {last_event_id}")
+        return self._attach(session_id, last_event_id)
+
+    def watch(self, session_id: str, last_event_id: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+        """Follow a session's generation: the turn in progress from its start, else the next one"""
+        return self._attach(session_id, last_event_id)
+
+    async def _attach(self, session_id: str, last_event_id: Optional[str]) -> AsyncGenerator[bytes, None]:
+        subscription = await self.broker.subscribe(session_id)
+        # Checked after subscribing, so a turn starting now is either seen here or
+        # followed live, and before catching up, since a finished turn is all buffered
+        live = True
+        try:
+            active = await self.stream_buffer.active_turn(session_id)
+            if last_event_id is None:
+                # Without a turn in progress there is nothing to replay: follow from the tail
+                last_event_id = f"{active}-0" if active is not None else None
+            else:
+                live = active is not None and active >= _parse_event_id(last_event_id)[0]
+        except Exception as e:
+            logger.warning("Failed to read active turn", session_id=session_id, error=str(e))
+        async for frame in self._follow(session_id, subscription, last_event_id, catch_up=last_event_id is not None, live=live):
+            yield frame
+
+    async def _follow(
+        self,
+        session_id: str,
+        subscription: Subscription,
+        last_id: Optional[str],
+        catch_up: bool = False,
+        turn: Optional[int] = None,
+        live: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        """Yield frames after last_id from the buffer and the live subscription, without duplicates.
+
+        With a turn, only that turn's frames are yielded. Without live, only the
+        buffer is replayed, for a turn that is already over.
+        """
+        try:
+            while True:
+                if catch_up and last_id is not None:
+                    async for event_id, event, frame in self._read_buffer(session_id, last_id):
+                        last_id = event_id
+                        if turn is not None and _parse_event_id(event_id)[0] != turn:
+                            continue
+                        yield frame
+                        if event in TERMINAL_EVENTS:
+                            return
+                catch_up = False
+                if not live:
+                    return
+
+                try:
+                    item = await asyncio.wait_for(
+                        subscription.get(),
+                        timeout=settings.chat_stream_idle_timeout_seconds
+                    )
+                except asyncio.TimeoutError:
+                    return
+
+                if item is None:
+                    # Fell behind the live stream: re-attach and catch up from the buffer
+                    await self.broker.unsubscribe(subscription)
+                    subscription = await self.broker.subscribe(session_id)
+                    catch_up = True
+                    continue
+
+                event_id, event, frame = item
+                if event == sse_encoder.KEEPALIVE_EVENT:
+                    # Some turn is still producing, e.g. waiting on a long tool call
+                    yield frame
+                    continue
+                if turn is not None and (not event_id or _parse_event_id(event_id)[0] != turn):
+                    continue
+                if event_id and last_id is not None and _parse_event_id(event_id) <= _parse_event_id(last_id):
+                    continue
+                if event_id:
+                    last_id = event_id
+                yield frame
+                if event in TERMINAL_EVENTS:
+                    return
+        finally:
+            await self.broker.unsubscribe(subscription)
+
+    async def _read_buffer(self, session_id: str, last_id: str) -> AsyncGenerator[Tuple[str, str, bytes], None]:
+        try:
+            while True:
+                entries = await self.stream_buffer.read_after(session_id, last_id)
+                if not entries:
+                    return
+                for entry in entries:
+                    last_id = entry[0]
+                    yield entry
+        except Exception as e:
+            logger.warning("Failed to replay chat frames", session_id=session_id, error=str(e))
+
+    async def _produce(self, chat_service: ChatService, session_id: str, request: ChatRequest, turn: Optional[int]):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        last_emit = last_renew = loop.time()
+
+        async def emit(event: str, frame: bytes):
+            nonlocal seq, last_emit
+            last_emit = loop.time()
+            event_id = ""
+            if turn is not None:
+                seq += 1
+                event_id = f"{turn}-{seq}"
+                frame = sse_encoder.with_id(event_id, frame)
+                try:
+                    await self.stream_buffer.append(session_id, event_id, event, frame)
+                except Exception as e:
+                    logger.warning("Failed to buffer chat frame", session_id=session_id, event_id=event_id, error=str(e))
+            await self.broker.publish(session_id, event_id, event, frame)
+
+        async def keep_alive():
+            # Tool calls can run longer than the followers' idle timeout without a frame,
+            # and the turn's in-progress lease must outlive the whole generation
+            nonlocal last_renew
+            interval = settings.chat_stream_keepalive_seconds
+            while True:
+                if turn is not None and loop.time() - last_renew >= interval:
+                    last_renew = loop.time()
+                    try:
+                        await self.stream_buffer.renew_turn(session_id)
+                    except Exception as e:
+                        logger.warning("Failed to renew chat turn", session_id=session_id, turn=turn, error=str(e))
+                idle = loop.time() - last_emit
+                if idle < interval:
+                    await asyncio.sleep(interval - idle)
+                    continue
+                await self.broker.publish(session_id, "", sse_encoder.KEEPALIVE_EVENT, sse_encoder.KEEPALIVE_FRAME)
+                await asyncio.sleep(interval)
+
+        pinger = asyncio.create_task(keep_alive())
+        try:
+            async for frame in chat_service.process_chat_message(session_id, request):
+                await emit(sse_encoder.frame_event(frame), frame)
+        except Exception as e:
+            logger.error("Chat stream producer failed", session_id=session_id, error=str(e))
+            await emit("error", sse_encoder.encode("error", {"error": str(e)}))
+        finally:
+            pinger.cancel()
+            await asyncio.gather(pinger, return_exceptions=True)
+            if turn is not None:
+                try:
+                    await self.stream_buffer.end_turn(session_id, turn)
+                except Exception as e:
+                    logger.warning("Failed to end chat turn", session_id=session_id, turn=turn, error=str(e))
+
+    async def close(self):
+        """Cancel in-flight generations on shutdown"""
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+# Global chat stream service instance
+chat_stream_service = ChatStreamService()
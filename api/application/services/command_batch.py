@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List
+
+class CommandBatch:
+    """Runs a set of commands with bounded parallelism and optional dependencies.
+
+    Each command is a dict with an "id" and an optional "depends_on" list of ids.
+    A command starts once all of its dependencies completed successfully; if any
+    of them failed, timed out or was skipped, it is skipped too. Results are
+    yielded in completion order.
+    """
+
+    def __init__(self, commands: List[Dict[str, Any]], max_parallel: int):
+        self.commands = {command["id"]: command for command in commands}
+        if len(self.commands) != len(commands):
+            raise ValueError("Command ids must be unique")
+        for command in commands:
+            for dependency in command.get("depends_on") or []:
+                if dependency not in self.commands:
+                    raise ValueError(f"Command {command['id']} depends on unknown command {dependency}")
+        self._check_acyclic()
+        self.max_parallel = max_parallel
+
+    def _check_acyclic(self):
+        # Kahn's algorithm: anything left unvisited sits on a cycle
+        remaining = {cid: len(command.get("depends_on") or []) for cid, command in self.commands.items()}
+        ready = [cid for cid, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            cid = ready.pop()
+            visited += 1
+            for other, command in self.commands.items():
+                if cid in (command.get("depends_on") or []):
+                    remaining[other] -= 1
+                    if remaining[other] == 0:
+                        ready.append(other)
+        if visited != len(self.commands):
+            raise ValueError("Command dependencies contain a cycle")
+
+    async def results(self, run: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> AsyncGenerator[Dict[str, Any], None]:
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        done: Dict[str, asyncio.Future] = {
+            cid: asyncio.get_running_loop().create_future() for cid in self.commands
+        }
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def execute(cid: str):
+            command = self.commands[cid]
+            dependencies = command.get("depends_on") or []
+            # Reported if run() or the wait is interrupted by a BaseException such as
+            # CancelledError, so dependents and the result stream never wait forever
+            result = {"id": cid, "status": "failed", "error": "Command was cancelled"}
+            try:
+                statuses = [await done[dependency] for dependency in dependencies]
+                if any(status != "completed" for status in statuses):
+                    failed = [dependency for dependency, status in zip(dependencies, statuses) if status != "completed"]
+                    result = {"id": cid, "status": "skipped", "error": f"Dependency did not complete: {', '.join(failed)}"}
+                else:
+                    async with semaphore:
+                        started = time.monotonic()
+                        try:
+                            result = await run(command)
+                        except Exception as e:
+                            result = {"id": cid, "status": "failed", "error": str(e)}
+                        result["duration_ms"] = int((time.monotonic() - started) * 1000)
+            finally:
+                done[cid].set_result(result["status"])
+                finished.put_nowait(result)
+
+        tasks = [asyncio.ensure_future(execute(cid)) for cid in self.commands]
+        try:
+            for _ in range(len(tasks)):
+                yield await finished.get()
+        finally:
+            # A disconnected client cancels whatever has not finished yet
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
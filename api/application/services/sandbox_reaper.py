@@ -0,0 +1,158 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from redis.exceptions import LockError
+from infrastructure.config import get_settings
+from infrastructure.redis_client import RedisClient, redis_client
+from infrastructure.sandbox_registry import SandboxRegistry
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+REAPER_LEASE_KEY = "sandbox:reaper"
+
+class SandboxReaper:
+    """Removes idle sandboxes and keeps the host within its capacity budget.
+
+    Activity comes from the registry's sorted set, so every worker sees the same
+    recency order. On each tick, and right after a sandbox is created, the worker
+    holding a Redis lease:
+    - removes sandboxes idle for longer than sandbox_idle_ttl_seconds
+    - evicts least-recently-used sandboxes while above max_sandboxes()
+    """
+
+    def __init__(
+        self,
+        cleanup: Callable[[str, bool], Awaitable[bool]],
+        registry: SandboxRegistry,
+        redis: RedisClient = redis_client,
+        warm_count: Optional[Callable[[], Awaitable[int]]] = None
+    ):
+        self.cleanup = cleanup
+        self.registry = registry
+        self.redis = redis
+        # Warm containers take host capacity too, so they shrink the session budget
+        self.warm_count = warm_count
+        self.warm = 0
+        self.counters = {"reaped_idle": 0, "reaped_capacity": 0, "reaped_session": 0, "reap_failures": 0}
+        self.live = 0
+        self.idle = 0
+        self.lease_held = False
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def max_sandboxes(self) -> int:
+        """Session sandbox limit: the container limit, tightened by the memory budget
+        when both sizes are set, less the warm containers counted at the last tick"""
+        limit = settings.sandbox_max_containers
+        if settings.sandbox_max_memory_mb > 0 and settings.sandbox_memory_limit_mb > 0:
+            limit = min(limit, settings.sandbox_max_memory_mb // settings.sandbox_memory_limit_mb)
+        return max(limit - self.warm, 0)
+
+    async def reap(self, session_id: str, reason: str, snapshot: bool = True) -> bool:
+        """Remove the session's sandbox, by default snapshotting it for a later resume"""
+        removed = await self.cleanup(session_id, snapshot)
+        if removed:
+            self.counters[f"reaped_{reason}"] += 1
+            logger.info("Sandbox reaped", session_id=session_id, reason=reason)
+        return removed
+
+    def wake(self):
+        """Run a tick now, e.g. right after a sandbox was created"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def tick(self):
+        # One worker at a time; the lease expiry only matters if the holder dies
+        lease = self.redis.lock(REAPER_LEASE_KEY, timeout=settings.sandbox_reaper_interval_seconds)
+        if not await lease.acquire(blocking=False):
+            return
+        self.lease_held = True
+        # Snapshots make a tick outlast the lease, so keep renewing it
+        renewal = asyncio.create_task(self._renew(lease))
+        try:
+            await self._reap_all()
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            try:
+                await lease.release()
+            except LockError:
+                # Expired and possibly taken over already; nothing left to release
+                pass
+            self.lease_held = False
+
+    async def _renew(self, lease: Any):
+        while True:
+            await asyncio.sleep(settings.sandbox_reaper_interval_seconds / 3)
+            try:
+                await lease.reacquire()
+            except LockError:
+                logger.warning("Sandbox reaper lease lost")
+                self.lease_held = False
+                return
+
+    async def _reap_all(self):
+        # A lost lease stops the tick between sandboxes; another worker may hold it now
+        for session_id in await self.registry.idle_sessions(settings.sandbox_idle_ttl_seconds, limit=100):
+            if not self.lease_held:
+                return
+            await self._reap_logged(session_id, "idle")
+
+        if self.warm_count is not None:
+            try:
+                self.warm = await self.warm_count()
+            except Exception as e:
+                logger.warning("Failed to count warm sandboxes", error=str(e))
+        excess = await self.registry.live_count() - self.max_sandboxes()
+        if excess > 0:
+            for session_id in await self.registry.least_recent_sessions(excess):
+                if not self.lease_held:
+                    return
+                await self._reap_logged(session_id, "capacity")
+
+        self.live = await self.registry.live_count()
+        self.idle = await self.registry.idle_count(settings.sandbox_idle_after_seconds)
+
+    async def _reap_logged(self, session_id: str, reason: str):
+        try:
+            if not await self.reap(session_id, reason) and await self.registry.resolve(session_id) is None:
+                # Container already gone; drop the index entry so it is not retried forever
+                await self.registry.unregister(session_id)
+        except Exception as e:
+            self.counters["reap_failures"] += 1
+            logger.error("Sandbox reap failed", session_id=session_id, reason=reason, error=str(e))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.sandbox_reaper_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Sandbox reaper error", error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "live": self.live,
+            "idle": self.idle,
+            "warm": self.warm,
+            "max_sandboxes": self.max_sandboxes()
+        }
+
+    async def start(self):
+        if self.task is None:
+            self._wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -1,109 +1,408 @@
 import docker
 import asyncio
+import codecs
+import errno
+import io
+import posixpath
+import shlex
+import tempfile
 import uuid
-from typing import Dict, Any, Optional
+from typing import AsyncGenerator, AsyncIterator, BinaryIO, Dict, Any, List, Optional, Tuple
 from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.exec_stream import stream_exec
+from infrastructure.pty_shell import ShellManager
+from infrastructure.sandbox_file_cache import SandboxFileCache
+from infrastructure.sandbox_files import RangeNotSatisfiable, SandboxFile, TooManySymlinks, UploadTooLarge, iter_tar, parse_range, split_path
+from infrastructure.sandbox_registry import SandboxRegistry, sandbox_name
+from infrastructure.sandbox_snapshots import SandboxSnapshotStore
+from infrastructure.sandbox_warm_pool import SandboxWarmPool
+from application.services.command_batch import CommandBatch
+from application.services.sandbox_reaper import SandboxReaper
 import structlog
 
 logger = structlog.get_logger()
 settings = get_settings()
 
+# os.ModeDir and os.ModeSymlink in the Go FileMode reported by the archive stat header
+FILE_MODE_DIR = 1 << 31
+FILE_MODE_SYMLINK = 1 << 27
+# Links followed before giving up, like the kernel's ELOOP
+FILE_MAX_SYMLINK_HOPS = 8
+
 class SandboxService:
-    def __init__(self):
-        self.docker_client = docker.from_env()
-        self.containers: Dict[str, Any] = {}
+    def __init__(
+        self,
+        docker_client: Optional[docker.DockerClient] = None,
+        executor: Optional[DockerExecutor] = None
+    ):
+        self.docker_client = docker_client or docker.from_env()
+        self.executor = executor or DockerExecutor()
+        self.registry = SandboxRegistry(self.docker_client, self.executor)
+        self.shells = ShellManager(self.docker_client, self.executor)
+        self.file_cache = SandboxFileCache(self.executor)
+        self._create_locks: Dict[str, asyncio.Lock] = {}
+        # Removals running in the background after a session stopped or was deleted
+        self._releases: Dict[str, asyncio.Task] = {}
+        self.snapshots: Optional[SandboxSnapshotStore] = None
+        if settings.sandbox_snapshot_max_bytes > 0:
+            self.snapshots = SandboxSnapshotStore(self.docker_client, self.executor)
+        self.warm_pool: Optional[SandboxWarmPool] = None
+        if settings.warm_pool_max_size > 0:
+            self.warm_pool = SandboxWarmPool(self.start_container, self.executor, self.docker_client)
+        self.reaper = SandboxReaper(
+            self.cleanup_sandbox,
+            self.registry,
+            warm_count=self.warm_pool.cluster_size if self.warm_pool else None
+        )
+    
+    async def start(self):
+        await self.reaper.start()
+        if self.warm_pool:
+            await self.warm_pool.start()
+    
+    async def close(self):
+        # Let pending removals finish their snapshots; each is bounded by its own timeouts
+        await asyncio.gather(*self._releases.values(), return_exceptions=True)
+        await self.reaper.close()
+        await self.shells.close()
+        if self.warm_pool:
+            await self.warm_pool.close()
+    
+    async def start_container(self, name: str, labels: Dict[str, str], image: Optional[str] = None) -> Any:
+        """Start a sandbox container and load its published ports"""
+        container = await self.executor.run(
+            self.docker_client.containers.run,
+            image or settings.docker_image,
+            timeout=settings.docker_create_timeout_seconds,
+            name=name,
+            labels={"riadex.sandbox": "true", **labels},
+            mem_limit=f"{settings.sandbox_memory_limit_mb}m" if settings.sandbox_memory_limit_mb > 0 else None,
+            detach=True,
+            tty=True,
+            stdin_open=True,
+            network=settings.docker_network,
+            environment={
+                "DISPLAY": ":1",
+                "VNC_PORT": "5901"
+            },
+            ports={
+                "5901/tcp": None,  # VNC port
+                "22/tcp": None     # SSH port
+            }
+        )
+        # Published host ports are only known once the container is inspected again
+        await self.executor.run(container.reload)
+        return container
+    
+    async def _container(self, session_id: str) -> Any:
+        """The session's container handle, creating the sandbox if needed"""
+        release = self._releases.get(session_id)
+        if release is not None:
+            # The old sandbox is on its way out; resume from what it leaves behind.
+            # shield: a caller going away must not cancel the removal
+            await asyncio.shield(release)
+        entry = await self.registry.resolve(session_id)
+        if entry is None:
+            entry = await self._create(session_id)
+        await self.registry.touch(session_id)
+        return entry["container"]
+    
+    async def _create(self, session_id: str) -> Dict[str, Any]:
+        # The local lock keeps this worker's racing calls off the Redis lock;
+        # the Redis lock makes creation exclusive across workers
+        lock = self._create_locks.setdefault(session_id, asyncio.Lock())
+        try:
+            async with lock:
+                async with self.registry.creation_lock(session_id):
+                    entry = await self.registry.resolve(session_id)
+                    if entry is not None:
+                        return entry
+                    
+                    # Resume from the session's snapshot, else claim a pre-started
+                    # container, falling back to a cold start
+                    container = await self._restore(session_id)
+                    if container is None and self.warm_pool:
+                        container = await self.warm_pool.claim(session_id, sandbox_name(session_id))
+                    if container is None:
+                        container = await self.start_container(sandbox_name(session_id), {})
+                    
+                    entry = await self.registry.register(session_id, container)
+                    logger.info("Sandbox created", session_id=session_id, container_id=container.id)
+                    # Enforce the capacity budget now rather than at the next tick
+                    self.reaper.wake()
+                    return entry
+        finally:
+            self._create_locks.pop(session_id, None)
+    
+    async def _restore(self, session_id: str) -> Optional[Any]:
+        if not self.snapshots:
+            return None
+        try:
+            image = await self.snapshots.lookup(session_id)
+            if image is None:
+                return None
+            container = await self.start_container(sandbox_name(session_id), {}, image=image)
+            logger.info("Sandbox restored from snapshot", session_id=session_id, image=image)
+            return container
+        except Exception as e:
+            # A missing or broken snapshot must not block the session; start fresh
+            logger.warning("Sandbox restore failed", session_id=session_id, error=str(e))
+            await self.snapshots.discard(session_id)
+            return None
+    
+    def _on_error(self, session_id: str, error: Exception):
+        if isinstance(error, docker.errors.NotFound):
+            # Removed behind our back; re-resolve on the next call
+            self.registry.forget_local(session_id)
     
     async def create_sandbox(self, session_id: str) -> Dict[str, Any]:
-        """Create a new sandbox container for the session"""
+        """Create the sandbox container for the session, or return the existing one"""
         try:
-            container_name = f"riadex-sandbox-{session_id}"
-            
-            # Create container
-            container = self.docker_client.containers.run(
-                settings.docker_image,
-                name=container_name,
-                detach=True,
-                tty=True,
-                stdin_open=True,
-                network=settings.docker_network,
-                environment={
-                    "DISPLAY": ":1",
-                    "VNC_PORT": "5901"
-                },
-                ports={
-                    "5901/tcp": None,  # VNC port
-                    "22/tcp": None     # SSH port
-                }
-            )
-            
-            self.containers[session_id] = {
-                "container": container,
-                "container_id": container.id,
-                "vnc_port": container.ports.get("5901/tcp", [{}])[0].get("HostPort"),
-                "ssh_port": container.ports.get("22/tcp", [{}])[0].get("HostPort")
-            }
-            
-            logger.info("Sandbox created", session_id=session_id, container_id=container.id)
-            
-            return {
-                "container_id": container.id,
-                "vnc_port": self.containers[session_id]["vnc_port"],
-                "ssh_port": self.containers[session_id]["ssh_port"]
-            }
-            
+            entry = await self._create(session_id)
+            return entry["info"]
         except Exception as e:
             logger.error("Failed to create sandbox", session_id=session_id, error=str(e))
             raise
     
-    async def execute_shell_command(self, session_id: str, command: str) -> Dict[str, Any]:
-        """Execute shell command in sandbox"""
+    async def _shell(self, session_id: str, shell_id: str):
+        container = await self._container(session_id)
+        return await self.shells.get(session_id, shell_id, container.id)
+    
+    async def execute_shell_command(
+        self,
+        session_id: str,
+        command: str,
+        shell_id: str = "default",
+        timeout: Optional[float] = None,
+        workdir: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Execute shell command in the session's persistent shell.
+
+        The command and its output land in the shell's console, so viewers of the
+        shell see it run. status is "completed", "timed_out" or "failed".
+        """
+        line = command
+        if workdir:
+            # A subshell, so the shell's own working directory stays put
+            line = f"(cd {shlex.quote(workdir)} && {command})"
         try:
-            if session_id not in self.containers:
-                await self.create_sandbox(session_id)
+            shell = await self._shell(session_id, shell_id)
             
-            container = self.containers[session_id]["container"]
-            
-            # Execute command
-            result = container.exec_run(command, tty=True)
+            # Execute command; a long one keeps the sandbox from looking idle
+            async with self.registry.keep_active(session_id):
+                output, exit_code = await shell.run(line, timeout=timeout or settings.docker_exec_timeout_seconds)
             
             return {
                 "command": command,
-                "output": result.output.decode("utf-8"),
-                "exit_code": result.exit_code
+                "output": output,
+                "exit_code": exit_code,
+                "status": "completed"
             }
             
+        except asyncio.TimeoutError:
+            logger.warning("Shell command timed out", session_id=session_id, shell_id=shell_id)
+            return {
+                "command": command,
+                "output": "Error: Command timed out",
+                "exit_code": 1,
+                "status": "timed_out"
+            }
         except Exception as e:
             logger.error("Shell command execution failed", session_id=session_id, error=str(e))
+            self._on_error(session_id, e)
             return {
                 "command": command,
                 "output": f"Error: {str(e)}",
-                "exit_code": 1
+                "exit_code": 1,
+                "status": "failed"
             }
     
-    async def read_file(self, session_id: str, file_path: str) -> Dict[str, Any]:
-        """Read file content from sandbox"""
+    async def view_shell(self, session_id: str, shell_id: str) -> Dict[str, Any]:
+        """Recent output and console of a shell; attaches the shell on first use"""
+        shell = await self._shell(session_id, shell_id)
+        return shell.view()
+    
+    async def write_shell(self, session_id: str, shell_id: str, data: str, press_enter: bool = True):
+        """Send input to a shell, e.g. answering a prompt of a running program"""
+        shell = await self._shell(session_id, shell_id)
+        await shell.write(data + "\n" if press_enter else data)
+    
+    async def stream_shell_command(
+        self,
+        session_id: str,
+        command: str,
+        workdir: Optional[str] = None,
+        max_output_bytes: Optional[int] = None
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """Run a shell command and yield (event, data) pairs as output arrives.
+
+        Events are stdout/stderr chunks, one truncated marker if the output cap is
+        hit, and a final exit event carrying the exit code (or the error).
+        """
+        limit = min(max_output_bytes or settings.shell_stream_max_output_bytes, settings.shell_stream_max_output_bytes)
+        # Incremental decoders keep multi-byte characters split across chunks intact
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace")
+        }
+        timeout = settings.docker_exec_timeout_seconds
         try:
-            if session_id not in self.containers:
-                await self.create_sandbox(session_id)
-            
-            container = self.containers[session_id]["container"]
-            
-            # Read file using cat command
-            result = container.exec_run(f"cat {file_path}")
+            container = await self._container(session_id)
+            # As for batch commands: coreutils timeout stops the process inside the
+            # sandbox, the stream timeout only bounds how long we read
+            async with self.registry.keep_active(session_id):
+                async for event, value in stream_exec(
+                    self.docker_client,
+                    self.executor,
+                    container.id,
+                    ["timeout", "-k", "5", str(timeout), "/bin/sh", "-c", command],
+                    max_bytes=limit,
+                    queue_size=settings.shell_stream_queue_size,
+                    timeout=timeout + 10,
+                    workdir=workdir
+                ):
+                    if event == "exit" and value == 124:
+                        yield "exit", {"exit_code": value, "error": "Command timed out"}
+                    elif event == "exit":
+                        yield "exit", {"exit_code": value}
+                    elif event == "truncated":
+                        yield "truncated", {"limit": value}
+                    else:
+                        text = decoders[event].decode(value)
+                        if text:
+                            yield event, {"data": text}
+        except asyncio.TimeoutError:
+            logger.warning("Streaming shell command timed out", session_id=session_id)
+            yield "exit", {"exit_code": None, "error": "Command timed out"}
+        except Exception as e:
+            logger.error("Streaming shell command failed", session_id=session_id, error=str(e))
+            self._on_error(session_id, e)
+            yield "exit", {"exit_code": None, "error": str(e)}
+    
+    def plan_command_batch(self, commands: List[Dict[str, Any]], max_parallel: Optional[int] = None) -> CommandBatch:
+        """Validate a batch up front so bad ids or cycles fail before anything runs"""
+        if len(commands) > settings.shell_batch_max_commands:
+            raise ValueError(f"At most {settings.shell_batch_max_commands} commands per batch")
+        parallel = min(max_parallel or settings.shell_batch_max_parallel, settings.shell_batch_max_parallel)
+        return CommandBatch(commands, parallel)
+    
+    async def run_command_batch(self, session_id: str, batch: CommandBatch) -> AsyncGenerator[Dict[str, Any], None]:
+        """Run a planned batch in one sandbox, yielding each result as it completes"""
+        container = await self._container(session_id)
+        try:
+            async for result in batch.results(lambda command: self._run_batch_command(container.id, command)):
+                yield result
+        except Exception as e:
+            self._on_error(session_id, e)
+            raise
+    
+    async def run_command(
+        self,
+        session_id: str,
+        command: str,
+        workdir: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Run one command to completion, with the same timeout and output cap as a batch entry"""
+        container = await self._container(session_id)
+        try:
+            return await self._run_batch_command(
+                container.id,
+                {"id": "command", "command": command, "workdir": workdir, "timeout": timeout}
+            )
+        except Exception as e:
+            self._on_error(session_id, e)
+            raise
+    
+    async def _run_batch_command(self, container_id: str, command: Dict[str, Any]) -> Dict[str, Any]:
+        timeout = min(command.get("timeout") or settings.shell_batch_default_timeout_seconds, settings.docker_exec_timeout_seconds)
+        # coreutils timeout stops the process inside the sandbox; the exec timeout
+        # below only bounds how long we wait for its stream to end
+        cmd = ["timeout", "-k", "5", str(timeout), "/bin/sh", "-c", command["command"]]
+        output = {"stdout": [], "stderr": []}
+        truncated = False
+        exit_code = None
+        try:
+            async for event, value in stream_exec(
+                self.docker_client,
+                self.executor,
+                container_id,
+                cmd,
+                max_bytes=settings.shell_batch_max_output_bytes,
+                queue_size=settings.shell_stream_queue_size,
+                timeout=timeout + 10,
+                workdir=command.get("workdir")
+            ):
+                if event == "exit":
+                    exit_code = value
+                elif event == "truncated":
+                    truncated = True
+                else:
+                    output[event].append(value)
+        except asyncio.TimeoutError:
+            exit_code = 124
+        if exit_code == 124:
+            status = "timed_out"
+        else:
+            status = "completed" if exit_code == 0 else "failed"
+        return {
+            "id": command["id"],
+            "status": status,
+            "exit_code": exit_code,
+            "stdout": b"".join(output["stdout"]).decode("utf-8", errors="replace"),
+            "stderr": b"".join(output["stderr"]).decode("utf-8", errors="replace"),
+            "truncated": truncated
+        }
+    
+    async def open_file(self, session_id: str, file_path: str) -> SandboxFile:
+        """Start streaming a file out of the sandbox; raises if it is missing or not a file.
+
+        Symlinks are followed: the archive of a link holds only the link itself.
+        """
+        container = await self._container(session_id)
+        path = file_path
+        for _ in range(FILE_MAX_SYMLINK_HOPS + 1):
+            bits, stat = await self.executor.run(
+                container.get_archive,
+                path,
+                chunk_size=settings.file_chunk_bytes
+            )
+            sandbox_file = SandboxFile(file_path, stat, bits, self.executor)
+            if not stat.get("mode", 0) & FILE_MODE_SYMLINK:
+                break
+            await sandbox_file.close()
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(path), stat["linkTarget"]))
+        else:
+            raise TooManySymlinks(errno.ELOOP, "Too many levels of symbolic links", file_path)
+        if stat.get("mode", 0) & FILE_MODE_DIR:
+            await sandbox_file.close()
+            raise IsADirectoryError("Not a regular file")
+        return sandbox_file
+    
+    async def read_file(self, session_id: str, file_path: str, byte_range: Optional[str] = None) -> Dict[str, Any]:
+        """Read file content from sandbox, at most file_view_max_bytes of it"""
+        try:
+            sandbox_file = await self.open_file(session_id, file_path)
+            try:
+                start, requested_end = parse_range(byte_range, sandbox_file.size) or (0, sandbox_file.size - 1)
+            except RangeNotSatisfiable:
+                await sandbox_file.close()
+                raise
+            last = min(requested_end, start + settings.file_view_max_bytes - 1)
+            data = await sandbox_file.read(start, last)
             
-            if result.exit_code == 0:
-                return {
-                    "file": file_path,
-                    "content": result.output.decode("utf-8"),
-                    "success": True
-                }
-            else:
-                return {
-                    "file": file_path,
-                    "content": f"Error reading file: {result.output.decode('utf-8')}",
-                    "success": False
-                }
+            return {
+                "file": file_path,
+                "content": data.decode("utf-8", errors="replace"),
+                "size": sandbox_file.size,
+                "truncated": last < requested_end,
+                "success": True
+            }
                 
+        except RangeNotSatisfiable:
+            # The caller answers 416 rather than reporting a failed read
+            raise
         except Exception as e:
             logger.error("File read failed", session_id=session_id, file_path=file_path, error=str(e))
             return {
@@ -112,22 +411,53 @@ class SandboxService:
                 "success": False
             }
     
+    async def read_file_cached(
+        self,
+        session_id: str,
+        file_path: str,
+        if_none_match: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Read a file view, revalidating a cached copy with one batched stat.
+
+        Returns (result, etag); result is None when if_none_match still matches,
+        i.e. the client's copy is current.
+        """
+        try:
+            container = await self._container(session_id)
+            etag = await self.file_cache.etag(container, file_path)
+        except Exception as e:
+            logger.warning("File stat failed", session_id=session_id, file_path=file_path, error=str(e))
+            etag = None
+        if etag is None:
+            # Missing file or failed stat: no validator, read (and report) as usual
+            return await self.read_file(session_id, file_path), None
+        
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.file_cache.counters["not_modified"] += 1
+            return None, etag
+        
+        result = self.file_cache.get(session_id, file_path, etag)
+        if result is None:
+            result = await self.read_file(session_id, file_path)
+            if result.get("success"):
+                self.file_cache.set(session_id, file_path, etag, result)
+        return result, etag
+    
+    async def file_etag(self, session_id: str, file_path: str) -> Optional[str]:
+        """The file's current ETag (see read_file_cached), or None if it does not exist"""
+        container = await self._container(session_id)
+        return await self.file_cache.etag(container, file_path)
+    
     async def write_file(self, session_id: str, file_path: str, content: str) -> Dict[str, Any]:
         """Write content to file in sandbox"""
         try:
-            if session_id not in self.containers:
-                await self.create_sandbox(session_id)
-            
-            container = self.containers[session_id]["container"]
-            
-            # Write file using echo command
-            escaped_content = content.replace("'", "'\"'\"'")
-            result = container.exec_run(f"echo '{escaped_content}' > {file_path}")
+            data = content.encode("utf-8")
+            await self._put_file(session_id, file_path, io.BytesIO(data), len(data))
             
             return {
                 "file": file_path,
-                "success": result.exit_code == 0,
-                "message": "File written successfully" if result.exit_code == 0 else f"Error: {result.output.decode('utf-8')}"
+                "success": True,
+                "message": "File written successfully"
             }
             
         except Exception as e:
@@ -138,22 +468,119 @@ class SandboxService:
                 "message": f"Error: {str(e)}"
             }
     
+    async def upload_file(self, session_id: str, file_path: str, chunks: AsyncIterator[bytes]) -> int:
+        """Write a streamed upload to a file in the sandbox and return its size.
+
+        The body is spooled (in memory up to file_spool_memory_bytes, then on
+        disk) because a tar header needs the size before the content. Disk writes
+        go to the default thread pool, leaving the Docker executor to Docker calls.
+        """
+        loop = asyncio.get_running_loop()
+        with tempfile.SpooledTemporaryFile(max_size=settings.file_spool_memory_bytes) as spool:
+            size = 0
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.file_upload_max_bytes:
+                    raise UploadTooLarge("Upload exceeds file_upload_max_bytes")
+                if size > settings.file_spool_memory_bytes:
+                    # This chunk rolls the spool over to disk, or it already has
+                    await loop.run_in_executor(None, spool.write, chunk)
+                else:
+                    spool.write(chunk)
+            spool.seek(0)
+            await self._put_file(session_id, file_path, spool, size)
+        return size
+    
+    async def _put_file(self, session_id: str, file_path: str, source: BinaryIO, size: int):
+        directory, name = split_path(file_path)
+        self.file_cache.invalidate(session_id, file_path)
+        container = await self._container(session_id)
+        # A generator body is sent with chunked encoding, so the archive is never built in memory
+        ok = await self.executor.run_stream(
+            container.put_archive,
+            directory,
+            iter_tar(name, source, size, settings.file_chunk_bytes),
+            timeout=settings.docker_exec_timeout_seconds
+        )
+        if not ok:
+            raise IOError("Docker rejected the archive")
+    
+    async def release_sandbox(self, session_id: str, keep_snapshot: bool = True) -> bool:
+        """Remove the session's sandbox because the session stopped or was deleted.
+
+        With keep_snapshot the filesystem is snapshotted first so a resumed
+        session gets it back; otherwise any existing snapshot is discarded too.
+        """
+        removed = await self.reaper.reap(session_id, "session", snapshot=keep_snapshot)
+        if not keep_snapshot and self.snapshots:
+            await self.snapshots.discard(session_id)
+        return removed
+    
+    def release_sandbox_later(self, session_id: str, keep_snapshot: bool = True):
+        """Run release_sandbox in the background, so callers do not wait on the snapshot.
+
+        Releases of the same session run in the order they were requested, and the
+        session's next sandbox is only created once they are done.
+        """
+        previous = self._releases.get(session_id)
+        
+        async def release():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await self.release_sandbox(session_id, keep_snapshot=keep_snapshot)
+            except Exception as e:
+                logger.error("Sandbox release failed", session_id=session_id, error=str(e))
+        
+        task = asyncio.create_task(release())
+        self._releases[session_id] = task
+        
+        def forget(done: asyncio.Task):
+            if self._releases.get(session_id) is done:
+                del self._releases[session_id]
+        
+        task.add_done_callback(forget)
+    
     async def get_vnc_port(self, session_id: str) -> Optional[str]:
         """Get VNC port for session"""
-        if session_id in self.containers:
-            return self.containers[session_id].get("vnc_port")
+        info = await self.registry.get_info(session_id)
+        if info:
+            return info.get("vnc_port")
         return None
     
-    async def cleanup_sandbox(self, session_id: str) -> bool:
-        """Clean up sandbox container"""
+    async def cleanup_sandbox(self, session_id: str, snapshot: bool = False) -> bool:
+        """Clean up sandbox container, snapshotting its filesystem first if asked"""
+        # Held throughout so a concurrent _create cannot hand out the container
+        # being removed, nor start a new one before the snapshot is saved
+        timeout = settings.sandbox_snapshot_timeout_seconds + settings.docker_op_timeout_seconds + 30
         try:
-            if session_id in self.containers:
-                container = self.containers[session_id]["container"]
-                container.stop()
-                container.remove()
-                del self.containers[session_id]
-                logger.info("Sandbox cleaned up", session_id=session_id)
-                return True
+            async with self.registry.creation_lock(session_id, timeout=timeout):
+                await self.shells.close_session(session_id)
+                entry = await self.registry.resolve(session_id)
+                if entry is not None:
+                    previous = None
+                    if snapshot and self.snapshots:
+                        previous = await self._snapshot(session_id, entry["container"])
+                    # Sandboxes are disposable, so kill and remove in one call instead of
+                    # waiting out stop()'s graceful shutdown timeout
+                    await self.executor.run(entry["container"].remove, force=True)
+                    await self.registry.unregister(session_id)
+                    if previous:
+                        # Only releasable now that no container runs from it
+                        await self.snapshots.release(session_id, previous)
+                    logger.info("Sandbox cleaned up", session_id=session_id)
+                    return True
         except Exception as e:
             logger.error("Sandbox cleanup failed", session_id=session_id, error=str(e))
         return False
+    
+    async def _snapshot(self, session_id: str, container: Any) -> Optional[str]:
+        """Save a snapshot and return the one it superseded, if any"""
+        try:
+            previous = await self.snapshots.current(session_id)
+            digest = await self.snapshots.save(session_id, container)
+            return previous if previous and previous != digest else None
+        except Exception as e:
+            # Losing the snapshot only costs a slower resume; still remove the sandbox
+            logger.error("Sandbox snapshot failed", session_id=session_id, error=str(e))
+            return None
@@ -1,17 +1,36 @@
-from typing import List, Optional
+from typing import AsyncGenerator, List, Optional, Tuple
+import base64
+import json
 import uuid
 from datetime import datetime
 
 from domain.entities.session import SessionEntity, SessionStatus, SessionCreateRequest
+from domain.entities.message import MessageEntity
 from domain.repositories.session_repository import SessionRepository
 from domain.repositories.message_repository import MessageRepository
 from infrastructure.repositories.mongodb_session_repository import MongoDBSessionRepository
 from infrastructure.repositories.mongodb_message_repository import MongoDBMessageRepository
+from infrastructure.repositories.cached_session_repository import CachedSessionRepository
+from infrastructure.batch_writer import batch_writer
+from application.services.sandbox_service import SandboxService
+from infrastructure.config import get_settings
+
+settings = get_settings()
 
 class SessionService:
-    def __init__(self):
-        self.session_repo: SessionRepository = MongoDBSessionRepository()
-        self.message_repo: MessageRepository = MongoDBMessageRepository()
+    def __init__(
+        self,
+        session_repo: Optional[SessionRepository] = None,
+        message_repo: Optional[MessageRepository] = None,
+        sandbox_service: Optional[SandboxService] = None
+    ):
+        if session_repo is None:
+            session_repo = MongoDBSessionRepository()
+            if settings.session_cache_enabled:
+                session_repo = CachedSessionRepository(session_repo)
+        self.session_repo: SessionRepository = session_repo
+        self.message_repo: MessageRepository = message_repo or MongoDBMessageRepository()
+        self.sandbox_service = sandbox_service
     
     async def create_session(self, request: Optional[SessionCreateRequest] = None) -> SessionEntity:
         """Create a new session"""
@@ -30,34 +49,107 @@ class SessionService:
         """Get session by ID"""
         return await self.session_repo.get_by_id(session_id)
     
-    async def get_session_with_events(self, session_id: str) -> Optional[dict]:
-        """Get session with message history"""
+    async def get_session_with_events(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Optional[dict]:
+        """Get session with message history, optionally one page at a time"""
+        after = self._decode_cursor(cursor) if cursor else None
+        await batch_writer.flush_session(session_id)
         session = await self.session_repo.get_by_id(session_id)
         if not session:
             return None
         
-        messages = await self.message_repo.get_by_session_id(session_id)
+        next_cursor = None
+        if limit is None:
+            messages = await self.message_repo.get_by_session_id(session_id)
+        else:
+            # Fetch one extra row to learn whether another page exists
+            messages = await self.message_repo.get_page_by_session_id(session_id, limit + 1, after)
+            if len(messages) > limit:
+                messages = messages[:limit]
+                last = messages[-1]
+                next_cursor = self._encode_cursor(last.timestamp, last.message_id)
         
-        return {
+        await self._mark_read(session)
+        
+        result = {
             "session_id": session.session_id,
             "title": session.title,
-            "events": [
-                {
-                    "type": msg.message_type,
-                    "content": msg.content,
-                    "timestamp": int(msg.timestamp.timestamp()),
-                    "event_id": msg.event_id
-                }
-                for msg in messages
-            ]
+            "events": [self._message_to_event(msg) for msg in messages]
+        }
+        if limit is not None:
+            result["next_cursor"] = next_cursor
+        return result
+    
+    async def stream_session_events(self, session_id: str) -> Optional[AsyncGenerator[bytes, None]]:
+        """Stream session history as NDJSON: a session line followed by one line per event"""
+        await batch_writer.flush_session(session_id)
+        session = await self.session_repo.get_by_id(session_id)
+        if not session:
+            return None
+        
+        await self._mark_read(session)
+        
+        async def generate() -> AsyncGenerator[bytes, None]:
+            yield self._ndjson({"session_id": session.session_id, "title": session.title})
+            async for msg in self.message_repo.iter_by_session_id(session_id):
+                yield self._ndjson(self._message_to_event(msg))
+        
+        return generate()
+    
+    async def _mark_read(self, session: SessionEntity):
+        # Viewing the history marks everything as read
+        if session.unread_message_count:
+            await self.session_repo.patch(session.session_id, {"unread_message_count": 0})
+    
+    def _message_to_event(self, msg: MessageEntity) -> dict:
+        return {
+            "type": msg.message_type,
+            "content": msg.content,
+            "timestamp": int(msg.timestamp.timestamp()),
+            "event_id": msg.event_id
         }
     
-    async def list_sessions(self) -> List[SessionEntity]:
-        """List all sessions"""
-        return await self.session_repo.get_all()
+    def _ndjson(self, value: dict) -> bytes:
+        return (json.dumps(value) + "\n").encode("utf-8")
+    
+    async def list_sessions(self, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[SessionEntity], Optional[str]]:
+        """List sessions newest first, one page at a time"""
+        after = self._decode_cursor(cursor) if cursor else None
+        
+        # Fetch one extra row to learn whether another page exists; queued
+        # write-behind patches are overlaid rather than flushed on every listing
+        sessions = [batch_writer.overlay_session(session) for session in await self.session_repo.list_page(limit + 1, after)]
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            last = sessions[-1]
+            next_cursor = self._encode_cursor(last.created_at, last.session_id)
+        return sessions, next_cursor
+    
+    def _encode_cursor(self, sort_value: datetime, doc_id: str) -> str:
+        raw = json.dumps([sort_value.isoformat(), doc_id]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    
+    def _decode_cursor(self, cursor: str) -> Tuple[datetime, str]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            sort_value, doc_id = json.loads(raw)
+            return datetime.fromisoformat(sort_value), str(doc_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError("Invalid cursor") from e
     
     async def delete_session(self, session_id: str) -> bool:
         """Delete a session and its messages"""
+        # Drop queued writes so a later flush cannot resurrect them
+        batch_writer.discard_session(session_id)
+        await batch_writer.flush_session(session_id)
+        
+        await self._release_sandbox(session_id, keep_snapshot=False)
+        
         # Delete messages first
         await self.message_repo.delete_by_session_id(session_id)
         
@@ -66,17 +158,26 @@ class SessionService:
     
     async def stop_session(self, session_id: str) -> bool:
         """Stop an active session"""
+        await self._release_sandbox(session_id)
         return await self.session_repo.update_status(session_id, SessionStatus.STOPPED)
     
-    async def update_session_message(self, session_id: str, message: str) -> bool:
-        """Update session's latest message"""
-        session = await self.session_repo.get_by_id(session_id)
-        if not session:
-            return False
+    async def _release_sandbox(self, session_id: str, keep_snapshot: bool = True):
+        if self.sandbox_service is not None:
+            # Snapshotting can take minutes; the request does not wait for it
+            self.sandbox_service.release_sandbox_later(session_id, keep_snapshot=keep_snapshot)
+    
+    async def update_session_message(self, session_id: str, message: str, unread: bool = False) -> bool:
+        """Update session's latest message, counting it as unread if requested"""
+        now = datetime.utcnow()
+        fields = {
+            "latest_message": message,
+            "latest_message_at": now,
+            "updated_at": now
+        }
+        inc = {"unread_message_count": 1} if unread else None
         
-        session.latest_message = message
-        session.latest_message_at = datetime.utcnow()
-        session.updated_at = datetime.utcnow()
+        if settings.write_behind_enabled:
+            await batch_writer.update_session(session_id, fields, inc=inc)
+            return True
         
-        await self.session_repo.update(session)
-        return True
+        return await self.session_repo.patch(session_id, fields, inc=inc)
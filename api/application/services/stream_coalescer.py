@@ -0,0 +1,82 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Dict, Any, List
+
+async def coalesce_message_chunks(
+    chunks: AsyncIterator[Dict[str, Any]],
+    window_ms: int,
+    max_bytes: int
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """Merge consecutive message chunks, flushing by time window or byte threshold.
+
+    The first message chunk is always passed through immediately so time-to-first-token
+    is unaffected. Any non-message chunk flushes the buffer and is passed through as is.
+    A window of 0 disables coalescing.
+    """
+    if window_ms <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    iterator = chunks.__aiter__()
+    pending = None
+    buffer: List[str] = []
+    buffered_bytes = 0
+    deadline = None
+    first_sent = False
+
+    def flush() -> Dict[str, Any]:
+        nonlocal buffer, buffered_bytes, deadline
+        chunk = {"type": "message", "content": "".join(buffer)}
+        buffer = []
+        buffered_bytes = 0
+        deadline = None
+        return chunk
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Window elapsed while waiting on upstream, keep the pending read
+                yield flush()
+                continue
+
+            future, pending = pending, None
+            try:
+                chunk = future.result()
+            except StopAsyncIteration:
+                break
+
+            if chunk.get("type") != "message":
+                if buffer:
+                    yield flush()
+                yield chunk
+                continue
+
+            if not first_sent:
+                first_sent = True
+                yield chunk
+                continue
+
+            content = chunk.get("content", "")
+            buffer.append(content)
+            buffered_bytes += len(content.encode("utf-8"))
+            if deadline is None:
+                deadline = loop.time() + window
+            if buffered_bytes >= max_bytes:
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
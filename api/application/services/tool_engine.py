@@ -0,0 +1,299 @@
+import asyncio
+import json
+import posixpath
+import uuid
+from datetime import datetime
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from domain.entities.tool import ToolEntity, ToolStatus, ToolType
+from domain.repositories.tool_repository import ToolRepository
+from application.services.command_batch import CommandBatch
+from application.services.sandbox_service import SandboxService
+from infrastructure.batch_writer import batch_writer
+from infrastructure.config import get_settings
+from infrastructure.tool_result_cache import ToolResultCache, tool_result_cache
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+ToolHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+# Returns a token that changes whenever the tool's answer may change, or None to bypass the cache
+CacheVersion = Callable[[str, Dict[str, Any]], Awaitable[Optional[str]]]
+
+class ToolExecutionEngine:
+    """Runs the tool calls an LLM emits in one turn.
+
+    Calls are ordered by a dependency graph built from what they touch, in the
+    order the model emitted them:
+    - file calls on the same path depend on each other unless both only read
+    - a shell command may touch any file, so it is ordered against every file call
+    - shell commands run one after another in the session's persistent shell,
+      which also carries working directory and environment from one to the next
+    Edges only order calls: a call still runs after a dependency failed, since the
+    model asked for both. Independent calls run concurrently, bounded by a
+    per-worker semaphore per tool type. Status changes are persisted through the
+    write-behind batch writer, so a turn's transitions land in a few bulk writes.
+    """
+
+    def __init__(
+        self,
+        sandbox_service: Optional[SandboxService],
+        tool_repo: ToolRepository,
+        result_cache: ToolResultCache = tool_result_cache
+    ):
+        self.sandbox_service = sandbox_service
+        self.tool_repo = tool_repo
+        self.result_cache = result_cache
+        self.handlers: Dict[str, Dict[str, Any]] = {}
+        self.limits = {
+            ToolType.SHELL: settings.tool_concurrency_shell,
+            ToolType.FILE: settings.tool_concurrency_file
+        }
+        self._semaphores: Dict[ToolType, asyncio.Semaphore] = {}
+        self.counters = {"calls": 0, "completed": 0, "failed": 0, "timed_out": 0}
+        if sandbox_service is not None:
+            self.register("shell_exec", ToolType.SHELL, self._shell_exec, {
+                "description": "Run a shell command in the session's sandbox and return its output",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "command": {"type": "string", "description": "Command to run with /bin/sh -c"},
+                        "workdir": {"type": "string", "description": "Absolute working directory"}
+                    },
+                    "required": ["command"]
+                }
+            })
+            # Sandbox files differ per session, and the ETag pins the file's current version
+            self.register("file_read", ToolType.FILE, self._file_read, {
+                "description": "Read a text file from the session's sandbox",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"path": {"type": "string", "description": "Absolute file path"}},
+                    "required": ["path"]
+                }
+            }, cache_ttl=settings.tool_cache_file_read_ttl_seconds, cache_per_session=True, cache_version=self._file_version)
+            self.register("file_write", ToolType.FILE, self._file_write, {
+                "description": "Create or overwrite a text file in the session's sandbox",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string", "description": "Absolute file path"},
+                        "content": {"type": "string", "description": "Full new file content"}
+                    },
+                    "required": ["path", "content"]
+                }
+            })
+
+    def register(
+        self,
+        name: str,
+        tool_type: ToolType,
+        handler: ToolHandler,
+        schema: Dict[str, Any],
+        cache_ttl: float = 0,
+        cache_per_session: bool = False,
+        cache_version: Optional[CacheVersion] = None
+    ):
+        """Offer a tool to the model; schema holds the function's description and parameters.
+
+        A positive cache_ttl makes results cacheable, so only register one for tools
+        without side effects. Results are shared across sessions unless
+        cache_per_session is set.
+        """
+        self.handlers[name] = {
+            "type": tool_type,
+            "handler": handler,
+            "schema": schema,
+            "cache_ttl": cache_ttl,
+            "cache_per_session": cache_per_session,
+            "cache_version": cache_version
+        }
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """Tool definitions in the OpenAI chat completions format"""
+        return [
+            {"type": "function", "function": {"name": name, **registered["schema"]}}
+            for name, registered in self.handlers.items()
+        ]
+
+    def _semaphore(self, tool_type: ToolType) -> asyncio.Semaphore:
+        # Created on first use so they bind to the running loop
+        semaphore = self._semaphores.get(tool_type)
+        if semaphore is None:
+            semaphore = self._semaphores[tool_type] = asyncio.Semaphore(self.limits.get(tool_type, 1))
+        return semaphore
+
+    async def execute(self, session_id: str, calls: List[Dict[str, Any]]) -> AsyncGenerator[ToolEntity, None]:
+        """Run a turn's tool calls and yield each tool when queued and again when it finishes.
+
+        Each call is {"id", "name", "arguments"}, arguments being the model's JSON string.
+        """
+        tools = []
+        for call in calls[:settings.tool_max_calls_per_turn]:
+            tool = self._build(session_id, call)
+            await self._save(tool)
+            tools.append(tool)
+            yield tool
+
+        by_id = {tool.tool_id: tool for tool in tools}
+        runnable = [tool for tool in tools if tool.status == ToolStatus.PENDING]
+        batch = CommandBatch(
+            [{"id": tool.tool_id, "depends_on": deps} for tool, deps in zip(runnable, self._dependencies(runnable))],
+            max_parallel=len(runnable) or 1
+        )
+        async for result in batch.results(lambda command: self._run(by_id[command["id"]])):
+            tool = by_id[result["id"]]
+            await self._save(tool)
+            yield tool
+
+    def _build(self, session_id: str, call: Dict[str, Any]) -> ToolEntity:
+        name = call.get("name", "")
+        registered = self.handlers.get(name)
+        raw = call.get("arguments") or "{}"
+        try:
+            arguments = json.loads(raw) if isinstance(raw, str) else raw
+            error = None if isinstance(arguments, dict) else "Arguments must be a JSON object"
+        except json.JSONDecodeError as e:
+            arguments, error = {}, f"Invalid arguments: {e}"
+        if registered is None:
+            error = f"Unknown tool: {name}"
+        tool = ToolEntity(
+            tool_id=str(uuid.uuid4()),
+            session_id=session_id,
+            tool_type=registered["type"] if registered else ToolType.SHELL,
+            input_data={"name": name, "tool_call_id": call.get("id"), "arguments": arguments if isinstance(arguments, dict) else {}}
+        )
+        self.counters["calls"] += 1
+        if error:
+            self._finish(tool, None, error)
+        return tool
+
+    def _dependencies(self, tools: List[ToolEntity]) -> List[List[str]]:
+        def touches(tool: ToolEntity) -> Tuple[Optional[str], bool]:
+            """(path or "*" for the whole sandbox, writes) of a call; path None if it touches no files"""
+            name = tool.input_data["name"]
+            if tool.tool_type == ToolType.SHELL:
+                return "*", True
+            if tool.tool_type == ToolType.FILE:
+                path = tool.input_data["arguments"].get("path")
+                return posixpath.normpath(path) if isinstance(path, str) else "*", name != "file_read"
+            return None, False
+
+        dependencies = []
+        for index, tool in enumerate(tools):
+            path, writes = touches(tool)
+            deps = []
+            for earlier in tools[:index]:
+                other_path, other_writes = touches(earlier)
+                if path is None or other_path is None:
+                    continue
+                if (path == other_path or "*" in (path, other_path)) and (writes or other_writes):
+                    deps.append(earlier.tool_id)
+            dependencies.append(deps)
+        return dependencies
+
+    async def _run(self, tool: ToolEntity) -> Dict[str, Any]:
+        registered = self.handlers[tool.input_data["name"]]
+        async with self._semaphore(registered["type"]):
+            tool.status = ToolStatus.RUNNING
+            await self._save(tool)
+            try:
+                output = await asyncio.wait_for(self._call(tool, registered), timeout=settings.tool_timeout_seconds)
+                self._finish(tool, output, None if output.get("success", True) else output.get("error", "Tool failed"))
+            except asyncio.TimeoutError:
+                self.counters["timed_out"] += 1
+                self._finish(tool, None, "Tool timed out")
+            except KeyError as e:
+                self._finish(tool, None, f"Missing argument: {e.args[0]}")
+            except Exception as e:
+                logger.error("Tool execution failed", tool_id=tool.tool_id, name=tool.input_data["name"], error=str(e))
+                self._finish(tool, None, str(e))
+        # The batch only needs to know the call is over, whatever its outcome
+        return {"id": tool.tool_id, "status": "completed"}
+
+    async def _call(self, tool: ToolEntity, registered: Dict[str, Any]) -> Dict[str, Any]:
+        name = tool.input_data["name"]
+        arguments = tool.input_data["arguments"]
+        run = lambda: registered["handler"](tool.session_id, arguments)
+        if not settings.tool_cache_enabled or registered["cache_ttl"] <= 0:
+            return await run()
+        version = None
+        if registered["cache_version"] is not None:
+            version = await registered["cache_version"](tool.session_id, arguments)
+            if version is None:
+                return await run()
+        key = self.result_cache.key(
+            name,
+            registered["type"].value,
+            arguments,
+            scope=tool.session_id if registered["cache_per_session"] else None,
+            version=version
+        )
+        output, source = await self.result_cache.get_or_run(name, key, registered["cache_ttl"], run)
+        # Copy: the cached dict is shared with other callers
+        return {
+            **output,
+            "cache": {
+                "hit": source is not None,
+                "source": source,
+                "key": key[:16],
+                "hit_rate": self.result_cache.hit_rate(name)
+            }
+        }
+
+    def _finish(self, tool: ToolEntity, output: Optional[Dict[str, Any]], error: Optional[str]):
+        tool.output_data = output
+        tool.error_message = error
+        tool.status = ToolStatus.FAILED if error else ToolStatus.COMPLETED
+        tool.completed_at = datetime.utcnow()
+        self.counters["failed" if error else "completed"] += 1
+
+    async def _save(self, tool: ToolEntity):
+        try:
+            if settings.write_behind_enabled:
+                await batch_writer.save_tool(tool)
+            elif tool.status == ToolStatus.PENDING:
+                await self.tool_repo.create(tool)
+            else:
+                await self.tool_repo.update(tool)
+        except Exception as e:
+            # Tool records are an audit trail; losing one must not fail the turn
+            logger.warning("Tool record write failed", tool_id=tool.tool_id, error=str(e))
+
+    async def _shell_exec(self, session_id: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        # The session's persistent shell, so the user sees the command in its console
+        result = await self.sandbox_service.execute_shell_command(
+            session_id,
+            arguments["command"],
+            timeout=settings.tool_timeout_seconds,
+            workdir=arguments.get("workdir")
+        )
+        output = result["output"]
+        status = result.pop("status")
+        result["truncated"] = len(output) > settings.shell_batch_max_output_bytes
+        result["output"] = output[:settings.shell_batch_max_output_bytes]
+        # A non-zero exit is still a result the model can act on; the shell
+        # timing out or being unavailable fails the call
+        result["success"] = status == "completed"
+        if not result["success"]:
+            result["error"] = output
+        return result
+
+    async def _file_read(self, session_id: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self.sandbox_service.read_file(session_id, arguments["path"])
+        if not result["success"]:
+            result["error"] = result.pop("content")
+        return result
+
+    async def _file_version(self, session_id: str, arguments: Dict[str, Any]) -> Optional[str]:
+        return await self.sandbox_service.file_etag(session_id, arguments["path"])
+
+    async def _file_write(self, session_id: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self.sandbox_service.write_file(session_id, arguments["path"], arguments["content"])
+        if not result["success"]:
+            result["error"] = result["message"]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "tools": sorted(self.handlers)}
@@ -27,6 +27,7 @@ class ChatRequest(BaseModel):
     message: str = Field(..., description="User message content")
     timestamp: Optional[int] = Field(None, description="Message timestamp")
     event_id: Optional[str] = Field(None, description="Event identifier")
+    coalesce_ms: Optional[int] = Field(None, ge=0, description="Message chunk coalescing window in milliseconds, 0 disables")
 
 class ChatEvent(BaseModel):
     event: str = Field(..., description="Event type")
@@ -40,3 +40,4 @@ class SessionResponse(BaseModel):
 
 class SessionListResponse(BaseModel):
     sessions: List[SessionResponse]
+    next_cursor: Optional[str] = None
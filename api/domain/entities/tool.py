@@ -35,6 +35,27 @@ class ToolEntity(BaseModel):
 class ShellRequest(BaseModel):
     session_id: str = Field(..., description="Shell session ID")
 
+class ShellWriteRequest(BaseModel):
+    session_id: str = Field(..., description="Shell session ID")
+    input: str = Field(..., description="Text to send to the shell")
+    press_enter: bool = Field(True, description="Append a newline after the input")
+
+class ShellExecRequest(BaseModel):
+    command: str = Field(..., description="Command to run with /bin/sh -c")
+    workdir: Optional[str] = Field(None, description="Working directory inside the sandbox")
+    max_output_bytes: Optional[int] = Field(None, gt=0, description="Output cap; defaults to the server limit")
+
+class BatchCommand(BaseModel):
+    id: str = Field(..., description="Command identifier, unique within the batch")
+    command: str = Field(..., description="Command to run with /bin/sh -c")
+    workdir: Optional[str] = Field(None, description="Working directory inside the sandbox")
+    timeout: Optional[float] = Field(None, gt=0, description="Seconds before the command is killed")
+    depends_on: List[str] = Field(default_factory=list, description="Ids that must complete successfully first")
+
+class ShellBatchRequest(BaseModel):
+    commands: List[BatchCommand] = Field(..., min_length=1, description="Commands to run")
+    max_parallel: Optional[int] = Field(None, gt=0, description="Concurrent commands; capped by the server limit")
+
 class ShellResponse(BaseModel):
     output: str = Field(..., description="Shell output content")
     session_id: str = Field(..., description="Shell session ID")
@@ -46,3 +67,5 @@ class FileRequest(BaseModel):
 class FileResponse(BaseModel):
     content: str = Field(..., description="File content")
     file: str = Field(..., description="File path")
+    size: Optional[int] = Field(None, description="Full file size in bytes")
+    truncated: Optional[bool] = Field(None, description="Whether content stops before the requested end")
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
+from datetime import datetime
 from domain.entities.message import MessageEntity
 
 class MessageRepository(ABC):
@@ -11,6 +12,23 @@ class MessageRepository(ABC):
     async def get_by_session_id(self, session_id: str) -> List[MessageEntity]:
         pass
     
+    @abstractmethod
+    async def get_page_by_session_id(
+        self,
+        session_id: str,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> List[MessageEntity]:
+        pass
+    
+    @abstractmethod
+    def iter_by_session_id(self, session_id: str) -> AsyncIterator[MessageEntity]:
+        pass
+    
+    @abstractmethod
+    async def count_by_session_id(self, session_id: str, limit: Optional[int] = None) -> int:
+        pass
+    
     @abstractmethod
     async def get_by_id(self, message_id: str) -> Optional[MessageEntity]:
         pass
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
 from domain.entities.session import SessionEntity
 
 class SessionRepository(ABC):
@@ -15,6 +16,10 @@ class SessionRepository(ABC):
     async def get_all(self) -> List[SessionEntity]:
         pass
     
+    @abstractmethod
+    async def list_page(self, limit: int, after: Optional[Tuple[datetime, str]] = None) -> List[SessionEntity]:
+        pass
+    
     @abstractmethod
     async def update(self, session: SessionEntity) -> SessionEntity:
         pass
@@ -26,3 +31,7 @@ class SessionRepository(ABC):
     @abstractmethod
     async def update_status(self, session_id: str, status: str) -> bool:
         pass
+    
+    @abstractmethod
+    async def patch(self, session_id: str, fields: Dict[str, Any], inc: Optional[Dict[str, int]] = None) -> bool:
+        pass
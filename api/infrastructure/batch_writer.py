@@ -0,0 +1,328 @@
+import asyncio
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from domain.entities.message import MessageEntity
+from domain.entities.session import SessionEntity
+from domain.entities.tool import ToolEntity
+from infrastructure.config import get_settings
+from infrastructure.database import get_database
+from infrastructure.session_cache import session_cache
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+DUPLICATE_KEY_ERROR = 11000
+
+class BatchWriter:
+    """App-scoped write-behind queue for message inserts, session updates and tool records.
+
+    Writes are buffered and flushed with insert_many / bulk_write when the batch
+    size is reached or the flush interval elapses. Updates to the same session are
+    merged into a single operation, and so are successive states of the same
+    tool. Callers that need to read their own writes call flush_session first,
+    which waits for any in-flight flush touching the session.
+
+    Failed writes go back to the front of the queue and are retried with
+    exponential backoff. They are only dropped once the queue outgrows
+    write_behind_max_queue or the failures have lasted write_behind_max_failure_seconds.
+    """
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self.session_updates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Latest full document per tool_id; status transitions collapse into one upsert
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        # Pending operation count per session, including the batch being flushed
+        self.pending = Counter()
+        self.pending_messages = Counter()
+        self.failures = 0
+        # Loop time of the first failure in the current streak, and of the next attempt
+        self.failing_since: Optional[float] = None
+        self.retry_at = 0.0
+        self.counters = {"flush_failures": 0, "dropped_messages": 0, "dropped_session_updates": 0, "dropped_tools": 0}
+        self.task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """Start the background flush loop"""
+        if self.task is None:
+            self._lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def add_message(self, message: MessageEntity):
+        """Queue a message insert"""
+        await self.start()
+        message_dict = message.dict()
+        message_dict["_id"] = message.message_id
+        self.messages.append(message_dict)
+        self.pending[message.session_id] += 1
+        self.pending_messages[message.session_id] += 1
+        self._maybe_wakeup()
+
+    async def update_session(
+        self,
+        session_id: str,
+        fields: Dict[str, Any],
+        inc: Optional[Dict[str, int]] = None
+    ):
+        """Queue a partial session update, merged with any pending update for the session"""
+        await self.start()
+        update = self.session_updates.get(session_id)
+        if update is None:
+            update = self.session_updates[session_id] = {"$set": {}, "$inc": {}}
+            self.pending[session_id] += 1
+        # Mongo rejects $set and $inc on the same field, so fold them together
+        for field, value in fields.items():
+            update["$inc"].pop(field, None)
+            update["$set"][field] = value
+        for field, amount in (inc or {}).items():
+            if field in update["$set"]:
+                update["$set"][field] += amount
+            else:
+                update["$inc"][field] = update["$inc"].get(field, 0) + amount
+        self._maybe_wakeup()
+
+    async def save_tool(self, tool: ToolEntity):
+        """Queue an upsert of a tool record, replacing any queued state of the same tool"""
+        await self.start()
+        tool_dict = tool.dict()
+        tool_dict["_id"] = tool_dict.pop("tool_id")
+        if tool.tool_id not in self.tools:
+            self.pending[tool.session_id] += 1
+        self.tools[tool.tool_id] = tool_dict
+        self._maybe_wakeup()
+
+    def has_pending(self, session_id: str) -> bool:
+        return self.pending[session_id] > 0
+
+    def pending_message_count(self, session_id: str) -> int:
+        """Message inserts for a session that are queued or being flushed"""
+        return self.pending_messages[session_id]
+
+    def overlay_session(self, session: SessionEntity) -> SessionEntity:
+        """The session with its queued (not yet flushing) partial update applied.
+
+        Lets reads show pending changes without forcing a flush. Updates already
+        being flushed are left out, since their $inc may have landed already.
+        """
+        update = self.session_updates.get(session.session_id)
+        if update is None:
+            return session
+        fields = dict(update["$set"])
+        for field, amount in update["$inc"].items():
+            fields[field] = (getattr(session, field, 0) or 0) + amount
+        return session.copy(update=fields)
+
+    async def flush_session(self, session_id: str):
+        """Make every queued write for the session visible to readers"""
+        if self.has_pending(session_id):
+            await self.flush()
+
+    def discard_session(self, session_id: str):
+        """Drop queued writes for a session that is being deleted"""
+        kept = [message for message in self.messages if message["session_id"] != session_id]
+        dropped = len(self.messages) - len(kept)
+        self.messages = kept
+        self._release_messages(session_id, dropped)
+        if self.session_updates.pop(session_id, None) is not None:
+            dropped += 1
+        for tool_id in [tool_id for tool_id, tool in self.tools.items() if tool["session_id"] == session_id]:
+            del self.tools[tool_id]
+            dropped += 1
+        self._release(session_id, dropped)
+
+    async def flush(self):
+        """Write all queued operations"""
+        if self._lock is None:
+            return
+        async with self._lock:
+            messages, self.messages = self.messages, []
+            session_updates, self.session_updates = self.session_updates, {}
+            tools, self.tools = self.tools, {}
+            if not messages and not session_updates and not tools:
+                return
+
+            failed_messages = await self._write_messages(messages)
+            failed_updates = await self._write_session_updates(session_updates)
+            failed_tools = await self._write_tools(tools)
+
+            if failed_messages or failed_updates or failed_tools:
+                self._fail()
+                if self._over_limits(len(failed_messages) + len(failed_updates) + len(failed_tools)):
+                    logger.error(
+                        "Dropping write-behind batch after repeated failures",
+                        messages=len(failed_messages),
+                        session_updates=len(failed_updates),
+                        tools=len(failed_tools),
+                        failures=self.failures
+                    )
+                    self.counters["dropped_messages"] += len(failed_messages)
+                    self.counters["dropped_session_updates"] += len(failed_updates)
+                    self.counters["dropped_tools"] += len(failed_tools)
+                    # Whatever is queued now gets a full window of its own
+                    self.failing_since = asyncio.get_running_loop().time()
+                else:
+                    # Put failed writes back in front of anything queued meanwhile
+                    failed = {id(message) for message in failed_messages}
+                    messages = [message for message in messages if id(message) not in failed]
+                    self.messages = failed_messages + self.messages
+                    for session_id, update in list(failed_updates.items()):
+                        session_updates.pop(session_id, None)
+                        self._merge_back(session_id, update)
+                    for tool_id, tool in failed_tools.items():
+                        tools.pop(tool_id, None)
+                        if tool_id in self.tools:
+                            # A newer state was queued meanwhile and supersedes this one
+                            self._release(tool["session_id"], 1)
+                        else:
+                            self.tools[tool_id] = tool
+            else:
+                self.failures = 0
+                self.failing_since = None
+                self.retry_at = 0.0
+
+            for message in messages:
+                self._release(message["session_id"], 1)
+                self._release_messages(message["session_id"], 1)
+            for session_id in session_updates:
+                self._release(session_id, 1)
+            for tool in tools.values():
+                self._release(tool["session_id"], 1)
+
+    async def _write_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not messages:
+            return []
+        db = await get_database()
+        try:
+            await db.messages.insert_many(messages, ordered=False)
+            return []
+        except BulkWriteError as e:
+            # Duplicates come from a retried batch that partially landed before
+            failed = {
+                error["index"] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            }
+            if failed:
+                logger.error("Message batch insert partially failed", failed=len(failed))
+            return [messages[index] for index in sorted(failed)]
+        except Exception as e:
+            logger.error("Message batch insert failed", count=len(messages), error=str(e))
+            return messages
+
+    async def _write_session_updates(self, session_updates: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        if not session_updates:
+            return {}
+        db = await get_database()
+        operations = [
+            UpdateOne({"_id": session_id}, {operator: fields for operator, fields in update.items() if fields})
+            for session_id, update in session_updates.items()
+        ]
+        try:
+            await db.sessions.bulk_write(operations, ordered=False)
+            # Sessions were changed behind the repository, so drop cached copies
+            await session_cache.invalidate_many(session_updates.keys())
+            return {}
+        except Exception as e:
+            logger.error("Session batch update failed", count=len(operations), error=str(e))
+            return session_updates
+
+    async def _write_tools(self, tools: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        if not tools:
+            return {}
+        db = await get_database()
+        operations = [ReplaceOne({"_id": tool_id}, tool, upsert=True) for tool_id, tool in tools.items()]
+        try:
+            await db.tools.bulk_write(operations, ordered=False)
+            return {}
+        except Exception as e:
+            logger.error("Tool batch write failed", count=len(operations), error=str(e))
+            return tools
+
+    def _merge_back(self, session_id: str, update: Dict[str, Dict[str, Any]]):
+        pending = self.session_updates.get(session_id)
+        if pending is None:
+            self.session_updates[session_id] = update
+            return
+        # Newer $set values win, $inc amounts add up
+        for field, value in update["$set"].items():
+            if field in pending["$inc"]:
+                pending["$set"][field] = value + pending["$inc"].pop(field)
+            elif field not in pending["$set"]:
+                pending["$set"][field] = value
+        for field, amount in update["$inc"].items():
+            if field in pending["$set"]:
+                continue
+            pending["$inc"][field] = pending["$inc"].get(field, 0) + amount
+        self._release(session_id, 1)
+
+    def _fail(self):
+        now = asyncio.get_running_loop().time()
+        self.failures += 1
+        self.counters["flush_failures"] += 1
+        if self.failing_since is None:
+            self.failing_since = now
+        delay = min(
+            settings.write_behind_retry_base_ms * 2 ** (self.failures - 1),
+            settings.write_behind_retry_max_ms
+        )
+        self.retry_at = now + delay / 1000
+
+    def _over_limits(self, failed: int) -> bool:
+        # The failed writes are not back in the queue yet
+        queued = failed + len(self.messages) + len(self.session_updates) + len(self.tools)
+        for_too_long = asyncio.get_running_loop().time() - self.failing_since >= settings.write_behind_max_failure_seconds
+        return queued >= settings.write_behind_max_queue or for_too_long
+
+    def _release(self, session_id: str, count: int):
+        self.pending[session_id] -= count
+        if self.pending[session_id] <= 0:
+            del self.pending[session_id]
+
+    def _release_messages(self, session_id: str, count: int):
+        self.pending_messages[session_id] -= count
+        if self.pending_messages[session_id] <= 0:
+            del self.pending_messages[session_id]
+
+    def _maybe_wakeup(self):
+        if len(self.messages) + len(self.session_updates) + len(self.tools) >= settings.write_behind_max_batch:
+            self._wakeup.set()
+
+    async def _run(self):
+        interval = settings.write_behind_flush_interval_ms / 1000
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(interval, self.retry_at - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if loop.time() < self.retry_at:
+                # Backing off: a full batch does not bring the next attempt forward
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush failed", error=str(e))
+
+    async def close(self):
+        """Stop the flush loop and write everything still queued"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued": len(self.messages) + len(self.session_updates) + len(self.tools),
+            "failures": self.failures
+        }
+
+# Global write-behind batch writer instance
+batch_writer = BatchWriter()
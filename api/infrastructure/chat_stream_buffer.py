@@ -0,0 +1,86 @@
+from typing import List, Optional, Tuple
+from infrastructure.config import get_settings
+from infrastructure.redis_client import RedisClient, redis_client
+
+settings = get_settings()
+
+class ChatStreamBuffer:
+    """Capped per-session Redis Stream of SSE frames, used to replay missed events.
+
+    Entry ids are "<turn>-<seq>": the per-session turn counter followed by the frame
+    sequence within that turn. They are valid explicit Redis Stream ids, increase
+    monotonically across turns and double as the SSE ``id:`` field.
+    """
+
+    def __init__(self, redis: RedisClient = redis_client):
+        self.redis = redis
+
+    def _stream_key(self, session_id: str) -> str:
+        return f"chat_stream:{session_id}"
+
+    def _turn_key(self, session_id: str) -> str:
+        return f"chat_stream:{session_id}:turn"
+
+    def _active_key(self, session_id: str) -> str:
+        return f"chat_stream:{session_id}:active"
+
+    async def next_turn(self, session_id: str) -> int:
+        """Allocate the next turn number for a session"""
+        return await self.redis.incr(self._turn_key(session_id), expire=settings.chat_stream_ttl_seconds)
+
+    async def begin_turn(self, session_id: str) -> Optional[int]:
+        """Allocate the next turn and mark it in progress, or None if another turn still is.
+
+        The mark is a lease the producer renews, so a worker dying mid-turn does
+        not lock the session for longer than chat_stream_turn_lease_seconds.
+        """
+        turn = await self.next_turn(session_id)
+        # A turn number lost to a refused claim only leaves a gap in the ids
+        if not await self.redis.set(self._active_key(session_id), turn, expire=settings.chat_stream_turn_lease_seconds, nx=True):
+            return None
+        return turn
+
+    async def renew_turn(self, session_id: str):
+        """Extend the in-progress lease of the session's current turn"""
+        pipe = self.redis.pipeline()
+        pipe.expire(self._active_key(session_id), settings.chat_stream_turn_lease_seconds)
+        await pipe.execute()
+
+    async def end_turn(self, session_id: str, turn: int):
+        """Clear the in-progress mark, unless it has since passed to another turn"""
+        if await self.active_turn(session_id) == turn:
+            await self.redis.delete(self._active_key(session_id))
+
+    async def active_turn(self, session_id: str) -> Optional[int]:
+        """Turn number still being generated, None if the session is idle"""
+        turn = await self.redis.get(self._active_key(session_id))
+        return int(turn) if turn is not None else None
+
+    async def append(self, session_id: str, event_id: str, event: str, frame: bytes):
+        """Append an encoded frame to the session stream"""
+        pipe = self.redis.pipeline()
+        pipe.xadd(
+            self._stream_key(session_id),
+            {"event": event, "frame": frame.decode("utf-8")},
+            id=event_id,
+            maxlen=settings.chat_stream_maxlen,
+            approximate=True
+        )
+        # Both keys share one TTL: if the counter expired first while the stream
+        # lived on, the next turn would restart at 1, below the stream's last id
+        pipe.expire(self._stream_key(session_id), settings.chat_stream_ttl_seconds)
+        pipe.expire(self._turn_key(session_id), settings.chat_stream_ttl_seconds)
+        await pipe.execute()
+
+    async def read_after(
+        self,
+        session_id: str,
+        last_event_id: str,
+        block_ms: Optional[int] = None
+    ) -> List[Tuple[str, str, bytes]]:
+        """Read frames after last_event_id as (event_id, event, frame) tuples"""
+        entries = await self.redis.xread(self._stream_key(session_id), last_event_id, block=block_ms)
+        return [
+            (entry_id, fields["event"], fields["frame"].encode("utf-8"))
+            for entry_id, fields in entries
+        ]
@@ -20,10 +20,134 @@ class Settings(BaseSettings):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
     gemini_base_url: str = "https://generativelanguage.googleapis.com/v1beta"
+    openai_base_url: str = "https://api.openai.com/v1"
+    
+    # Upstream HTTP client pool
+    upstream_http2: bool = True
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry: float = 30.0
+    upstream_connect_timeout: float = 5.0
+    upstream_read_timeout: float = 60.0
+    upstream_write_timeout: float = 10.0
+    upstream_pool_timeout: float = 5.0
+    
+    # SSE message coalescing (0 disables)
+    sse_coalesce_window_ms: int = 0
+    sse_coalesce_max_bytes: int = 512
+    
+    # Resumable chat streams
+    chat_stream_maxlen: int = 2000
+    chat_stream_ttl_seconds: int = 3600
+    chat_stream_idle_timeout_seconds: float = 60.0
+    chat_stream_keepalive_seconds: float = 15.0
+    chat_stream_turn_lease_seconds: int = 60
+    chat_stream_subscriber_queue_size: int = 256
+    
+    # Write-behind persistence
+    write_behind_enabled: bool = True
+    write_behind_flush_interval_ms: int = 50
+    write_behind_max_batch: int = 500
+    write_behind_retry_base_ms: int = 100
+    write_behind_retry_max_ms: int = 5000
+    write_behind_max_queue: int = 20000
+    write_behind_max_failure_seconds: float = 120.0
+    
+    # Session cache
+    session_cache_enabled: bool = True
+    session_cache_ttl_seconds: int = 300
+    session_cache_local_size: int = 10000
+    session_cache_local_ttl_seconds: float = 5.0
     
     docker_image: str = os.getenv("DOCKER_IMAGE", "ubuntu:20.04")
     docker_network: str = os.getenv("DOCKER_NETWORK", "bridge")
     
+    # Docker executor
+    docker_max_workers: int = 16
+    docker_max_concurrency: int = 32
+    docker_op_timeout_seconds: float = 30.0
+    docker_create_timeout_seconds: float = 120.0
+    docker_exec_timeout_seconds: float = 300.0
+    docker_max_streams: int = 64
+    
+    # Streaming shell exec
+    shell_stream_queue_size: int = 64
+    shell_stream_max_output_bytes: int = 1048576
+    
+    # Batched shell exec
+    shell_batch_max_commands: int = 100
+    shell_batch_max_parallel: int = 8
+    shell_batch_default_timeout_seconds: float = 60.0
+    shell_batch_max_output_bytes: int = 262144
+    
+    # Persistent PTY shells
+    pty_shell_command: str = "/bin/bash"
+    pty_buffer_chars: int = 65536
+    pty_console_entries: int = 50
+    pty_console_entry_chars: int = 8192
+    pty_max_shells_per_session: int = 8
+    pty_owner_lease_seconds: int = 60
+    
+    # Sandbox file transfer
+    file_chunk_bytes: int = 65536
+    file_stream_queue_size: int = 16
+    file_view_max_bytes: int = 1048576
+    file_spool_memory_bytes: int = 8388608
+    file_upload_max_bytes: int = 536870912
+    
+    # Sandbox file view cache
+    file_cache_max_entries: int = 1000
+    file_cache_max_bytes: int = 67108864
+    file_cache_max_entry_bytes: int = 1048576
+    file_cache_ttl_seconds: float = 600.0
+    file_stat_batch_window_ms: int = 5
+    
+    # Sandbox warm pool (max 0 disables)
+    warm_pool_min_size: int = 2
+    warm_pool_max_size: int = 10
+    warm_pool_rate_window_seconds: float = 300.0
+    warm_pool_refill_interval_seconds: float = 5.0
+    warm_pool_heartbeat_ttl_seconds: float = 30.0
+    
+    # Sandbox registry
+    sandbox_registry_local_size: int = 10000
+    sandbox_registry_local_ttl_seconds: float = 30.0
+    sandbox_touch_interval_seconds: float = 15.0
+    
+    # Sandbox reaper and host capacity (memory 0 disables the memory budget)
+    sandbox_idle_ttl_seconds: int = 1800
+    sandbox_idle_after_seconds: int = 60
+    sandbox_reaper_interval_seconds: int = 30
+    sandbox_max_containers: int = 50
+    sandbox_memory_limit_mb: int = 2048
+    sandbox_max_memory_mb: int = 0
+    
+    # Sandbox snapshots (max bytes 0 disables)
+    sandbox_snapshot_repository: str = "riadex-snapshot"
+    sandbox_snapshot_max_bytes: int = 21474836480
+    sandbox_snapshot_max_layers: int = 16
+    sandbox_snapshot_timeout_seconds: float = 300.0
+    
+    # Tool execution from chat turns (per-type limits are per worker)
+    tool_calling_enabled: bool = False
+    tool_max_calls_per_turn: int = 16
+    tool_timeout_seconds: float = 120.0
+    tool_concurrency_shell: int = 8
+    tool_concurrency_file: int = 16
+    
+    # Tool result cache (per-tool TTLs are set where tools are registered)
+    tool_cache_enabled: bool = True
+    tool_cache_local_size: int = 1000
+    tool_cache_local_ttl_seconds: float = 60.0
+    tool_cache_max_entry_bytes: int = 262144
+    tool_cache_file_read_ttl_seconds: float = 300.0
+    
+    # VNC relay (sandbox VNC ports are published on this host)
+    sandbox_vnc_host: str = "127.0.0.1"
+    vnc_relay_max_frame_bytes: int = 1048576
+    vnc_relay_high_water_bytes: int = 262144
+    vnc_relay_connect_timeout_seconds: float = 10.0
+    
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
@@ -31,13 +31,21 @@ async def init_database():
 async def create_indexes():
     """Create database indexes"""
     try:
-        # Sessions collection indexes
+        # Sessions collection indexes: the (created_at, _id) keyset index covers
+        # listing, so the single-field created_at index it replaces is dropped
         await db.database.sessions.create_index("session_id", unique=True)
-        await db.database.sessions.create_index("created_at")
+        await db.database.sessions.create_index([("created_at", -1), ("_id", -1)])
+        existing = await db.database.sessions.index_information()
+        if "created_at_1" in existing:
+            await db.database.sessions.drop_index("created_at_1")
         
-        # Messages collection indexes
-        await db.database.messages.create_index("session_id")
-        await db.database.messages.create_index("timestamp")
+        # Messages collection indexes: one compound index serves history reads,
+        # keyset pages and counts; the single-field ones it replaces are dropped
+        await db.database.messages.create_index([("session_id", 1), ("timestamp", 1), ("_id", 1)])
+        existing = await db.database.messages.index_information()
+        for name in ("session_id_1", "timestamp_1"):
+            if name in existing:
+                await db.database.messages.drop_index(name)
         
         # Tools collection indexes
         await db.database.tools.create_index("session_id")
@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, Iterable, Optional, TypeVar
+from infrastructure.config import get_settings
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+T = TypeVar("T")
+
+_END = object()
+
+class DockerExecutor:
+    """Runs blocking docker SDK calls on a dedicated, bounded thread pool.
+
+    Keeps the event loop free while containers start or commands run. Each call
+    waits for a concurrency slot and is bounded by a per-operation timeout; a
+    timed-out call is abandoned by the caller while its thread finishes in the
+    background. Long-lived stream readers get their own pool so they cannot
+    starve short operations of slots.
+
+    Threads cannot be interrupted: after a timeout the slot is released but the
+    worker thread stays busy until the blocking call returns. Stream readers
+    should pass iterate a close hook that unblocks them.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrency: Optional[int] = None):
+        self.max_workers = max_workers or settings.docker_max_workers
+        self.max_concurrency = max_concurrency or settings.docker_max_concurrency
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.stream_pool: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.counters: Dict[str, int] = {"calls": 0, "timeouts": 0, "errors": 0, "streams": 0, "active_streams": 0}
+
+    def _ensure_started(self):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="docker")
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        """Run fn(*args, **kwargs) off the event loop.
+
+        On timeout the call is abandoned, not stopped: its worker thread stays
+        occupied until fn returns.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        timeout = settings.docker_op_timeout_seconds if timeout is None else timeout
+        self.counters["calls"] += 1
+        async with self._semaphore:
+            try:
+                return await asyncio.wait_for(loop.run_in_executor(self.pool, call), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                logger.warning("Docker operation timed out", operation=getattr(fn, "__name__", str(fn)), timeout=timeout)
+                raise
+            except Exception:
+                self.counters["errors"] += 1
+                raise
+
+    async def run_stream(self, fn: Callable[..., T], *args: Any, timeout: Optional[float], **kwargs: Any) -> T:
+        """Run a long-lived reader, e.g. one draining an exec or attach socket (timeout None: unbounded).
+
+        As with run, a timed-out reader keeps its stream pool thread until it returns.
+        """
+        if self.stream_pool is None:
+            self.stream_pool = ThreadPoolExecutor(max_workers=settings.docker_max_streams, thread_name_prefix="docker-stream")
+        loop = asyncio.get_running_loop()
+        self.counters["streams"] += 1
+        self.counters["active_streams"] += 1
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.stream_pool, functools.partial(fn, *args, **kwargs)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+        finally:
+            self.counters["active_streams"] -= 1
+
+    async def iterate(
+        self,
+        produce: Callable[[], Iterable[T]],
+        queue_size: int,
+        timeout: Optional[float],
+        close: Optional[Callable[[], None]] = None
+    ) -> AsyncGenerator[T, None]:
+        """Drain a blocking iterable on the stream pool and yield its items.
+
+        Items cross to the event loop through a queue bounded by a semaphore: when
+        the consumer falls behind the reader thread stops pulling, so backpressure
+        reaches the underlying socket instead of piling up in memory. Closing the
+        generator stops the reader at its next item; a reader blocked waiting for
+        that item is only released by close, e.g. one shutting down the socket it
+        reads, which is called if the reader is still running when iteration stops.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(queue_size)
+        stopped = threading.Event()
+
+        def deliver(item: Any) -> bool:
+            # Wait for queue space, giving up if the consumer went away
+            while not slots.acquire(timeout=0.5):
+                if stopped.is_set():
+                    return False
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+            return True
+
+        def pump():
+            items = produce()
+            try:
+                for item in items:
+                    if stopped.is_set() or not deliver(item):
+                        return
+            finally:
+                if hasattr(items, "close"):
+                    items.close()
+                deliver(_END)
+
+        reader = asyncio.ensure_future(self.run_stream(pump, timeout=timeout))
+        try:
+            while True:
+                if reader.done() and queue.empty():
+                    # Reader timed out or failed before it could signal the end
+                    break
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                item = getter.result()
+                slots.release()
+                if item is _END:
+                    break
+                yield item
+            # Surfaces a timeout or an error raised by the iterable
+            await reader
+        finally:
+            stopped.set()
+            if not reader.done():
+                if close is not None:
+                    try:
+                        close()
+                    except Exception as e:
+                        logger.warning("Failed to close abandoned stream", error=str(e))
+                reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        if self.stream_pool is not None:
+            self.stream_pool.shutdown(wait=False)
+            self.stream_pool = None
@@ -0,0 +1,64 @@
+import socket
+from typing import Any, AsyncGenerator, Iterator, List, Optional, Tuple, Union
+import docker
+from docker.utils.socket import STDOUT, frames_iter
+from infrastructure.docker_executor import DockerExecutor
+
+def _close(sock: Any):
+    raw = getattr(sock, "_sock", sock)
+    try:
+        # shutdown wakes a reader blocked in recv; close alone may not
+        raw.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    raw.close()
+
+async def stream_exec(
+    docker_client: docker.DockerClient,
+    executor: DockerExecutor,
+    container_id: str,
+    cmd: Union[str, List[str]],
+    max_bytes: int,
+    queue_size: int,
+    timeout: float,
+    workdir: Optional[str] = None
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """Run a command in a container and yield its output as it is produced.
+
+    Yields ("stdout" | "stderr", bytes) chunks, a single ("truncated", max_bytes)
+    once the output cap is reached, and finally ("exit", exit_code).
+
+    Frames are read off the Docker socket by DockerExecutor.iterate, so a slow
+    consumer stalls the reader rather than buffering output. Output past the cap
+    is read and discarded so the command can still finish and report its exit
+    code. The exec socket is closed when the stream stops, which also releases
+    a reader still blocked on it; the process itself keeps running unless the
+    command bounds its own runtime (e.g. with coreutils timeout).
+    """
+    api = docker_client.api
+    exec_id = await executor.run(api.exec_create, container_id, cmd, stdout=True, stderr=True, tty=False, workdir=workdir)
+    # The raw socket rather than stream=True, whose generator offers no way to close it
+    sock = await executor.run(api.exec_start, exec_id, socket=True)
+
+    def chunks() -> Iterator[Tuple[str, Any]]:
+        sent = 0
+        truncated = False
+        for stream, data in frames_iter(sock, tty=False):
+            if not data or truncated:
+                continue
+            if sent + len(data) > max_bytes:
+                data = data[:max_bytes - sent]
+                truncated = True
+            sent += len(data)
+            if data:
+                yield "stdout" if stream == STDOUT else "stderr", data
+            if truncated:
+                yield "truncated", max_bytes
+
+    try:
+        async for item in executor.iterate(chunks, queue_size=queue_size, timeout=timeout, close=lambda: _close(sock)):
+            yield item
+    finally:
+        _close(sock)
+    inspect = await executor.run(api.exec_inspect, exec_id)
+    yield "exit", inspect.get("ExitCode")
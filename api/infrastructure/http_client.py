@@ -0,0 +1,89 @@
+import httpx
+from infrastructure.config import get_settings
+import structlog
+from typing import Any, Dict
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+class UpstreamClients:
+    """App-scoped pooled HTTP clients, one per upstream LLM provider"""
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _base_urls(self) -> Dict[str, str]:
+        return {
+            "gemini": settings.gemini_base_url,
+            "openai": settings.openai_base_url,
+        }
+
+    def _build_client(self, provider: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.upstream_max_connections,
+            max_keepalive_connections=settings.upstream_max_keepalive_connections,
+            keepalive_expiry=settings.upstream_keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.upstream_connect_timeout,
+            read=settings.upstream_read_timeout,
+            write=settings.upstream_write_timeout,
+            pool=settings.upstream_pool_timeout,
+        )
+        return httpx.AsyncClient(
+            base_url=self._base_urls().get(provider, ""),
+            http2=settings.upstream_http2,
+            limits=limits,
+            timeout=timeout,
+        )
+
+    async def connect(self):
+        """Create the upstream clients"""
+        for provider in self._base_urls():
+            self.clients[provider] = self._build_client(provider)
+        logger.info("Upstream HTTP clients created", providers=list(self.clients), http2=settings.upstream_http2)
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """Get the shared client for a provider, creating it lazily if needed"""
+        client = self.clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._build_client(provider)
+            self.clients[provider] = client
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool statistics per provider"""
+        return {provider: self._pool_stats(client) for provider, client in self.clients.items()}
+
+    def _pool_stats(self, client: httpx.AsyncClient) -> Dict[str, Any]:
+        # httpx does not expose its pool publicly, so read the httpcore pool behind the default transport
+        pool = getattr(client._transport, "_pool", None)
+        if pool is None:
+            return {}
+
+        connections = list(pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        in_use = sum(1 for connection in connections if not connection.is_idle() and not connection.is_closed())
+        waiters = 0
+        for request in list(getattr(pool, "_requests", [])):
+            if hasattr(request, "is_queued"):
+                waiters += request.is_queued()
+            elif getattr(request, "connection", None) is None:
+                waiters += 1
+
+        return {
+            "connections": len(connections),
+            "in_use": in_use,
+            "idle": idle,
+            "waiters": waiters,
+            "max_connections": settings.upstream_max_connections,
+        }
+
+    async def close(self):
+        """Close all upstream clients"""
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+# Global upstream client registry
+upstream_clients = UpstreamClients()
@@ -0,0 +1,292 @@
+import asyncio
+import codecs
+import re
+import socket
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import docker
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+class TooManyShells(Exception):
+    pass
+
+class ShellOnOtherWorker(Exception):
+    pass
+
+# Markers are printed with the token passed as a printf argument, so an echoed
+# command line never matches; any line mentioning the prefix is hidden.
+MARKER_PREFIX = "__RIADEX_"
+MARKER_RE = re.compile(r"__RIADEX_(BEGIN|DONE)_([0-9a-f]{32})(?:_(\d+))?__")
+
+class OutputRing:
+    """Bounded text buffer that keeps only the most recent max_chars characters"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.chunks: Deque[str] = deque()
+        self.size = 0
+
+    def append(self, text: str):
+        self.chunks.append(text)
+        self.size += len(text)
+        while self.size > self.max_chars and len(self.chunks) > 1:
+            self.size -= len(self.chunks.popleft())
+
+    def text(self) -> str:
+        value = "".join(self.chunks)
+        return value[-self.max_chars:]
+
+class PtyShell:
+    """Long-lived interactive shell attached to a PTY inside a sandbox.
+
+    A reader thread drains the attached socket into a ring buffer and a short
+    console log, so viewing the shell never runs anything. run() multiplexes a
+    command over the same socket between a begin and a done marker, the latter
+    carrying the exit code; marker lines are filtered out of what the user sees.
+    """
+
+    def __init__(self, shell_id: str, container_id: str, docker_client: docker.DockerClient, executor: DockerExecutor):
+        self.shell_id = shell_id
+        self.container_id = container_id
+        self.docker_client = docker_client
+        self.executor = executor
+        self.ring = OutputRing(settings.pty_buffer_chars)
+        self.console: Deque[Dict[str, str]] = deque(maxlen=settings.pty_console_entries)
+        self.sock: Any = None
+        self.reader: Optional[asyncio.Future] = None
+        self.lock = asyncio.Lock()
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.capture: Optional[List[str]] = None
+        self.capture_token: Optional[str] = None
+        self.partial = ""
+
+    @property
+    def alive(self) -> bool:
+        return self.reader is not None and not self.reader.done()
+
+    async def open(self):
+        api = self.docker_client.api
+        exec_id = await self.executor.run(
+            api.exec_create,
+            self.container_id,
+            settings.pty_shell_command,
+            stdin=True,
+            tty=True,
+            environment={"TERM": "xterm", "PS1": "", "PS2": ""}
+        )
+        self.sock = await self.executor.run(api.exec_start, exec_id, socket=True, tty=True)
+        loop = asyncio.get_running_loop()
+        raw = self.sock._sock
+
+        def pump():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                data = raw.recv(65536)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    loop.call_soon_threadsafe(self._on_output, text)
+
+        self.reader = asyncio.ensure_future(self.executor.run_stream(pump, timeout=None))
+        self.reader.add_done_callback(lambda _: self._fail_pending())
+        # Echo, bracketed-paste escapes and prompts would all end up in captured output
+        await self.write("stty -echo 2>/dev/null; bind 'set enable-bracketed-paste off' 2>/dev/null; PS1=''; PS2=''\n")
+
+    def _on_output(self, text: str):
+        text = self.partial + text
+        self.partial = ""
+        lines = text.splitlines(keepends=True)
+        # Hold back a trailing fragment that may be the start of a marker
+        if lines and not lines[-1].endswith("\n"):
+            tail = lines[-1]
+            if tail.startswith(MARKER_PREFIX) or MARKER_PREFIX.startswith(tail):
+                self.partial = lines.pop()
+        for line in lines:
+            if MARKER_PREFIX in line:
+                match = MARKER_RE.search(line)
+                if match and match.group(1) == "BEGIN" and match.group(2) == self.capture_token:
+                    self.capture = []
+                elif match and match.group(1) == "DONE":
+                    self._complete(match.group(2), int(match.group(3)))
+                continue
+            self.ring.append(line)
+            if self.capture is not None:
+                self.capture.append(line)
+                entry = self.console[-1]
+                if len(entry["output"]) < settings.pty_console_entry_chars:
+                    entry["output"] += line
+
+    def _complete(self, token: str, exit_code: int):
+        future = self.pending.pop(token, None)
+        if future and not future.done():
+            future.set_result(exit_code)
+
+    def _fail_pending(self):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Shell exited"))
+        self.pending.clear()
+
+    async def write(self, data: str):
+        """Send raw input to the shell, e.g. keystrokes for an interactive program"""
+        await self.executor.run(self.sock._sock.sendall, data.encode("utf-8"))
+
+    async def run(self, command: str, timeout: float) -> Tuple[str, int]:
+        """Run one command in the shell and return its output and exit code"""
+        async with self.lock:
+            token = uuid.uuid4().hex
+            future = asyncio.get_running_loop().create_future()
+            self.pending[token] = future
+            self.capture_token = token
+            entry = {"ps1": "$ ", "command": command, "output": ""}
+            self.console.append(entry)
+            try:
+                await self.write(
+                    f"printf '\\n{MARKER_PREFIX}BEGIN_%s__\\n' {token}; {command}\n"
+                    f"printf '\\n{MARKER_PREFIX}DONE_%s_%s__\\n' {token} \"$?\"\n"
+                )
+                exit_code = await asyncio.wait_for(future, timeout=timeout)
+                output = "".join(self.capture or []).replace("\r\n", "\n")
+                # printf starts the marker on a fresh line; drop that newline
+                if output.endswith("\n"):
+                    output = output[:-1]
+                entry["output"] = output[:settings.pty_console_entry_chars]
+                return output, exit_code
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # Interrupt the command so the shell is usable again, also when the
+                # caller gave up first (e.g. a tool call hitting its own timeout)
+                await self.write("\x03")
+                raise
+            finally:
+                self.pending.pop(token, None)
+                self.capture = None
+                self.capture_token = None
+
+    def view(self) -> Dict[str, Any]:
+        return {"output": self.ring.text(), "console": list(self.console)}
+
+    def _close_socket(self):
+        raw = self.sock._sock
+        try:
+            # shutdown wakes the reader blocked in recv; close alone may not
+            raw.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        raw.close()
+
+    async def close(self):
+        if self.sock is not None:
+            try:
+                await self.executor.run(self._close_socket)
+            except Exception as e:
+                logger.warning("Failed to close shell socket", shell_id=self.shell_id, error=str(e))
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+class ShellManager:
+    """Per-worker registry of open PTY shells, keyed by (session_id, shell_id).
+
+    A PTY only exists in the worker that attached it, so all shells of a session
+    live on one worker: opening the first claims the session in Redis under a
+    lease this worker renews while it holds shells for it. Other workers raise
+    ShellOnOtherWorker instead of opening a second, unrelated console.
+    """
+
+    def __init__(self, docker_client: docker.DockerClient, executor: DockerExecutor, redis: RedisClient = redis_client):
+        self.docker_client = docker_client
+        self.executor = executor
+        self.redis = redis
+        # Prefixed so the stored value never parses as JSON
+        self.worker_id = f"worker-{uuid.uuid4().hex}"
+        self.shells: Dict[Tuple[str, str], PtyShell] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._renewer: Optional[asyncio.Task] = None
+
+    def _owner_key(self, session_id: str) -> str:
+        return f"pty_shell:{session_id}:owner"
+
+    async def get(self, session_id: str, shell_id: str, container_id: str) -> PtyShell:
+        """Return the open shell, attaching a new one if it is missing or has exited"""
+        key = (session_id, shell_id)
+        shell = self.shells.get(key)
+        if shell is not None and shell.alive:
+            return shell
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            shell = self.shells.get(key)
+            if shell is not None and shell.alive:
+                return shell
+            if shell is None and sum(1 for s, _ in self.shells if s == session_id) >= settings.pty_max_shells_per_session:
+                raise TooManyShells("Too many shells for this session")
+            await self._claim(session_id)
+            shell = PtyShell(shell_id, container_id, self.docker_client, self.executor)
+            await shell.open()
+            self.shells[key] = shell
+            logger.info("Shell opened", session_id=session_id, shell_id=shell_id)
+            return shell
+
+    async def _claim(self, session_id: str):
+        key = self._owner_key(session_id)
+        try:
+            claimed = await self.redis.set(key, self.worker_id, expire=settings.pty_owner_lease_seconds, nx=True)
+            if not claimed and await self.redis.get(key) != self.worker_id:
+                raise ShellOnOtherWorker("This session's shells are open on another worker")
+        except ShellOnOtherWorker:
+            raise
+        except Exception as e:
+            # Without Redis a single worker still works; several may open duplicate shells
+            logger.warning("Failed to claim shell ownership", session_id=session_id, error=str(e))
+        if self._renewer is None:
+            self._renewer = asyncio.create_task(self._renew_leases())
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(settings.pty_owner_lease_seconds / 3)
+            sessions = {session_id for session_id, _ in self.shells}
+            if not sessions:
+                continue
+            try:
+                pipe = self.redis.pipeline()
+                for session_id in sessions:
+                    pipe.expire(self._owner_key(session_id), settings.pty_owner_lease_seconds)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning("Failed to renew shell ownership", sessions=len(sessions), error=str(e))
+
+    async def _release(self, session_id: str):
+        key = self._owner_key(session_id)
+        try:
+            if await self.redis.get(key) == self.worker_id:
+                await self.redis.delete(key)
+        except Exception as e:
+            logger.warning("Failed to release shell ownership", session_id=session_id, error=str(e))
+
+    async def close_session(self, session_id: str):
+        keys = [key for key in self.shells if key[0] == session_id]
+        for key in keys:
+            self._locks.pop(key, None)
+        await asyncio.gather(*[self.shells.pop(key).close() for key in keys])
+        await self._release(session_id)
+
+    async def close(self):
+        if self._renewer is not None:
+            self._renewer.cancel()
+            await asyncio.gather(self._renewer, return_exceptions=True)
+            self._renewer = None
+        sessions = {session_id for session_id, _ in self.shells}
+        shells = list(self.shells.values())
+        self.shells.clear()
+        self._locks.clear()
+        await asyncio.gather(*[shell.close() for shell in shells])
+        await asyncio.gather(*[self._release(session_id) for session_id in sessions])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open": len(self.shells), "alive": sum(1 for shell in self.shells.values() if shell.alive)}
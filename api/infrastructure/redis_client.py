@@ -2,7 +2,7 @@ import redis.asyncio as redis
 from infrastructure.config import get_settings
 import structlog
 import json
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = structlog.get_logger()
 settings = get_settings()
@@ -21,11 +21,11 @@ class RedisClient:
             logger.error("Failed to connect to Redis", error=str(e))
             raise
     
-    async def set(self, key: str, value: Any, expire: Optional[int] = None):
-        """Set a key-value pair"""
+    async def set(self, key: str, value: Any, expire: Optional[int] = None, nx: bool = False) -> bool:
+        """Set a key-value pair; with nx, only if the key does not exist yet"""
         if isinstance(value, (dict, list)):
             value = json.dumps(value)
-        await self.redis.set(key, value, ex=expire)
+        return bool(await self.redis.set(key, value, ex=expire, nx=nx))
     
     async def get(self, key: str) -> Optional[Any]:
         """Get a value by key"""
@@ -45,6 +45,86 @@ class RedisClient:
         """Check if key exists"""
         return await self.redis.exists(key)
     
+    async def incr(self, key: str, expire: Optional[int] = None) -> int:
+        """Atomically increment a counter, optionally refreshing its TTL"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incr(key)
+        if expire:
+            pipe.expire(key, expire)
+        results = await pipe.execute()
+        return results[0]
+    
+    async def xadd(
+        self,
+        key: str,
+        fields: Dict[str, Any],
+        id: str = "*",
+        maxlen: Optional[int] = None,
+        expire: Optional[int] = None
+    ) -> str:
+        """Append an entry to a capped stream"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xadd(key, fields, id=id, maxlen=maxlen, approximate=True)
+        if expire:
+            pipe.expire(key, expire)
+        results = await pipe.execute()
+        return results[0]
+    
+    async def xread(
+        self,
+        key: str,
+        last_id: str,
+        count: Optional[int] = None,
+        block: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Read stream entries after last_id, optionally blocking for new ones"""
+        result = await self.redis.xread({key: last_id}, count=count, block=block)
+        if not result:
+            return []
+        return result[0][1]
+    
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        """Add members to a sorted set or update their scores"""
+        return await self.redis.zadd(key, mapping)
+    
+    async def zrem(self, key: str, *members: str) -> int:
+        """Remove members from a sorted set"""
+        return await self.redis.zrem(key, *members)
+    
+    async def zrange(self, key: str, start: int, end: int) -> List[str]:
+        """Members by rank, lowest score first"""
+        return await self.redis.zrange(key, start, end)
+    
+    async def zrangebyscore(self, key: str, min: float, max: float, limit: Optional[int] = None) -> List[str]:
+        """Members whose score lies in [min, max], lowest first"""
+        if limit is None:
+            return await self.redis.zrangebyscore(key, min, max)
+        return await self.redis.zrangebyscore(key, min, max, start=0, num=limit)
+    
+    async def zcard(self, key: str) -> int:
+        """Number of members in a sorted set"""
+        return await self.redis.zcard(key)
+    
+    async def zcount(self, key: str, min: float, max: float) -> int:
+        """Number of members whose score lies in [min, max]"""
+        return await self.redis.zcount(key, min, max)
+    
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish a message to a pub/sub channel"""
+        return await self.redis.publish(channel, message)
+    
+    def pipeline(self):
+        """Create a non-transactional pipeline to batch commands in one round trip"""
+        return self.redis.pipeline(transaction=False)
+    
+    def pubsub(self):
+        """Create a pub/sub handle on its own connection"""
+        return self.redis.pubsub()
+    
+    def lock(self, name: str, timeout: float, blocking_timeout: Optional[float] = None):
+        """Create a distributed lock that expires after timeout seconds"""
+        return self.redis.lock(name, timeout=timeout, blocking_timeout=blocking_timeout)
+    
     async def close(self):
         """Close Redis connection"""
         if self.redis:
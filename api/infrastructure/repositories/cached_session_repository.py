@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from domain.entities.session import SessionEntity
+from domain.repositories.session_repository import SessionRepository
+from infrastructure.session_cache import SessionCache, session_cache
+
+class CachedSessionRepository(SessionRepository):
+    """Read-through cache around another SessionRepository; every write invalidates"""
+    
+    def __init__(self, inner: SessionRepository, cache: SessionCache = session_cache):
+        self.inner = inner
+        self.cache = cache
+    
+    async def create(self, session: SessionEntity) -> SessionEntity:
+        session = await self.inner.create(session)
+        await self.cache.set(session)
+        return session
+    
+    async def get_by_id(self, session_id: str) -> Optional[SessionEntity]:
+        session = await self.cache.get(session_id)
+        if session is None:
+            session = await self.cache.fill(session_id, lambda: self.inner.get_by_id(session_id))
+        return session
+    
+    async def get_all(self) -> List[SessionEntity]:
+        return await self.inner.get_all()
+    
+    async def list_page(self, limit: int, after: Optional[Tuple[datetime, str]] = None) -> List[SessionEntity]:
+        return await self.inner.list_page(limit, after)
+    
+    async def update(self, session: SessionEntity) -> SessionEntity:
+        session = await self.inner.update(session)
+        await self.cache.invalidate(session.session_id)
+        return session
+    
+    async def delete(self, session_id: str) -> bool:
+        result = await self.inner.delete(session_id)
+        await self.cache.invalidate(session_id)
+        return result
+    
+    async def update_status(self, session_id: str, status: str) -> bool:
+        result = await self.inner.update_status(session_id, status)
+        await self.cache.invalidate(session_id)
+        return result
+    
+    async def patch(self, session_id: str, fields: Dict[str, Any], inc: Optional[Dict[str, int]] = None) -> bool:
+        result = await self.inner.patch(session_id, fields, inc=inc)
+        await self.cache.invalidate(session_id)
+        return result
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime
 from domain.entities.message import MessageEntity
 from domain.repositories.message_repository import MessageRepository
 from infrastructure.database import get_database
@@ -28,6 +29,49 @@ class MongoDBMessageRepository(MessageRepository):
             messages.append(MessageEntity(**doc))
         return messages
     
+    async def get_page_by_session_id(
+        self,
+        session_id: str,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> List[MessageEntity]:
+        db = await get_database()
+        collection = db[self.collection_name]
+        
+        # Keyset pagination on (timestamp, _id) within the session, oldest first
+        query: Dict[str, Any] = {"session_id": session_id}
+        if after:
+            timestamp, message_id = after
+            query["$or"] = [
+                {"timestamp": {"$gt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$gt": message_id}}
+            ]
+        
+        cursor = collection.find(query).sort([("timestamp", 1), ("_id", 1)]).limit(limit)
+        messages = []
+        async for doc in cursor:
+            doc["message_id"] = doc.pop("_id")
+            messages.append(MessageEntity(**doc))
+        return messages
+    
+    async def iter_by_session_id(self, session_id: str) -> AsyncIterator[MessageEntity]:
+        db = await get_database()
+        collection = db[self.collection_name]
+        
+        # Hydrate one document at a time so memory stays flat regardless of history size
+        cursor = collection.find({"session_id": session_id}).sort([("timestamp", 1), ("_id", 1)]).batch_size(200)
+        async for doc in cursor:
+            doc["message_id"] = doc.pop("_id")
+            yield MessageEntity(**doc)
+    
+    async def count_by_session_id(self, session_id: str, limit: Optional[int] = None) -> int:
+        db = await get_database()
+        collection = db[self.collection_name]
+        
+        # A limit lets Mongo stop scanning the session index early
+        options = {"limit": limit} if limit else {}
+        return await collection.count_documents({"session_id": session_id}, **options)
+    
     async def get_by_id(self, message_id: str) -> Optional[MessageEntity]:
         db = await get_database()
         collection = db[self.collection_name]
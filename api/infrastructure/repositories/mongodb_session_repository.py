@@ -1,10 +1,21 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from domain.entities.session import SessionEntity, SessionStatus
 from domain.repositories.session_repository import SessionRepository
 from infrastructure.database import get_database
 import uuid
 from datetime import datetime
 
+# Fields shown in session listings; metadata and other large fields are left out
+LIST_PROJECTION = {
+    "title": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "latest_message": 1,
+    "latest_message_at": 1,
+    "unread_message_count": 1
+}
+
 class MongoDBSessionRepository(SessionRepository):
     def __init__(self):
         self.collection_name = "sessions"
@@ -40,6 +51,26 @@ class MongoDBSessionRepository(SessionRepository):
             sessions.append(SessionEntity(**doc))
         return sessions
     
+    async def list_page(self, limit: int, after: Optional[Tuple[datetime, str]] = None) -> List[SessionEntity]:
+        db = await get_database()
+        collection = db[self.collection_name]
+        
+        # Keyset pagination on (created_at, _id), newest first, served by the compound index
+        query: Dict[str, Any] = {}
+        if after:
+            created_at, session_id = after
+            query = {"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": session_id}}
+            ]}
+        
+        cursor = collection.find(query, LIST_PROJECTION).sort([("created_at", -1), ("_id", -1)]).limit(limit)
+        sessions = []
+        async for doc in cursor:
+            doc["session_id"] = doc.pop("_id")
+            sessions.append(SessionEntity(**doc))
+        return sessions
+    
     async def update(self, session: SessionEntity) -> SessionEntity:
         db = await get_database()
         collection = db[self.collection_name]
@@ -67,3 +98,14 @@ class MongoDBSessionRepository(SessionRepository):
             {"$set": {"status": status, "updated_at": datetime.utcnow()}}
         )
         return result.modified_count > 0
+    
+    async def patch(self, session_id: str, fields: Dict[str, Any], inc: Optional[Dict[str, int]] = None) -> bool:
+        db = await get_database()
+        collection = db[self.collection_name]
+        
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if inc:
+            update["$inc"] = inc
+        
+        result = await collection.update_one({"_id": session_id}, update)
+        return result.matched_count > 0
@@ -0,0 +1,129 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.local_cache import LocalTTLCache
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+# size, inode, mtime, ctime, then the name last so spaces in it survive the split.
+# %y/%z carry nanoseconds ("2024-01-01 12:00:00.123456789 +0000", three fields
+# each), so writes within the same second still change the ETag.
+STAT_FORMAT = "%s %i %y %z %n"
+STAT_FIELDS = 9
+
+class FileStatBatcher:
+    """Coalesces stat lookups per container into one `stat` exec.
+
+    Requests arriving within file_stat_batch_window_ms of each other share a
+    single exec, so a frontend polling several files costs one Docker round trip.
+    """
+
+    def __init__(self, executor: DockerExecutor):
+        self.executor = executor
+        self.pending: Dict[str, Dict[str, List[asyncio.Future]]] = {}
+        self.container_handles: Dict[str, Any] = {}
+        self.flushes = set()
+        self.counters = {"stat_execs": 0, "stat_paths": 0}
+
+    async def stat(self, container: Any, path: str) -> Optional[Tuple[int, int, str, str]]:
+        """(size, inode, mtime, ctime) of path, or None if it does not exist.
+
+        The times are the digits of stat's full-resolution timestamps.
+        """
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.get(container.id)
+        if batch is None:
+            batch = self.pending[container.id] = {}
+            self.container_handles[container.id] = container
+            asyncio.get_running_loop().call_later(
+                settings.file_stat_batch_window_ms / 1000,
+                self._schedule_flush,
+                container.id
+            )
+        batch.setdefault(path, []).append(future)
+        return await future
+
+    def _schedule_flush(self, container_id: str):
+        task = asyncio.ensure_future(self._flush(container_id))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def _flush(self, container_id: str):
+        batch = self.pending.pop(container_id, {})
+        container = self.container_handles.pop(container_id, None)
+        if not batch or container is None:
+            return
+        paths = list(batch)
+        self.counters["stat_execs"] += 1
+        self.counters["stat_paths"] += len(paths)
+        try:
+            result = await self.executor.run(
+                container.exec_run,
+                ["stat", "-L", "-c", STAT_FORMAT, "--", *paths],
+                demux=True,
+                timeout=settings.docker_op_timeout_seconds
+            )
+            stats = {}
+            for line in (result.output[0] or b"").decode("utf-8", errors="replace").splitlines():
+                fields = line.split(" ", STAT_FIELDS - 1)
+                if len(fields) == STAT_FIELDS:
+                    mtime = "".join(char for char in "".join(fields[2:5]) if char.isdigit())
+                    ctime = "".join(char for char in "".join(fields[5:8]) if char.isdigit())
+                    stats[fields[8]] = (int(fields[0]), int(fields[1]), mtime, ctime)
+            for path, futures in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(stats.get(path))
+        except Exception as e:
+            logger.warning("Batched stat failed", container_id=container_id, count=len(paths), error=str(e))
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+class SandboxFileCache:
+    """File view contents keyed by (session, path), validated by a stat-derived ETag"""
+
+    def __init__(self, executor: DockerExecutor):
+        self.stats_batcher = FileStatBatcher(executor)
+        self.entries = LocalTTLCache(
+            settings.file_cache_max_entries,
+            settings.file_cache_ttl_seconds,
+            max_bytes=settings.file_cache_max_bytes
+        )
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    async def etag(self, container: Any, path: str) -> Optional[str]:
+        """Validator for the file's current version, or None if it does not exist"""
+        stat = await self.stats_batcher.stat(container, path)
+        if stat is None:
+            return None
+        size, inode, mtime, ctime = stat
+        return f'"{container.id[:12]}-{inode:x}-{size:x}-{mtime}-{ctime}"'
+
+    def get(self, session_id: str, path: str, etag: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get((session_id, path))
+        if entry is not None and entry["etag"] == etag:
+            self.counters["hits"] += 1
+            return entry["result"]
+        self.counters["misses"] += 1
+        return None
+
+    def set(self, session_id: str, path: str, etag: str, result: Dict[str, Any]):
+        size = len(result.get("content", ""))
+        if size <= settings.file_cache_max_entry_bytes:
+            self.entries.set((session_id, path), {"etag": etag, "result": result}, size=size)
+
+    def invalidate(self, session_id: str, path: str):
+        self.entries.pop((session_id, path))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            **self.stats_batcher.counters,
+            "entries": len(self.entries),
+            "bytes": self.entries.bytes
+        }
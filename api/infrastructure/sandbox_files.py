@@ -0,0 +1,159 @@
+import io
+import posixpath
+import tarfile
+import time
+from typing import Any, AsyncGenerator, BinaryIO, Dict, Iterator, Optional, Tuple
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+
+settings = get_settings()
+
+class UploadTooLarge(ValueError):
+    pass
+
+class TooManySymlinks(OSError):
+    pass
+
+class RangeNotSatisfiable(ValueError):
+    def __init__(self, message: str, size: int):
+        super().__init__(message)
+        self.size = size
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over an iterator of byte chunks, for tarfile's stream mode"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.buffer:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return b""
+            self.buffer = chunk
+        if size < 0 or size >= len(self.buffer):
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def iter_member_range(chunks: Iterator[bytes], start: int, end: int, chunk_size: int) -> Iterator[bytes]:
+    """Bytes [start, end] of the single regular file in a streamed tar archive"""
+    with tarfile.open(fileobj=_ChunkReader(chunks), mode="r|") as tar:
+        member = tar.next()
+        if member is None or not member.isfile():
+            raise IsADirectoryError("Not a regular file")
+        source = tar.extractfile(member)
+        # A tar stream cannot seek, so bytes before the range are read and dropped
+        remaining = start
+        while remaining > 0:
+            skipped = len(source.read(min(chunk_size, remaining)))
+            if not skipped:
+                return
+            remaining -= skipped
+        remaining = end - start + 1
+        while remaining > 0:
+            data = source.read(min(chunk_size, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+
+def iter_tar(name: str, source: BinaryIO, size: int, chunk_size: int, mode: int = 0o644) -> Iterator[bytes]:
+    """Stream a one-file tar archive without holding the file in memory"""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = mode
+    info.mtime = int(time.time())
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    remaining = size
+    while remaining > 0:
+        data = source.read(min(chunk_size, remaining))
+        if not data:
+            raise IOError("Upload ended before its declared size")
+        remaining -= len(data)
+        yield data
+    padding = -size % tarfile.BLOCKSIZE
+    if padding:
+        yield b"\0" * padding
+    # End-of-archive marker: two zero blocks
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Resolve a single "bytes=" Range header against the file size.
+
+    Returns None when there is no header and raises RangeNotSatisfiable when
+    the range is malformed or cannot be satisfied.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise RangeNotSatisfiable("Only a single bytes range is supported", size)
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        raise RangeNotSatisfiable("Malformed range", size)
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise RangeNotSatisfiable("Range not satisfiable", size)
+    return start, end
+
+def split_path(file_path: str) -> Tuple[str, str]:
+    """(directory, file name) of an absolute path inside the sandbox"""
+    path = posixpath.normpath(file_path)
+    if not posixpath.isabs(path):
+        raise ValueError("File path must be absolute")
+    directory, name = posixpath.split(path)
+    if not name:
+        raise ValueError("File path must name a file")
+    return directory, name
+
+class SandboxFile:
+    """An open get_archive stream for one file, read at most once"""
+
+    def __init__(self, path: str, stat: Dict[str, Any], bits: Iterator[bytes], executor: DockerExecutor):
+        self.path = path
+        self.stat = stat
+        self.bits = bits
+        self.executor = executor
+
+    @property
+    def size(self) -> int:
+        return self.stat.get("size", 0)
+
+    async def iter_range(self, start: int = 0, end: Optional[int] = None) -> AsyncGenerator[bytes, None]:
+        end = self.size - 1 if end is None else end
+        try:
+            async for chunk in self.executor.iterate(
+                lambda: iter_member_range(self.bits, start, end, settings.file_chunk_bytes),
+                queue_size=settings.file_stream_queue_size,
+                timeout=settings.docker_exec_timeout_seconds
+            ):
+                yield chunk
+        finally:
+            # Bytes after the range are never needed; drop the connection
+            await self.close()
+
+    async def read(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_range(start, end)])
+
+    async def close(self):
+        """Release the archive stream when it will not be read"""
+        if hasattr(self.bits, "close"):
+            try:
+                await self.executor.run(self.bits.close)
+            except ValueError:
+                # Still being drained by a reader that is shutting down
+                pass
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import docker
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.local_cache import LocalTTLCache
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+SANDBOX_NAME_PREFIX = "riadex-sandbox-"
+ACTIVITY_KEY = "sandbox:activity"
+
+@asynccontextmanager
+async def keep_touching(touch: Callable[[], Awaitable[None]]) -> AsyncIterator[None]:
+    """Call touch every sandbox_touch_interval_seconds while the block runs.
+
+    For long-lived uses of a sandbox (a VNC relay, a shell command, a download)
+    that would otherwise look idle to the reaper until they end.
+    """
+    async def loop():
+        while True:
+            try:
+                await touch()
+            except Exception as e:
+                logger.warning("Sandbox touch failed", error=str(e))
+            await asyncio.sleep(settings.sandbox_touch_interval_seconds)
+
+    toucher = asyncio.ensure_future(loop())
+    try:
+        yield
+    finally:
+        toucher.cancel()
+        await asyncio.gather(toucher, return_exceptions=True)
+
+def sandbox_name(session_id: str) -> str:
+    return f"{SANDBOX_NAME_PREFIX}{session_id}"
+
+class SandboxRegistry:
+    """Cluster-wide session_id -> sandbox container lookup.
+
+    Docker is the source of truth: a session's container is the one named
+    riadex-sandbox-<session_id> (warm containers are renamed on claim, and labels
+    cannot change after creation). Redis keeps the id and ports so any worker can
+    answer without asking Docker, and a short-lived local cache also holds the
+    container handle. Redis entries are checked against Docker before their
+    handle is used, so a stale entry is dropped instead of trusted.
+    """
+
+    def __init__(self, docker_client: docker.DockerClient, executor: DockerExecutor, redis: RedisClient = redis_client):
+        self.docker_client = docker_client
+        self.executor = executor
+        self.redis = redis
+        self.local = LocalTTLCache(settings.sandbox_registry_local_size, settings.sandbox_registry_local_ttl_seconds)
+        self.counters = {"local_hits": 0, "redis_hits": 0, "docker_hits": 0, "misses": 0}
+        # Sessions whose activity was recorded recently; throttles touch() writes
+        self.touched = LocalTTLCache(settings.sandbox_registry_local_size, settings.sandbox_touch_interval_seconds)
+
+    def _key(self, session_id: str) -> str:
+        return f"sandbox:{session_id}"
+
+    def creation_lock(self, session_id: str, timeout: Optional[float] = None):
+        """Distributed lock held while a session's sandbox is created or removed.
+
+        Waiters allow for a removal that snapshots the sandbox first.
+        """
+        timeout = timeout or settings.docker_create_timeout_seconds + 30
+        blocking_timeout = max(timeout, settings.sandbox_snapshot_timeout_seconds + 30)
+        return self.redis.lock(f"sandbox:{session_id}:lock", timeout=timeout, blocking_timeout=blocking_timeout)
+
+    async def get_info(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Container id and ports, without touching Docker when Redis knows them"""
+        entry = self.local.get(session_id)
+        if entry is not None:
+            self.counters["local_hits"] += 1
+            return entry["info"]
+        info = await self._redis_get(session_id)
+        if info is not None:
+            self.counters["redis_hits"] += 1
+            return info
+        entry = await self.resolve(session_id)
+        return entry["info"] if entry else None
+
+    async def resolve(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """{"container": handle, "info": {...}} for the session's live sandbox, or None"""
+        entry = self.local.get(session_id)
+        if entry is not None:
+            self.counters["local_hits"] += 1
+            return entry
+
+        info = await self._redis_get(session_id)
+        lookup = info["container_id"] if info else sandbox_name(session_id)
+        try:
+            container = await self.executor.run(self.docker_client.containers.get, lookup)
+        except docker.errors.NotFound:
+            container = None
+
+        if container is None:
+            if info is not None:
+                logger.warning("Dropping stale sandbox registry entry", session_id=session_id, container_id=info["container_id"])
+                await self._redis_delete(session_id)
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["redis_hits" if info else "docker_hits"] += 1
+        return await self.register(session_id, container)
+
+    async def register(self, session_id: str, container: Any) -> Dict[str, Any]:
+        """Record the session's container in Redis and the local cache"""
+        info = {
+            "container_id": container.id,
+            "vnc_port": container.ports.get("5901/tcp", [{}])[0].get("HostPort"),
+            "ssh_port": container.ports.get("22/tcp", [{}])[0].get("HostPort")
+        }
+        entry = {"container": container, "info": info}
+        self.local.set(session_id, entry)
+        self.touched.set(session_id, True)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(self._key(session_id), json.dumps(info))
+            pipe.zadd(ACTIVITY_KEY, {session_id: time.time()})
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Sandbox registry write failed", session_id=session_id, error=str(e))
+        return entry
+
+    async def unregister(self, session_id: str):
+        self.local.pop(session_id)
+        self.touched.pop(session_id)
+        await self._redis_delete(session_id)
+
+    async def touch(self, session_id: str):
+        """Record activity on the session's sandbox, at most once per touch interval"""
+        if self.touched.get(session_id) is not None:
+            return
+        self.touched.set(session_id, True)
+        try:
+            await self.redis.zadd(ACTIVITY_KEY, {session_id: time.time()})
+        except Exception as e:
+            logger.warning("Sandbox activity write failed", session_id=session_id, error=str(e))
+
+    def keep_active(self, session_id: str):
+        """Context manager that keeps touching the session's sandbox while it is open"""
+        return keep_touching(lambda: self.touch(session_id))
+
+    async def idle_sessions(self, idle_seconds: float, limit: int) -> List[str]:
+        """Sessions whose sandbox has had no activity for idle_seconds"""
+        return await self.redis.zrangebyscore(ACTIVITY_KEY, "-inf", time.time() - idle_seconds, limit=limit)
+
+    async def least_recent_sessions(self, count: int) -> List[str]:
+        return await self.redis.zrange(ACTIVITY_KEY, 0, count - 1)
+
+    async def live_count(self) -> int:
+        return await self.redis.zcard(ACTIVITY_KEY)
+
+    async def idle_count(self, idle_seconds: float) -> int:
+        return await self.redis.zcount(ACTIVITY_KEY, "-inf", time.time() - idle_seconds)
+
+    def forget_local(self, session_id: str):
+        """Drop the cached handle, e.g. after Docker reports the container gone"""
+        self.local.pop(session_id)
+
+    async def _redis_get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            info = await self.redis.get(self._key(session_id))
+        except Exception as e:
+            logger.warning("Sandbox registry read failed", session_id=session_id, error=str(e))
+            return None
+        return info if isinstance(info, dict) else None
+
+    async def _redis_delete(self, session_id: str):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(self._key(session_id))
+            pipe.zrem(ACTIVITY_KEY, session_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Sandbox registry delete failed", session_id=session_id, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "local_entries": len(self.local)}
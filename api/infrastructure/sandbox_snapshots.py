@@ -0,0 +1,254 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional
+import docker
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+SNAPSHOT_LRU_KEY = "sandbox:snapshot:lru"
+SNAPSHOT_BYTES_KEY = "sandbox:snapshot:bytes"
+SNAPSHOT_EVICT_LOCK = "sandbox:snapshot:evict"
+
+def chain_id(diff_ids: List[str]) -> str:
+    """Docker's content address for a stack of layers (image-spec ChainID)"""
+    chain = diff_ids[0]
+    for diff_id in diff_ids[1:]:
+        chain = "sha256:" + hashlib.sha256(f"{chain} {diff_id}".encode()).hexdigest()
+    return chain
+
+def _duration(nanoseconds: int) -> str:
+    return f"{nanoseconds // 1_000_000}ms"
+
+def _quote(value: str) -> str:
+    # Dockerfile quoting; "$" is escaped since the values are already expanded
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$") + '"'
+
+def config_changes(config: Dict[str, Any]) -> List[str]:
+    """Dockerfile instructions that give an imported image the same config.
+
+    docker import starts from an empty config, so every non-empty field the
+    import changes can express is carried over.
+    """
+    changes = [
+        f"ENV {variable.split('=', 1)[0]}={_quote(variable.split('=', 1)[-1])}"
+        for variable in config.get("Env") or []
+    ]
+    for field, instruction in (("Entrypoint", "ENTRYPOINT"), ("Cmd", "CMD"), ("Shell", "SHELL")):
+        if config.get(field):
+            changes.append(f"{instruction} {json.dumps(config[field])}")
+    for field, instruction in (("WorkingDir", "WORKDIR"), ("User", "USER"), ("StopSignal", "STOPSIGNAL")):
+        if config.get(field):
+            changes.append(f"{instruction} {config[field]}")
+    if config.get("ExposedPorts"):
+        changes.append("EXPOSE " + " ".join(sorted(config["ExposedPorts"])))
+    if config.get("Volumes"):
+        changes.append(f"VOLUME {json.dumps(sorted(config['Volumes']))}")
+    if config.get("Labels"):
+        changes.append("LABEL " + " ".join(f"{_quote(key)}={_quote(value)}" for key, value in sorted(config["Labels"].items())))
+    for trigger in config.get("OnBuild") or []:
+        changes.append(f"ONBUILD {trigger}")
+    healthcheck = config.get("Healthcheck") or {}
+    test = healthcheck.get("Test") or []
+    if test[:1] == ["NONE"]:
+        changes.append("HEALTHCHECK NONE")
+    elif test:
+        options = [
+            f"--{option}={_duration(healthcheck[field])}"
+            for field, option in (("Interval", "interval"), ("Timeout", "timeout"), ("StartPeriod", "start-period"))
+            if healthcheck.get(field)
+        ]
+        if healthcheck.get("Retries"):
+            options.append(f"--retries={healthcheck['Retries']}")
+        command = test[1] if test[0] == "CMD-SHELL" else json.dumps(test[1:])
+        changes.append(" ".join(["HEALTHCHECK", *options, "CMD", command]))
+    return changes
+
+class SandboxSnapshotStore:
+    """Content-addressed sandbox filesystem snapshots kept as local images.
+
+    A snapshot is the container committed on top of its image, tagged
+    <repository>:<chain id hex>, so sessions whose filesystems end up identical
+    share one image. Redis maps each session to its snapshot digest and keeps an
+    LRU order plus a byte total; once the total passes sandbox_snapshot_max_bytes
+    the least recently used snapshots are removed. Sizes count only what a
+    snapshot adds on top of the base image.
+    """
+
+    def __init__(self, docker_client: docker.DockerClient, executor: DockerExecutor, redis: RedisClient = redis_client):
+        self.docker_client = docker_client
+        self.executor = executor
+        self.redis = redis
+        self.counters = {"saved": 0, "deduplicated": 0, "unchanged": 0, "flattened": 0, "restored": 0, "evicted": 0}
+        self.bytes = 0
+        self._base: Optional[Dict[str, Any]] = None
+
+    def _session_key(self, session_id: str) -> str:
+        return f"sandbox:snapshot:session:{session_id}"
+
+    def _entry_key(self, digest: str) -> str:
+        return f"sandbox:snapshot:{digest}"
+
+    def _refs_key(self, digest: str) -> str:
+        return f"sandbox:snapshot:refs:{digest}"
+
+    def image_ref(self, digest: str) -> str:
+        return f"{settings.sandbox_snapshot_repository}:{digest.split(':', 1)[-1]}"
+
+    async def current(self, session_id: str) -> Optional[str]:
+        """Digest of the session's snapshot, if it has one"""
+        return await self.redis.get(self._session_key(session_id))
+
+    async def lookup(self, session_id: str) -> Optional[str]:
+        """Image reference to restore the session from, or None"""
+        digest = await self.redis.get(self._session_key(session_id))
+        if not digest:
+            return None
+        await self.redis.zadd(SNAPSHOT_LRU_KEY, {digest: time.time()})
+        self.counters["restored"] += 1
+        return self.image_ref(digest)
+
+    async def save(self, session_id: str, container: Any) -> Optional[str]:
+        """Snapshot the container's filesystem for the session and return its digest.
+
+        The session's previous snapshot is not released here: the container may
+        still run from it, so the caller releases it once the container is gone.
+        """
+        current = await self.current(session_id)
+        changes = await self.executor.run(container.diff)
+        if not changes:
+            # Nothing written since it started; the snapshot it came from (if any) still holds
+            self.counters["unchanged"] += 1
+            return current
+
+        base = await self._base_image()
+        image = await self.executor.run(container.commit, timeout=settings.sandbox_snapshot_timeout_seconds)
+        layers = image.attrs["RootFS"]["Layers"]
+        if len(layers) - len(base["layers"]) > settings.sandbox_snapshot_max_layers:
+            # Every restore-and-save cycle stacks a layer; collapse before overlayfs' depth limit
+            await self.executor.run(self.docker_client.images.remove, image.id, force=True)
+            image = await self._flatten(container, base)
+            layers = image.attrs["RootFS"]["Layers"]
+        digest = chain_id(layers)
+
+        entry = await self.redis.get(self._entry_key(digest))
+        if isinstance(entry, dict):
+            # Same filesystem already stored; keep the existing image
+            self.counters["deduplicated"] += 1
+            if image.id != entry["image_id"]:
+                await self._remove_image(image.id)
+        else:
+            await self.executor.run(
+                image.tag,
+                settings.sandbox_snapshot_repository,
+                tag=digest.split(":", 1)[-1]
+            )
+            shares_base = layers[:len(base["layers"])] == base["layers"]
+            size = image.attrs["Size"] - (base["size"] if shares_base else 0)
+            pipe = self.redis.pipeline()
+            pipe.set(self._entry_key(digest), json.dumps({"image_id": image.id, "size": size, "created": time.time()}))
+            pipe.incrby(SNAPSHOT_BYTES_KEY, size)
+            await pipe.execute()
+            self.counters["saved"] += 1
+
+        pipe = self.redis.pipeline()
+        pipe.set(self._session_key(session_id), digest)
+        pipe.zadd(self._refs_key(digest), {session_id: time.time()})
+        pipe.zadd(SNAPSHOT_LRU_KEY, {digest: time.time()})
+        await pipe.execute()
+        logger.info("Sandbox snapshot saved", session_id=session_id, digest=digest, layers=len(layers))
+        await self.evict()
+        return digest
+
+    async def discard(self, session_id: str):
+        """Forget the session's snapshot, removing the image once no session uses it"""
+        digest = await self.redis.get(self._session_key(session_id))
+        await self.redis.delete(self._session_key(session_id))
+        if digest:
+            await self.release(session_id, digest)
+
+    async def evict(self):
+        """Remove least recently used snapshots until the byte budget is met"""
+        lock = self.redis.lock(SNAPSHOT_EVICT_LOCK, timeout=settings.sandbox_snapshot_timeout_seconds)
+        if not await lock.acquire(blocking=False):
+            return
+        try:
+            self.bytes = int(await self.redis.get(SNAPSHOT_BYTES_KEY) or 0)
+            for digest in await self.redis.zrange(SNAPSHOT_LRU_KEY, 0, -1):
+                if self.bytes <= settings.sandbox_snapshot_max_bytes:
+                    break
+                sessions = await self.redis.zrange(self._refs_key(digest), 0, -1)
+                # Snapshots a running sandbox was restored from are skipped for now
+                if not await self._drop(digest):
+                    continue
+                for session_id in sessions:
+                    await self.redis.delete(self._session_key(session_id))
+                self.counters["evicted"] += 1
+                self.bytes = int(await self.redis.get(SNAPSHOT_BYTES_KEY) or 0)
+                logger.info("Sandbox snapshot evicted", digest=digest)
+        finally:
+            await lock.release()
+
+    async def release(self, session_id: str, digest: str):
+        """Drop the session's reference to a snapshot, removing it once unreferenced"""
+        await self.redis.zrem(self._refs_key(digest), session_id)
+        if await self.redis.zcard(self._refs_key(digest)) == 0:
+            await self._drop(digest)
+
+    async def _drop(self, digest: str) -> bool:
+        # Remove by tag: if a newer snapshot was committed on top of this one,
+        # Docker only untags it and the child keeps the shared layers
+        if not await self._remove_image(self.image_ref(digest)):
+            return False
+        entry = await self.redis.get(self._entry_key(digest))
+        pipe = self.redis.pipeline()
+        pipe.delete(self._entry_key(digest), self._refs_key(digest))
+        pipe.zrem(SNAPSHOT_LRU_KEY, digest)
+        if isinstance(entry, dict):
+            pipe.decrby(SNAPSHOT_BYTES_KEY, entry["size"])
+        await pipe.execute()
+        return True
+
+    async def _remove_image(self, ref: str) -> bool:
+        try:
+            await self.executor.run(self.docker_client.images.remove, ref)
+        except docker.errors.NotFound:
+            pass
+        except docker.errors.APIError as e:
+            # A container still runs from it; it stays indexed so eviction retries later
+            logger.warning("Snapshot image not removed", image=ref, error=str(e))
+            return False
+        return True
+
+    async def _base_image(self) -> Dict[str, Any]:
+        if self._base is None:
+            image = await self.executor.run(self.docker_client.images.get, settings.docker_image)
+            self._base = {
+                "layers": image.attrs["RootFS"]["Layers"],
+                "size": image.attrs["Size"],
+                "config": image.attrs.get("Config") or {}
+            }
+        return self._base
+
+    async def _flatten(self, container: Any, base: Dict[str, Any]) -> Any:
+        """Re-import the container's whole filesystem as a single-layer image"""
+        changes = config_changes(base["config"])
+        api = self.docker_client.api
+
+        def export_and_import() -> str:
+            output = api.import_image_from_stream(container.export(), changes=changes)
+            # The last status line carries the new image id
+            return json.loads(output.strip().splitlines()[-1])["status"]
+
+        image_id = await self.executor.run_stream(export_and_import, timeout=settings.sandbox_snapshot_timeout_seconds)
+        self.counters["flattened"] += 1
+        return await self.executor.run(self.docker_client.images.get, image_id)
+
+    def stats(self) -> Dict[str, Any]:
+        # bytes is the cluster-wide total as of this worker's last eviction pass
+        return {**self.counters, "bytes": self.bytes}
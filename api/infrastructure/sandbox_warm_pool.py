@@ -0,0 +1,224 @@
+import asyncio
+import math
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+import docker
+from infrastructure.config import get_settings
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+WARM_NAME_PREFIX = "riadex-sandbox-warm-"
+WARM_POOL_LABEL = "riadex.warm_pool"
+# Live pools by last heartbeat, and each pool's ready + starting containers
+WARM_POOLS_KEY = "sandbox:warm_pools"
+WARM_POOL_SIZES_KEY = "sandbox:warm_pool:sizes"
+
+class SandboxWarmPool:
+    """Pre-started sandbox containers that a session can claim by renaming.
+
+    A background task keeps the pool topped up to a target size that follows the
+    recent claim rate: enough containers to cover the claims expected while a
+    replacement is still starting, clamped to the configured min/max.
+
+    Each pool heartbeats its id and size to Redis. Unclaimed warm containers
+    whose pool stopped heartbeating (its worker died before close) are removed.
+    """
+
+    def __init__(
+        self,
+        start_container: Callable[[str, Dict[str, str]], Awaitable[Any]],
+        executor: DockerExecutor,
+        docker_client: docker.DockerClient,
+        redis: RedisClient = redis_client
+    ):
+        self.start_container = start_container
+        self.executor = executor
+        self.docker_client = docker_client
+        self.redis = redis
+        self.pool_id = uuid.uuid4().hex[:12]
+        self.ready: Deque[Any] = deque()
+        self.starting = 0
+        self.claims: Deque[float] = deque()
+        self.start_seconds: Deque[float] = deque(maxlen=20)
+        self.counters = {"claims": 0, "misses": 0, "started": 0, "start_failures": 0, "discarded": 0, "orphans_removed": 0}
+        self.refiller: Optional[asyncio.Task] = None
+        self.heartbeat: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def target_size(self) -> int:
+        """Claims expected during one container start, plus the configured floor"""
+        now = time.monotonic()
+        while self.claims and self.claims[0] < now - settings.warm_pool_rate_window_seconds:
+            self.claims.popleft()
+        rate = len(self.claims) / settings.warm_pool_rate_window_seconds
+        avg_start = sum(self.start_seconds) / len(self.start_seconds) if self.start_seconds else 5.0
+        target = settings.warm_pool_min_size + math.ceil(rate * avg_start)
+        return max(settings.warm_pool_min_size, min(settings.warm_pool_max_size, target))
+
+    async def claim(self, session_id: str, name: str) -> Optional[Any]:
+        """Hand a warm container to the session, or None when the pool is empty"""
+        self.claims.append(time.monotonic())
+        self._wake()
+        while self.ready:
+            container = self.ready.popleft()
+            try:
+                await self.executor.run(container.rename, name)
+            except Exception as e:
+                # Died or was removed while idle; drop it and try the next one
+                logger.warning("Discarding warm sandbox", container_id=container.id, error=str(e))
+                self.counters["discarded"] += 1
+                asyncio.create_task(self._remove(container))
+                continue
+            container.name = name
+            self.counters["claims"] += 1
+            logger.info("Warm sandbox claimed", session_id=session_id, container_id=container.id)
+            return container
+        self.counters["misses"] += 1
+        return None
+
+    def size(self) -> int:
+        """Containers this pool holds or is starting"""
+        return len(self.ready) + self.starting
+
+    async def cluster_size(self) -> int:
+        """Warm containers held or starting across all live pools"""
+        live = await self._live_pools()
+        pipe = self.redis.pipeline()
+        pipe.hgetall(WARM_POOL_SIZES_KEY)
+        sizes = (await pipe.execute())[0]
+        return sum(int(size) for pool_id, size in sizes.items() if pool_id in live)
+
+    async def _live_pools(self) -> Set[str]:
+        since = time.time() - settings.warm_pool_heartbeat_ttl_seconds
+        return set(await self.redis.zrangebyscore(WARM_POOLS_KEY, since, float("inf")))
+
+    async def _beat(self):
+        pipe = self.redis.pipeline()
+        pipe.zadd(WARM_POOLS_KEY, {self.pool_id: time.time()})
+        pipe.hset(WARM_POOL_SIZES_KEY, self.pool_id, self.size())
+        await pipe.execute()
+
+    async def remove_orphans(self):
+        """Remove unclaimed warm containers of pools that stopped heartbeating"""
+        live = await self._live_pools() | {self.pool_id}
+        containers = await self.executor.run(
+            self.docker_client.containers.list,
+            all=True,
+            filters={"label": WARM_POOL_LABEL}
+        )
+        # Claimed containers keep the label but were renamed to their session's name
+        orphans = [
+            container for container in containers
+            if container.name.startswith(WARM_NAME_PREFIX) and container.labels.get(WARM_POOL_LABEL) not in live
+        ]
+        await asyncio.gather(*[self._remove(container) for container in orphans])
+        self.counters["orphans_removed"] += len(orphans)
+        if orphans:
+            logger.info("Removed orphaned warm sandboxes", count=len(orphans))
+
+        pipe = self.redis.pipeline()
+        pipe.hkeys(WARM_POOL_SIZES_KEY)
+        dead = [pool_id for pool_id in (await pipe.execute())[0] if pool_id not in live]
+        if dead:
+            pipe = self.redis.pipeline()
+            pipe.zrem(WARM_POOLS_KEY, *dead)
+            pipe.hdel(WARM_POOL_SIZES_KEY, *dead)
+            await pipe.execute()
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self._beat()
+                await self.remove_orphans()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Warm pool heartbeat failed", error=str(e))
+            await asyncio.sleep(settings.warm_pool_heartbeat_ttl_seconds / 3)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refill(self):
+        while True:
+            try:
+                deficit = self.target_size() - len(self.ready) - self.starting
+                if deficit > 0:
+                    await asyncio.gather(*[self._start_one() for _ in range(deficit)])
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.warm_pool_refill_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Warm pool refill error", error=str(e))
+                await asyncio.sleep(settings.warm_pool_refill_interval_seconds)
+
+    async def _start_one(self):
+        self.starting += 1
+        started_at = time.monotonic()
+        try:
+            container = await self.start_container(
+                f"{WARM_NAME_PREFIX}{uuid.uuid4().hex[:12]}",
+                {WARM_POOL_LABEL: self.pool_id}
+            )
+        except Exception as e:
+            self.counters["start_failures"] += 1
+            logger.error("Failed to start warm sandbox", error=str(e))
+            # Back off so a broken image or daemon does not spin the refill loop
+            await asyncio.sleep(settings.warm_pool_refill_interval_seconds)
+            return
+        finally:
+            self.starting -= 1
+        self.start_seconds.append(time.monotonic() - started_at)
+        self.counters["started"] += 1
+        self.ready.append(container)
+
+    async def _remove(self, container: Any):
+        try:
+            await self.executor.run(container.remove, force=True)
+        except Exception as e:
+            logger.warning("Failed to remove warm sandbox", container_id=container.id, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "ready": len(self.ready),
+            "starting": self.starting,
+            "target": self.target_size(),
+            "avg_start_seconds": round(sum(self.start_seconds) / len(self.start_seconds), 3) if self.start_seconds else None
+        }
+
+    async def start(self):
+        if self.refiller is None:
+            self._wakeup = asyncio.Event()
+            self.refiller = asyncio.create_task(self._refill())
+            self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def close(self):
+        """Stop refilling and remove containers nobody claimed"""
+        for task in (self.refiller, self.heartbeat):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self.refiller = self.heartbeat = None
+        containers = list(self.ready)
+        self.ready.clear()
+        await asyncio.gather(*[self._remove(container) for container in containers])
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zrem(WARM_POOLS_KEY, self.pool_id)
+            pipe.hdel(WARM_POOL_SIZES_KEY, self.pool_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to deregister warm pool", error=str(e))
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import uuid
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from domain.entities.session import SessionEntity
+from infrastructure.config import get_settings
+from infrastructure.local_cache import LocalTTLCache
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+INVALIDATION_CHANNEL = "session_cache:invalidate"
+
+class SessionCache:
+    """Two-level SessionEntity cache: in-process TTL/LRU in front of Redis.
+
+    Invalidations delete the Redis entry and are broadcast over pub/sub so every
+    worker drops its local copy. Local entries use a short TTL as a backstop for a
+    missed invalidation message.
+
+    Fills after a miss are guarded by a per-session generation, bumped by every
+    invalidation this worker makes or receives, so a read that raced a write
+    cannot put the old value back.
+    """
+
+    def __init__(self, redis: RedisClient = redis_client):
+        self.redis = redis
+        self.worker_id = uuid.uuid4().hex
+        self.local = LocalTTLCache(settings.session_cache_local_size, settings.session_cache_local_ttl_seconds)
+        self.counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+        self.listener: Optional[asyncio.Task] = None
+        # Only tracked while a fill for the session is in flight
+        self.fills = Counter()
+        self.generations = Counter()
+
+    def _key(self, session_id: str) -> str:
+        return f"session_cache:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[SessionEntity]:
+        data = self.local.get(session_id)
+        if data is not None:
+            self.counters["local_hits"] += 1
+            return SessionEntity(**data)
+
+        try:
+            data = await self.redis.get(self._key(session_id))
+        except Exception as e:
+            logger.warning("Session cache read failed", session_id=session_id, error=str(e))
+            data = None
+        if isinstance(data, dict):
+            self.counters["redis_hits"] += 1
+            self.local.set(session_id, data)
+            return SessionEntity(**data)
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, session: SessionEntity):
+        data = json.loads(json.dumps(session.dict(), default=lambda v: v.isoformat()))
+        self.local.set(session.session_id, data)
+        try:
+            await self.redis.set(self._key(session.session_id), data, expire=settings.session_cache_ttl_seconds)
+        except Exception as e:
+            logger.warning("Session cache write failed", session_id=session.session_id, error=str(e))
+
+    async def fill(
+        self,
+        session_id: str,
+        load: Callable[[], Awaitable[Optional[SessionEntity]]]
+    ) -> Optional[SessionEntity]:
+        """Load a missed session and cache it, unless it was invalidated meanwhile"""
+        self.fills[session_id] += 1
+        generation = self.generations[session_id]
+        try:
+            session = await load()
+            if session is not None and self.generations[session_id] == generation:
+                await self.set(session)
+            return session
+        finally:
+            self.fills[session_id] -= 1
+            if self.fills[session_id] <= 0:
+                del self.fills[session_id]
+                self.generations.pop(session_id, None)
+
+    def _bump(self, session_id: str):
+        if session_id in self.fills:
+            self.generations[session_id] += 1
+
+    async def invalidate(self, session_id: str):
+        await self.invalidate_many([session_id])
+
+    async def invalidate_many(self, session_ids: Iterable[str]):
+        """Drop sessions from every cache level on every worker"""
+        session_ids = list(session_ids)
+        for session_id in session_ids:
+            self._bump(session_id)
+            self.local.pop(session_id)
+        self.counters["invalidations"] += len(session_ids)
+        try:
+            pipe = self.redis.pipeline()
+            for session_id in session_ids:
+                pipe.delete(self._key(session_id))
+                pipe.publish(INVALIDATION_CHANNEL, f"{self.worker_id}|{session_id}")
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Session cache invalidation failed", count=len(session_ids), error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["local_hits"] + self.counters["redis_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "local_entries": len(self.local),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    async def start(self):
+        """Start listening for invalidations from other workers"""
+        if self.listener is None:
+            self.listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if not message or message.get("type") != "message":
+                        continue
+                    worker_id, session_id = message["data"].split("|", 1)
+                    if worker_id != self.worker_id:
+                        self._bump(session_id)
+                        self.local.pop(session_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries may be stale while disconnected, so start over empty
+                logger.error("Session cache listener error", error=str(e))
+                for session_id in self.fills:
+                    self._bump(session_id)
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def close(self):
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
+
+# Global session cache instance
+session_cache = SessionCache()
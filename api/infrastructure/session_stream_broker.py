@@ -0,0 +1,140 @@
+import asyncio
+import uuid
+from typing import Dict, Optional, Set, Tuple
+from infrastructure.config import get_settings
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+StreamItem = Tuple[str, str, bytes]
+
+class Subscription:
+    """Bounded queue of live frames for a single SSE consumer"""
+
+    def __init__(self, session_id: str, maxsize: int):
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def offer(self, item: StreamItem) -> bool:
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.lagged = True
+            return False
+
+    async def get(self) -> Optional[StreamItem]:
+        """Next (event_id, event, frame), or None once the subscriber has fallen behind"""
+        if self.lagged and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+class SessionStreamBroker:
+    """Per-worker fan-out of live chat frames to local subscribers.
+
+    Frames produced in this worker are delivered to local subscribers directly and
+    published on a per-session Redis channel for other workers. Each worker holds a
+    single pub/sub connection and subscribes to a session channel only while it has
+    local subscribers for it. A subscriber whose queue fills up is dropped instead
+    of stalling the others; it can catch up from the session's stream buffer.
+    """
+
+    def __init__(self, redis: RedisClient = redis_client):
+        self.redis = redis
+        self.worker_id = uuid.uuid4().hex
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+        self._active: Optional[asyncio.Event] = None
+
+    def _channel(self, session_id: str) -> str:
+        return f"chat_stream:{session_id}:live"
+
+    async def start(self):
+        """Open the pub/sub connection and start the listener"""
+        if self.listener is None:
+            self._active = asyncio.Event()
+            self.pubsub = self.redis.pubsub()
+            self.listener = asyncio.create_task(self._listen())
+
+    async def subscribe(self, session_id: str) -> Subscription:
+        """Attach a new local subscriber to a session's live stream"""
+        await self.start()
+        subscription = Subscription(session_id, settings.chat_stream_subscriber_queue_size)
+        subscribers = self.subscribers.setdefault(session_id, set())
+        subscribers.add(subscription)
+        if len(subscribers) == 1:
+            try:
+                await self.pubsub.subscribe(self._channel(session_id))
+                self._active.set()
+            except Exception as e:
+                logger.warning("Failed to subscribe to session channel", session_id=session_id, error=str(e))
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription):
+        """Detach a subscriber, dropping the channel when it was the last one"""
+        subscribers = self.subscribers.get(subscription.session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscribers[subscription.session_id]
+            try:
+                await self.pubsub.unsubscribe(self._channel(subscription.session_id))
+            except Exception as e:
+                logger.warning("Failed to unsubscribe from session channel", session_id=subscription.session_id, error=str(e))
+            if not self.subscribers:
+                self._active.clear()
+
+    async def publish(self, session_id: str, event_id: str, event: str, frame: bytes):
+        """Deliver a frame to local subscribers and to other workers"""
+        self._deliver(session_id, (event_id, event, frame))
+        message = "|".join((self.worker_id, event_id, event, frame.decode("utf-8")))
+        try:
+            await self.redis.publish(self._channel(session_id), message)
+        except Exception as e:
+            logger.warning("Failed to publish chat frame", session_id=session_id, error=str(e))
+
+    def _deliver(self, session_id: str, item: StreamItem):
+        for subscription in list(self.subscribers.get(session_id, ())):
+            if not subscription.offer(item):
+                logger.warning("Dropping lagging stream subscriber", session_id=session_id)
+                self.subscribers[session_id].discard(subscription)
+
+    async def _listen(self):
+        prefix_len = len("chat_stream:")
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    await self._active.wait()
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                worker_id, event_id, event, frame = message["data"].split("|", 3)
+                if worker_id == self.worker_id:
+                    continue
+                session_id = message["channel"][prefix_len:-len(":live")]
+                self._deliver(session_id, (event_id, event, frame.encode("utf-8")))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Session stream listener error", error=str(e))
+                await asyncio.sleep(1)
+
+    async def close(self):
+        """Stop the listener and close the pub/sub connection"""
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
+        if self.pubsub:
+            await self.pubsub.close()
+            self.pubsub = None
+
+# Global session stream broker instance
+session_stream_broker = SessionStreamBroker()
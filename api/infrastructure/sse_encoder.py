@@ -0,0 +1,72 @@
+import time
+from functools import lru_cache
+from typing import Any, Dict
+
+try:
+    import orjson
+
+    def _dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    import json
+
+    def _dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+# Frames keep the ChatEvent layout: event: <name>\ndata: {"event": ..., "data": ..., "timestamp": ...}\n\n
+_TIMESTAMP_KEY = b',"timestamp":'
+_FRAME_END = b"}\n\n"
+
+_timestamp_cache = [0, b"0"]
+
+def _timestamp() -> bytes:
+    """Current unix timestamp as bytes, re-encoded at most once per second"""
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        _timestamp_cache[0] = now
+        _timestamp_cache[1] = str(now).encode("ascii")
+    return _timestamp_cache[1]
+
+@lru_cache(maxsize=64)
+def _prefix(event: str) -> bytes:
+    return b"event: " + event.encode("utf-8") + b'\ndata: {"event":' + _dumps(event) + b',"data":'
+
+class StaticFrame:
+    """Pre-serialized frame whose payload never changes; only the timestamp is filled in"""
+
+    __slots__ = ("event", "head")
+
+    def __init__(self, event: str, data: Dict[str, Any]):
+        self.event = event
+        self.head = _prefix(event) + _dumps(data) + _TIMESTAMP_KEY
+
+    def render(self) -> bytes:
+        return self.head + _timestamp() + _FRAME_END
+
+def static_frame(event: str, data: Dict[str, Any]) -> StaticFrame:
+    """Build a cached frame template for an event with constant data"""
+    return StaticFrame(event, data)
+
+def encode(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode an arbitrary event as an SSE frame"""
+    return _prefix(event) + _dumps(data) + _TIMESTAMP_KEY + _timestamp() + _FRAME_END
+
+_MESSAGE_HEAD = _prefix("message") + b'{"content":'
+_MESSAGE_TAIL = b',"partial":true}' + _TIMESTAMP_KEY
+
+def encode_message(content: str) -> bytes:
+    """Fast path for partial assistant message frames"""
+    return _MESSAGE_HEAD + _dumps(content) + _MESSAGE_TAIL + _timestamp() + _FRAME_END
+
+# SSE comment: clients ignore it, but it keeps proxies and idle timeouts at bay
+KEEPALIVE_EVENT = "keepalive"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+def with_id(event_id: str, frame: bytes) -> bytes:
+    """Prefix a frame with its SSE id field"""
+    return b"id: " + event_id.encode("ascii") + b"\n" + frame
+
+def frame_event(frame: bytes) -> str:
+    """Event name of an encoded frame"""
+    start = frame.find(b"event: ") + 7
+    return frame[start:frame.index(b"\n", start)].decode("utf-8")
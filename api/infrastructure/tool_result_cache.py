@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import posixpath
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from infrastructure.config import get_settings
+from infrastructure.local_cache import LocalTTLCache
+from infrastructure.redis_client import RedisClient, redis_client
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+def _canonical(value: Any, key: Optional[str] = None) -> Any:
+    """Input normalized so equivalent calls serialize identically"""
+    if isinstance(value, dict):
+        # None means "not given"; sort_keys in the dump takes care of order
+        return {k: _canonical(v, k) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    if isinstance(value, str) and key == "path":
+        return posixpath.normpath(value)
+    return value
+
+class _LeaderCancelled(Exception):
+    """Set on a shared run whose caller was cancelled, so waiters retry instead"""
+
+class ToolResultCache:
+    """Content-addressed tool output cache: in-process LRU in front of Redis.
+
+    Keys hash the tool name and type, the canonicalized input, and optionally a
+    scope (e.g. the session whose sandbox the tool reads) and a version token
+    (e.g. the file's ETag), so an entry can only match identical work. Concurrent
+    misses for the same key on this worker share one execution.
+    """
+
+    def __init__(self, redis: RedisClient = redis_client):
+        self.redis = redis
+        self.local = LocalTTLCache(settings.tool_cache_local_size, settings.tool_cache_local_ttl_seconds)
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = Counter()
+        self.lookups = Counter()
+        self.counters = {"local_hits": 0, "redis_hits": 0, "shared": 0, "misses": 0}
+
+    def key(self, name: str, tool_type: str, arguments: Dict[str, Any], scope: Optional[str] = None, version: Optional[str] = None) -> str:
+        payload = json.dumps(
+            [name, tool_type, scope, version, _canonical(arguments)],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _redis_key(self, key: str) -> str:
+        return f"tool_result:{key}"
+
+    async def get_or_run(
+        self,
+        name: str,
+        key: str,
+        ttl: float,
+        run: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Cached output for key, else run() once for all concurrent callers.
+
+        Returns (output, source) where source is "local", "redis" or "shared" on a
+        hit and None when this call ran the tool. Only successful outputs are kept.
+        """
+        self.lookups[name] += 1
+        while True:
+            output = self.local.get(key)
+            if output is not None:
+                return self._hit(name, "local_hits", output), "local"
+
+            try:
+                output = await self.redis.get(self._redis_key(key))
+            except Exception as e:
+                logger.warning("Tool result cache read failed", tool=name, error=str(e))
+                output = None
+            if isinstance(output, dict):
+                self.local.set(key, output, ttl=min(ttl, settings.tool_cache_local_ttl_seconds))
+                return self._hit(name, "redis_hits", output), "redis"
+
+            pending = self.inflight.get(key)
+            if pending is None:
+                break
+            try:
+                # shield: one waiter going away must not cancel the run for the others
+                output = await asyncio.shield(pending)
+            except _LeaderCancelled:
+                # The caller running it gave up; look again, possibly running it here
+                continue
+            return self._hit(name, "shared", output), "shared"
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            output = await run()
+            future.set_result(output)
+        except asyncio.CancelledError:
+            # Only the leader was cancelled; waiters must not inherit that
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters see the error; mark it retrieved in case there are none
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+        if output.get("success", True):
+            await self._store(name, key, ttl, output)
+        return output, None
+
+    def _hit(self, name: str, counter: str, output: Dict[str, Any]) -> Dict[str, Any]:
+        self.hits[name] += 1
+        self.counters[counter] += 1
+        return output
+
+    async def _store(self, name: str, key: str, ttl: float, output: Dict[str, Any]):
+        if len(json.dumps(output, default=str)) > settings.tool_cache_max_entry_bytes:
+            return
+        self.local.set(key, output, ttl=min(ttl, settings.tool_cache_local_ttl_seconds))
+        try:
+            await self.redis.set(self._redis_key(key), output, expire=max(int(ttl), 1))
+        except Exception as e:
+            logger.warning("Tool result cache write failed", tool=name, error=str(e))
+
+    def hit_rate(self, name: str) -> float:
+        """Share of this worker's lookups for the tool that were served without running it"""
+        lookups = self.lookups[name]
+        return round(self.hits[name] / lookups, 4) if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "local_entries": len(self.local),
+            "hit_rates": {name: self.hit_rate(name) for name in self.lookups}
+        }
+
+# Global tool result cache instance
+tool_result_cache = ToolResultCache()
@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from starlette.websockets import WebSocket, WebSocketState
+from infrastructure.config import get_settings
+from infrastructure.sandbox_registry import keep_touching
+import structlog
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+class _UpstreamProtocol(asyncio.Protocol):
+    """TCP side of the relay with flow control in both directions.
+
+    Received chunks are queued as the immutable bytes objects the transport hands
+    over, so nothing is copied on the way to the WebSocket. Reading pauses while
+    more than the high-water mark is queued; writes wait while the transport's
+    own buffer is above its limit.
+    """
+
+    def __init__(self, high_water: int):
+        self.high_water = high_water
+        self.transport: Optional[asyncio.Transport] = None
+        self.chunks: Deque[Optional[bytes]] = deque()
+        self.queued = 0
+        self.reading_paused = False
+        self.data_ready = asyncio.Event()
+        self.can_write = asyncio.Event()
+        self.can_write.set()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.chunks.append(data)
+        self.queued += len(data)
+        self.data_ready.set()
+        if self.queued > self.high_water and not self.reading_paused:
+            self.transport.pause_reading()
+            self.reading_paused = True
+
+    def eof_received(self):
+        self._finish()
+        return False
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self._finish()
+        self.can_write.set()
+
+    def _finish(self):
+        self.chunks.append(None)
+        self.data_ready.set()
+
+    def pause_writing(self):
+        self.can_write.clear()
+
+    def resume_writing(self):
+        self.can_write.set()
+
+    async def read(self) -> Optional[bytes]:
+        """Next received chunk, or None once the server closed the connection"""
+        while not self.chunks:
+            self.data_ready.clear()
+            await self.data_ready.wait()
+        data = self.chunks.popleft()
+        if data is not None:
+            self.queued -= len(data)
+            if self.reading_paused and self.queued <= self.high_water // 2:
+                self.transport.resume_reading()
+                self.reading_paused = False
+        return data
+
+    async def write(self, data: bytes):
+        await self.can_write.wait()
+        if self.transport.is_closing():
+            raise ConnectionResetError("VNC server closed the connection")
+        self.transport.write(data)
+
+class VncRelayMetrics:
+    """Totals across relays in this worker"""
+
+    def __init__(self):
+        self.counters = {
+            "connections": 0,
+            "active": 0,
+            "bytes_to_client": 0,
+            "bytes_to_server": 0,
+            "frames_to_client": 0,
+            "frames_to_server": 0,
+            "oversized_frames": 0
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+class VncRelay:
+    """Bidirectional WebSocket <-> VNC TCP relay for one client connection.
+
+    touch, if given, is called every sandbox_touch_interval_seconds while the relay
+    is open, so a sandbox someone is watching is not reaped as idle.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        metrics: "VncRelayMetrics",
+        touch: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.websocket = websocket
+        self.metrics = metrics
+        self.touch = touch
+        self.max_frame = settings.vnc_relay_max_frame_bytes
+        self.counters = {"bytes_to_client": 0, "bytes_to_server": 0, "frames_to_client": 0, "frames_to_server": 0}
+
+    async def run(self, host: str, port: int, session_id: str):
+        loop = asyncio.get_running_loop()
+        transport, upstream = await asyncio.wait_for(
+            loop.create_connection(lambda: _UpstreamProtocol(settings.vnc_relay_high_water_bytes), host, port),
+            timeout=settings.vnc_relay_connect_timeout_seconds
+        )
+        transport.set_write_buffer_limits(high=settings.vnc_relay_high_water_bytes)
+        self.metrics.counters["connections"] += 1
+        self.metrics.counters["active"] += 1
+        started = time.monotonic()
+        pumps = [
+            asyncio.ensure_future(self._to_client(upstream)),
+            asyncio.ensure_future(self._to_server(upstream))
+        ]
+        try:
+            async with keep_touching(self.touch) if self.touch else contextlib.nullcontext():
+                # Either side closing ends the relay
+                done, _ = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            for pump in done:
+                if pump.exception() and not isinstance(pump.exception(), ConnectionError):
+                    logger.warning("VNC relay pump failed", session_id=session_id, error=str(pump.exception()))
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            transport.close()
+            if WebSocketState.DISCONNECTED not in (self.websocket.client_state, self.websocket.application_state):
+                await self.websocket.close(code=1000)
+            self.metrics.counters["active"] -= 1
+            elapsed = max(time.monotonic() - started, 1e-6)
+            logger.info(
+                "VNC relay closed",
+                session_id=session_id,
+                seconds=round(elapsed, 3),
+                mb_per_s_to_client=round(self.counters["bytes_to_client"] / elapsed / 1e6, 3),
+                mb_per_s_to_server=round(self.counters["bytes_to_server"] / elapsed / 1e6, 3),
+                **self.counters
+            )
+
+    def _count(self, direction: str, size: int):
+        self.counters[f"bytes_to_{direction}"] += size
+        self.counters[f"frames_to_{direction}"] += 1
+        self.metrics.counters[f"bytes_to_{direction}"] += size
+        self.metrics.counters[f"frames_to_{direction}"] += 1
+
+    async def _to_client(self, upstream: _UpstreamProtocol):
+        while True:
+            data = await upstream.read()
+            if data is None:
+                return
+            if len(data) <= self.max_frame:
+                await self.websocket.send_bytes(data)
+                self._count("client", len(data))
+                continue
+            # Split through a memoryview so only each outgoing frame is materialized
+            view = memoryview(data)
+            for offset in range(0, len(view), self.max_frame):
+                frame = bytes(view[offset:offset + self.max_frame])
+                await self.websocket.send_bytes(frame)
+                self._count("client", len(frame))
+
+    async def _to_server(self, upstream: _UpstreamProtocol):
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                data = (message.get("text") or "").encode("utf-8")
+            if len(data) > self.max_frame:
+                self.metrics.counters["oversized_frames"] += 1
+                await self.websocket.close(code=1009, reason="Frame too large")
+                return
+            # awaits while the TCP send buffer is over the high-water mark
+            await upstream.write(data)
+            self._count("server", len(data))
+
+# Global VNC relay metrics instance
+vnc_relay_metrics = VncRelayMetrics()
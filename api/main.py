@@ -13,8 +13,7 @@ from presentation.routers.sessions import router as sessions_router
 from presentation.routers.chat import router as chat_router
 from presentation.routers.tools import router as tools_router
 from infrastructure.logging import setup_logging
-from infrastructure.database import init_database, close_database
-from infrastructure.redis_client import redis_client
+from application.container import ServiceContainer
 
 settings = get_settings()
 logger = structlog.get_logger()
@@ -24,13 +23,13 @@ async def lifespan(app: FastAPI):
     # Startup
     setup_logging()
     logger.info("FastAPI application starting up")
-    await init_database()
-    await redis_client.connect()
+    container = ServiceContainer()
+    await container.startup()
+    app.state.container = container
     yield
     # Shutdown
     logger.info("FastAPI application shutting down")
-    await close_database()
-    await redis_client.close()
+    await container.shutdown()
 
 app = FastAPI(
     title="Riadex FastAPI Backend",
@@ -60,6 +59,9 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/stats")
+async def stats():
+    return app.state.container.stats()
+
 # For Vercel serverless deployment
 handler = app
-</Vercel>
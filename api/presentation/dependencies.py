@@ -0,0 +1,28 @@
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from application.container import ServiceContainer
+from application.services.chat_service import ChatService
+from application.services.chat_stream_service import ChatStreamService
+from application.services.sandbox_service import SandboxService
+from application.services.session_service import SessionService
+
+# HTTPConnection rather than Request so the same dependencies work for WebSocket routes
+
+def get_container(connection: HTTPConnection) -> ServiceContainer:
+    return connection.app.state.container
+
+def get_session_service(connection: HTTPConnection) -> SessionService:
+    return get_container(connection).session_service
+
+def get_chat_service(connection: HTTPConnection) -> ChatService:
+    return get_container(connection).chat_service
+
+def get_chat_stream_service(connection: HTTPConnection) -> ChatStreamService:
+    return get_container(connection).chat_stream_service
+
+def get_sandbox_service(connection: HTTPConnection) -> SandboxService:
+    sandbox_service = get_container(connection).sandbox_service
+    if sandbox_service is None:
+        raise HTTPException(status_code=503, detail="Sandbox service unavailable")
+    return sandbox_service
@@ -1,27 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from fastapi.responses import StreamingResponse
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
 from domain.entities.message import ChatRequest
 from application.services.chat_service import ChatService
 from application.services.session_service import SessionService
+from application.services.chat_stream_service import ChatStreamService, TurnInProgress
+from presentation.dependencies import get_chat_service, get_session_service, get_chat_stream_service
 
 router = APIRouter()
 
-async def get_chat_service():
-    return ChatService()
-
-async def get_session_service():
-    return SessionService()
-
 @router.post("/sessions/{session_id}/chat")
 async def chat_with_session(
     session_id: str,
     request: ChatRequest,
+    last_event_id: Optional[str] = Header(None),
     chat_service: ChatService = Depends(get_chat_service),
-    session_service: SessionService = Depends(get_session_service)
+    session_service: SessionService = Depends(get_session_service),
+    stream_service: ChatStreamService = Depends(get_chat_stream_service)
 ):
-    """Send a message to the session and receive streaming response"""
+    """Send a message to the session and receive streaming response.
+
+    A client reconnecting with a Last-Event-ID header gets the frames it missed
+    replayed, then follows the live generation; the message body is ignored.
+    """
     try:
         # Verify session exists
         session = await session_service.get_session(session_id)
@@ -29,8 +31,19 @@ async def chat_with_session(
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Create SSE stream
-        async def generate_sse() -> AsyncGenerator[str, None]:
-            async for chunk in chat_service.process_chat_message(session_id, request):
+        if last_event_id:
+            try:
+                stream = stream_service.resume(session_id, last_event_id)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            try:
+                stream = await stream_service.start_turn(chat_service, session_id, request)
+            except TurnInProgress as e:
+                raise HTTPException(status_code=409, detail=str(e))
+        
+        async def generate_sse() -> AsyncGenerator[bytes, None]:
+            async for chunk in stream:
                 yield chunk
         
         return StreamingResponse(
@@ -48,3 +61,40 @@ async def chat_with_session(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sessions/{session_id}/events")
+async def watch_session_events(
+    session_id: str,
+    last_event_id: Optional[str] = Header(None),
+    session_service: SessionService = Depends(get_session_service),
+    stream_service: ChatStreamService = Depends(get_chat_stream_service)
+):
+    """Follow the session's in-progress generation from any worker without starting a new one"""
+    try:
+        session = await session_service.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        if last_event_id:
+            try:
+                stream = stream_service.resume(session_id, last_event_id)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            stream = stream_service.watch(session_id)
+        
+        return StreamingResponse(
+            stream,
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "*",
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 
 from domain.entities.session import SessionCreateRequest, SessionResponse, SessionListResponse
 from application.services.session_service import SessionService
 from presentation.schemas.response import APIResponse
+from presentation.dependencies import get_session_service
 
 router = APIRouter()
 
-async def get_session_service():
-    return SessionService()
-
 @router.put("/sessions", response_model=APIResponse)
 async def create_session(
     request: Optional[SessionCreateRequest] = None,
@@ -29,11 +28,27 @@ async def create_session(
 @router.get("/sessions/{session_id}", response_model=APIResponse)
 async def get_session(
     session_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     session_service: SessionService = Depends(get_session_service)
 ):
-    """Get session information including conversation history"""
+    """Get session information including conversation history.
+
+    With limit, events are returned one page at a time along with next_cursor.
+    With format=ndjson, the whole history is streamed line by line instead.
+    """
     try:
-        session_data = await session_service.get_session_with_events(session_id)
+        if format == "ndjson":
+            stream = await session_service.stream_session_events(session_id)
+            if stream is None:
+                raise HTTPException(status_code=404, detail="Session not found")
+            return StreamingResponse(stream, media_type="application/x-ndjson")
+        
+        try:
+            session_data = await session_service.get_session_with_events(session_id, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -49,11 +64,16 @@ async def get_session(
 
 @router.get("/sessions", response_model=APIResponse)
 async def list_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     session_service: SessionService = Depends(get_session_service)
 ):
-    """Get list of all sessions"""
+    """Get a page of sessions, newest first; pass next_cursor back to get the next page"""
     try:
-        sessions = await session_service.list_sessions()
+        try:
+            sessions, next_cursor = await session_service.list_sessions(limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         session_responses = [
             SessionResponse(
@@ -72,8 +92,10 @@ async def list_sessions(
         return APIResponse(
             code=0,
             msg="success",
-            data=SessionListResponse(sessions=session_responses).dict()
+            data=SessionListResponse(sessions=session_responses, next_cursor=next_cursor).dict()
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
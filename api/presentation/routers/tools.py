@@ -1,18 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncGenerator, Dict, Any, Optional
+import docker
 
-from domain.entities.tool import ShellRequest, ShellResponse, FileRequest, FileResponse
+from domain.entities.tool import ShellRequest, ShellResponse, ShellWriteRequest, ShellExecRequest, ShellBatchRequest, FileRequest, FileResponse
 from application.services.sandbox_service import SandboxService
 from application.services.session_service import SessionService
 from presentation.schemas.response import APIResponse
+from presentation.dependencies import get_sandbox_service, get_session_service
+from infrastructure import sse_encoder
+from infrastructure.config import get_settings
+from infrastructure.pty_shell import ShellOnOtherWorker, TooManyShells
+from infrastructure.sandbox_files import RangeNotSatisfiable, TooManySymlinks, UploadTooLarge, parse_range
+from infrastructure.vnc_relay import VncRelay, vnc_relay_metrics
 
 router = APIRouter()
-
-async def get_sandbox_service():
-    return SandboxService()
-
-async def get_session_service():
-    return SessionService()
+settings = get_settings()
 
 @router.post("/sessions/{session_id}/shell", response_model=APIResponse)
 async def view_shell_session(
@@ -28,28 +31,13 @@ async def view_shell_session(
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Execute shell command to get session output
-        result = await sandbox_service.execute_shell_command(
-            session_id, 
-            f"history | tail -20"  # Get recent command history
-        )
-        
-        # Parse console history (simplified)
-        console_history = []
-        if result.get("output"):
-            lines = result["output"].strip().split("\n")
-            for line in lines:
-                if line.strip():
-                    console_history.append({
-                        "ps1": "$ ",
-                        "command": line.strip(),
-                        "output": ""
-                    })
+        # Served from the shell's output buffer; nothing runs in the sandbox
+        result = await sandbox_service.view_shell(session_id, request.session_id)
         
         response_data = ShellResponse(
-            output=result.get("output", ""),
+            output=result["output"],
             session_id=request.session_id,
-            console=console_history
+            console=result["console"]
         )
         
         return APIResponse(
@@ -60,17 +48,125 @@ async def view_shell_session(
         
     except HTTPException:
         raise
+    except TooManyShells as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ShellOnOtherWorker as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/sessions/{session_id}/shell/write", response_model=APIResponse)
+async def write_shell_input(
+    session_id: str,
+    request: ShellWriteRequest,
+    sandbox_service: SandboxService = Depends(get_sandbox_service),
+    session_service: SessionService = Depends(get_session_service)
+):
+    """Send input to a persistent shell in the sandbox"""
+    try:
+        session = await session_service.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        await sandbox_service.write_shell(session_id, request.session_id, request.input, request.press_enter)
+        
+        return APIResponse(code=0, msg="success", data={"session_id": request.session_id})
+        
+    except HTTPException:
+        raise
+    except TooManyShells as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ShellOnOtherWorker as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/sessions/{session_id}/shell/exec")
+async def exec_shell_command(
+    session_id: str,
+    request: ShellExecRequest,
+    sandbox_service: SandboxService = Depends(get_sandbox_service),
+    session_service: SessionService = Depends(get_session_service)
+):
+    """Run a command in the sandbox and stream stdout/stderr as SSE, ending with an exit event"""
+    session = await session_service.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    async def generate_sse() -> AsyncGenerator[bytes, None]:
+        async for event, data in sandbox_service.stream_shell_command(
+            session_id,
+            request.command,
+            workdir=request.workdir,
+            max_output_bytes=request.max_output_bytes
+        ):
+            yield sse_encoder.encode(event, data)
+    
+    return StreamingResponse(
+        generate_sse(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+@router.post("/sessions/{session_id}/shell/batch")
+async def exec_shell_batch(
+    session_id: str,
+    request: ShellBatchRequest,
+    sandbox_service: SandboxService = Depends(get_sandbox_service),
+    session_service: SessionService = Depends(get_session_service)
+):
+    """Run several commands in the sandbox and stream a result event per command as each finishes"""
+    session = await session_service.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    try:
+        batch = sandbox_service.plan_command_batch(
+            [command.dict() for command in request.commands],
+            max_parallel=request.max_parallel
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def generate_sse() -> AsyncGenerator[bytes, None]:
+        counts = {"completed": 0, "failed": 0, "timed_out": 0, "skipped": 0}
+        try:
+            async for result in sandbox_service.run_command_batch(session_id, batch):
+                counts[result["status"]] += 1
+                yield sse_encoder.encode("result", result)
+            yield sse_encoder.encode("done", counts)
+        except Exception as e:
+            yield sse_encoder.encode("error", {"error": str(e)})
+    
+    return StreamingResponse(
+        generate_sse(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
 @router.post("/sessions/{session_id}/file", response_model=APIResponse)
 async def view_file_content(
     session_id: str,
     request: FileRequest,
+    response: Response,
+    range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
     sandbox_service: SandboxService = Depends(get_sandbox_service),
     session_service: SessionService = Depends(get_session_service)
 ):
-    """View file content in the sandbox environment"""
+    """View file content in the sandbox environment.
+
+    Honours a single bytes Range header. Full views carry an ETag, and a poll with
+    a matching If-None-Match gets 304 without the file being read again.
+    """
     try:
         # Verify session exists
         session = await session_service.get_session(session_id)
@@ -78,11 +174,23 @@ async def view_file_content(
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Read file from sandbox
-        result = await sandbox_service.read_file(session_id, request.file)
+        if range:
+            try:
+                result = await sandbox_service.read_file(session_id, request.file, byte_range=range)
+            except RangeNotSatisfiable as e:
+                return Response(status_code=416, content=str(e), headers={"Content-Range": f"bytes */{e.size}"})
+        else:
+            result, etag = await sandbox_service.read_file_cached(session_id, request.file, if_none_match)
+            if etag:
+                if result is None:
+                    return Response(status_code=304, headers={"ETag": etag})
+                response.headers["ETag"] = etag
         
         response_data = FileResponse(
             content=result.get("content", ""),
-            file=request.file
+            file=request.file,
+            size=result.get("size"),
+            truncated=result.get("truncated")
         )
         
         return APIResponse(
@@ -96,17 +204,96 @@ async def view_file_content(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sessions/{session_id}/file")
+async def download_file(
+    session_id: str,
+    path: str = Query(..., description="Absolute file path in the sandbox"),
+    range: Optional[str] = Header(None),
+    sandbox_service: SandboxService = Depends(get_sandbox_service),
+    session_service: SessionService = Depends(get_session_service)
+):
+    """Stream a file's raw bytes out of the sandbox, with single-range support"""
+    session = await session_service.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    try:
+        sandbox_file = await sandbox_service.open_file(session_id, path)
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail="File not found")
+    except (IsADirectoryError, TooManySymlinks) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        byte_range = parse_range(range, sandbox_file.size)
+    except ValueError as e:
+        await sandbox_file.close()
+        return Response(status_code=416, content=str(e), headers={"Content-Range": f"bytes */{sandbox_file.size}"})
+    
+    headers = {"Accept-Ranges": "bytes"}
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{sandbox_file.size}"
+        status_code = 206
+    else:
+        start, end = 0, sandbox_file.size - 1
+        status_code = 200
+    headers["Content-Length"] = str(end - start + 1)
+    
+    async def body() -> AsyncGenerator[bytes, None]:
+        # A large download can outlast the idle TTL; keep the sandbox from being reaped
+        async with sandbox_service.registry.keep_active(session_id):
+            async for chunk in sandbox_file.iter_range(start, end):
+                yield chunk
+    
+    return StreamingResponse(
+        body(),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers
+    )
+
+@router.put("/sessions/{session_id}/file", response_model=APIResponse)
+async def upload_file(
+    session_id: str,
+    request: Request,
+    path: str = Query(..., description="Absolute file path in the sandbox"),
+    sandbox_service: SandboxService = Depends(get_sandbox_service),
+    session_service: SessionService = Depends(get_session_service)
+):
+    """Write the raw request body to a file in the sandbox, streaming it in chunks"""
+    try:
+        session = await session_service.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        size = await sandbox_service.upload_file(session_id, path, request.stream())
+        
+        return APIResponse(code=0, msg="success", data={"file": path, "size": size})
+        
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except docker.errors.NotFound:
+        raise HTTPException(status_code=404, detail="Directory not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.websocket("/sessions/{session_id}/vnc")
 async def vnc_connection(
     websocket: WebSocket,
     session_id: str,
     sandbox_service: SandboxService = Depends(get_sandbox_service)
 ):
-    """Establish a VNC WebSocket connection to the session's sandbox environment"""
-    await websocket.accept()
+    """Relay the session's sandbox VNC server over a WebSocket"""
+    # noVNC asks for the "binary" subprotocol and refuses connections without it
+    subprotocol = "binary" if "binary" in websocket.scope.get("subprotocols", []) else None
+    await websocket.accept(subprotocol=subprotocol)
     
     try:
-        # Get VNC port for session
         vnc_port = await sandbox_service.get_vnc_port(session_id)
         if not vnc_port:
             # Create sandbox if it doesn't exist
@@ -117,17 +304,9 @@ async def vnc_connection(
             await websocket.close(code=1000, reason="VNC not available")
             return
         
-        # VNC WebSocket proxy implementation would go here
-        # This is a simplified version - in production, you'd need a proper VNC proxy
-        while True:
-            try:
-                data = await websocket.receive_bytes()
-                # Forward data to VNC server and send response back
-                # This requires implementing a VNC protocol proxy
-                await websocket.send_bytes(b"VNC proxy not fully implemented")
-                
-            except WebSocketDisconnect:
-                break
-                
+        relay = VncRelay(websocket, vnc_relay_metrics, touch=lambda: sandbox_service.registry.touch(session_id))
+        await relay.run(settings.sandbox_vnc_host, int(vnc_port), session_id)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        await websocket.close(code=1000, reason=f"Error: {str(e)}")
+        await websocket.close(code=1011, reason=f"Error: {str(e)}"[:120])
@@ -0,0 +1,54 @@
+"""Frames per second of the SSE encoder against the per-frame ChatEvent path it replaced.
+
+The baseline builds a ChatEvent, calls .dict() and json.dumps for every frame,
+as ChatService did before frames were encoded from byte templates.
+
+    python benchmarks/sse_encoder_bench.py [frames]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from domain.entities.message import ChatEvent
+from infrastructure import sse_encoder
+
+CONTENT = "Hello, this is a streamed token chunk"
+STEP = {"status": "running", "id": "step-1", "description": "Search the web"}
+
+def chat_event_message() -> bytes:
+    event = ChatEvent(event="message", data={"content": CONTENT, "partial": True})
+    return f"event: message\ndata: {json.dumps(event.dict())}\n\n".encode("utf-8")
+
+def chat_event_step() -> bytes:
+    event = ChatEvent(event="step", data=STEP)
+    return f"event: step\ndata: {json.dumps(event.dict())}\n\n".encode("utf-8")
+
+step_frame = sse_encoder.static_frame("step", STEP)
+
+CASES = [
+    ("message frame, ChatEvent + json.dumps", chat_event_message),
+    ("message frame, encode_message", lambda: sse_encoder.encode_message(CONTENT)),
+    ("message frame, encode", lambda: sse_encoder.encode("message", {"content": CONTENT, "partial": True})),
+    ("step frame, ChatEvent + json.dumps", chat_event_step),
+    ("step frame, StaticFrame.render", step_frame.render),
+    ("step frame + id, with_id", lambda: sse_encoder.with_id("12-345", step_frame.render())),
+]
+
+def frames_per_second(encode, frames: int) -> float:
+    started = time.perf_counter()
+    for _ in range(frames):
+        encode()
+    return frames / (time.perf_counter() - started)
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for name, encode in CASES:
+        # Warm caches (lru_cache'd prefixes, the timestamp) outside the timed loop
+        encode()
+        print(f"{name:40s} {frames_per_second(encode, frames):>12,.0f} frames/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Throughput and latency of the VNC WebSocket relay against a direct TCP baseline.
+
+A fake RFB server stands in for the sandbox's VNC server: after the version
+banner it either streams BULK_BYTES of framebuffer-like data or echoes what it
+receives. The relay runs behind uvicorn exactly as the /vnc route uses it.
+
+    python benchmarks/vnc_relay_bench.py
+
+Needs uvicorn and websockets (both in requirements.txt); no Docker or Redis.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from fastapi import FastAPI, WebSocket
+import uvicorn
+import websockets
+
+from infrastructure.vnc_relay import VncRelay, vnc_relay_metrics
+
+RFB_PORT = 15900
+HTTP_PORT = 18000
+CHUNK_BYTES = 256 * 1024
+BULK_BYTES = 512 * 1024 * 1024
+ECHO_ROUNDS = 2000
+
+async def fake_rfb(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    writer.write(b"RFB 003.008\n")
+    await writer.drain()
+    mode = await reader.readline()
+    if mode.startswith(b"PING"):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    else:
+        payload = b"x" * CHUNK_BYTES
+        for _ in range(BULK_BYTES // CHUNK_BYTES):
+            writer.write(payload)
+            await writer.drain()
+    writer.close()
+
+app = FastAPI()
+touches = 0
+
+async def touch():
+    global touches
+    touches += 1
+
+@app.websocket("/vnc")
+async def vnc(websocket: WebSocket):
+    await websocket.accept()
+    await VncRelay(websocket, vnc_relay_metrics, touch=touch).run("127.0.0.1", RFB_PORT, "bench")
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1e6
+
+async def relay_throughput() -> float:
+    async with websockets.connect(f"ws://127.0.0.1:{HTTP_PORT}/vnc", max_size=None) as ws:
+        await ws.recv()
+        await ws.send(b"BULK\n")
+        received = 0
+        started = time.perf_counter()
+        try:
+            while received < BULK_BYTES:
+                received += len(await ws.recv())
+        except websockets.ConnectionClosed:
+            pass
+        return received / (time.perf_counter() - started)
+
+async def direct_throughput() -> float:
+    reader, writer = await asyncio.open_connection("127.0.0.1", RFB_PORT)
+    await reader.readline()
+    writer.write(b"BULK\n")
+    await writer.drain()
+    received = 0
+    started = time.perf_counter()
+    while True:
+        data = await reader.read(1 << 20)
+        if not data:
+            break
+        received += len(data)
+    writer.close()
+    return received / (time.perf_counter() - started)
+
+async def relay_rtt() -> list:
+    async with websockets.connect(f"ws://127.0.0.1:{HTTP_PORT}/vnc") as ws:
+        await ws.recv()
+        await ws.send(b"PING\n")
+        samples = []
+        for _ in range(ECHO_ROUNDS):
+            started = time.perf_counter()
+            await ws.send(b"k" * 10)
+            await ws.recv()
+            samples.append(time.perf_counter() - started)
+        return sorted(samples)
+
+async def direct_rtt() -> list:
+    reader, writer = await asyncio.open_connection("127.0.0.1", RFB_PORT)
+    await reader.readline()
+    writer.write(b"PING\n")
+    await writer.drain()
+    samples = []
+    for _ in range(ECHO_ROUNDS):
+        started = time.perf_counter()
+        writer.write(b"k" * 10)
+        await writer.drain()
+        await reader.read(100)
+        samples.append(time.perf_counter() - started)
+    writer.close()
+    return sorted(samples)
+
+async def main():
+    rfb = await asyncio.start_server(fake_rfb, "127.0.0.1", RFB_PORT)
+    server = uvicorn.Server(uvicorn.Config(app, port=HTTP_PORT, log_level="warning", ws_max_size=16 * 1024 * 1024))
+    serving = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        print(f"relay throughput:  {await relay_throughput() / 1e6:8.0f} MB/s")
+        print(f"direct throughput: {await direct_throughput() / 1e6:8.0f} MB/s")
+        for name, samples in (("relay", await relay_rtt()), ("direct", await direct_rtt())):
+            print(f"{name} echo RTT: p50 {percentile(samples, 0.5):.0f}us p99 {percentile(samples, 0.99):.0f}us")
+        print(f"relay metrics: {vnc_relay_metrics.stats()} touches: {touches}")
+    finally:
+        server.should_exit = True
+        await serving
+        rfb.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
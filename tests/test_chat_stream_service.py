@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from application.services.chat_stream_service import ChatStreamService, TurnInProgress
+from infrastructure import sse_encoder
+from infrastructure.session_stream_broker import Subscription
+
+class MemoryBuffer:
+    def __init__(self):
+        self.entries = []
+        self.turn = 0
+        self.active = None
+
+    async def begin_turn(self, session_id):
+        self.turn += 1
+        if self.active is not None:
+            return None
+        self.active = self.turn
+        return self.turn
+
+    async def renew_turn(self, session_id):
+        pass
+
+    async def end_turn(self, session_id, turn):
+        if self.active == turn:
+            self.active = None
+
+    async def active_turn(self, session_id):
+        return self.active
+
+    async def append(self, session_id, event_id, event, frame):
+        self.entries.append((event_id, event, frame))
+
+    async def read_after(self, session_id, last_event_id):
+        after = tuple(map(int, last_event_id.split("-")))
+        return [entry for entry in self.entries if tuple(map(int, entry[0].split("-"))) > after]
+
+class LocalBroker:
+    def __init__(self):
+        self.subscriptions = set()
+
+    async def subscribe(self, session_id):
+        subscription = Subscription(session_id, 256)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    async def publish(self, session_id, event_id, event, frame):
+        for subscription in list(self.subscriptions):
+            subscription.offer((event_id, event, frame))
+
+class SlowChat:
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def process_chat_message(self, session_id, request):
+        yield sse_encoder.encode("message", {"content": "hi"})
+        await self.release.wait()
+        yield sse_encoder.encode("done", {})
+
+def _service() -> ChatStreamService:
+    service = ChatStreamService(broker=LocalBroker())
+    service.stream_buffer = MemoryBuffer()
+    return service
+
+async def _overlapping_turns():
+    service = _service()
+    chat = SlowChat()
+    first = await service.start_turn(chat, "s", None)
+    with pytest.raises(TurnInProgress):
+        await service.start_turn(chat, "s", None)
+    chat.release.set()
+    frames = [frame async for frame in first]
+    await asyncio.gather(*service.tasks)
+    # The session is free again once the first turn has finished
+    second = await service.start_turn(chat, "s", None)
+    await second.aclose()
+    await service.close()
+    return frames, service.stream_buffer.entries
+
+def test_overlapping_turn_is_rejected():
+    frames, entries = asyncio.run(_overlapping_turns())
+
+    assert [event for _, event, _ in entries] == ["message", "done"]
+    assert [event_id for event_id, _, _ in entries] == ["1-1", "1-2"]
+    assert len(frames) == 2
+
+async def _resume_after_done():
+    service = _service()
+    chat = SlowChat()
+    chat.release.set()
+    stream = await service.start_turn(chat, "s", None)
+    async for _ in stream:
+        pass
+    await asyncio.gather(*service.tasks)
+    last_id = service.stream_buffer.entries[-1][0]
+    # Far below the idle timeout: the finished turn has nothing left to follow
+    return await asyncio.wait_for(_collect(service.resume("s", last_id)), timeout=1)
+
+async def _collect(stream):
+    return [frame async for frame in stream]
+
+def test_resume_after_terminal_frame_returns_at_once():
+    assert asyncio.run(_resume_after_done()) == []
+
+async def _watch_after_done():
+    service = _service()
+    chat = SlowChat()
+    chat.release.set()
+    async for _ in await service.start_turn(chat, "s", None):
+        pass
+    await asyncio.gather(*service.tasks)
+    watcher = asyncio.ensure_future(_collect(service.watch("s")))
+    await asyncio.sleep(0.01)
+    async for _ in await service.start_turn(chat, "s", None):
+        pass
+    return await asyncio.wait_for(watcher, timeout=1)
+
+def test_watch_skips_a_finished_turn_and_follows_the_next():
+    frames = asyncio.run(_watch_after_done())
+
+    assert [frame.split(b"\n")[0] for frame in frames] == [b"id: 2-1", b"id: 2-2"]
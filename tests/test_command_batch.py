@@ -0,0 +1,22 @@
+import asyncio
+
+from application.services.command_batch import CommandBatch
+
+async def _collect(batch: CommandBatch, run):
+    return [result async for result in batch.results(run)]
+
+def test_cancelled_run_still_reports_and_releases_dependents():
+    batch = CommandBatch(
+        [{"id": "a"}, {"id": "b", "depends_on": ["a"]}, {"id": "c"}],
+        max_parallel=3
+    )
+
+    async def run(command):
+        if command["id"] == "a":
+            raise asyncio.CancelledError()
+        return {"id": command["id"], "status": "completed"}
+
+    results = asyncio.run(asyncio.wait_for(_collect(batch, run), timeout=5))
+
+    statuses = {result["id"]: result["status"] for result in results}
+    assert statuses == {"a": "failed", "b": "skipped", "c": "completed"}
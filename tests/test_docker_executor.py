@@ -0,0 +1,93 @@
+import asyncio
+import socket
+import threading
+import time
+
+from application.services.sandbox_service import SandboxService
+from infrastructure.docker_executor import DockerExecutor
+
+CREATES = 40
+CREATE_SECONDS = 0.2
+# Observed lag is a few milliseconds; the bound leaves room for slow CI hosts
+MAX_LOOP_LAG_SECONDS = 0.05
+
+class FakeContainer:
+    def __init__(self, name: str):
+        self.id = name
+        self.name = name
+
+    def reload(self):
+        time.sleep(0.01)
+
+class FakeContainers:
+    def run(self, image, **kwargs):
+        # Blocks the calling thread like the real SDK waiting on the daemon
+        time.sleep(CREATE_SECONDS)
+        return FakeContainer(kwargs["name"])
+
+class FakeDockerClient:
+    containers = FakeContainers()
+
+async def _measure_lag(stop: asyncio.Event) -> float:
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        expected = loop.time() + 0.001
+        await asyncio.sleep(0.001)
+        worst = max(worst, loop.time() - expected)
+    return worst
+
+async def _create_in_parallel():
+    executor = DockerExecutor(max_workers=CREATES, max_concurrency=CREATES)
+    service = SandboxService(docker_client=FakeDockerClient(), executor=executor)
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(_measure_lag(stop))
+    started = time.monotonic()
+    containers = await asyncio.gather(*[
+        service.start_container(f"sandbox-{index}", {}) for index in range(CREATES)
+    ])
+    elapsed = time.monotonic() - started
+    stop.set()
+    executor.pool.shutdown(wait=False)
+    return containers, elapsed, await lag
+
+def test_blocking_creates_do_not_stall_event_loop():
+    containers, elapsed, worst_lag = asyncio.run(_create_in_parallel())
+
+    assert len({container.id for container in containers}) == CREATES
+    # Creates overlap on the pool instead of running one after another
+    assert elapsed < CREATES * CREATE_SECONDS / 4
+    assert worst_lag < MAX_LOOP_LAG_SECONDS
+
+async def _abandon_blocked_iterate():
+    executor = DockerExecutor(max_workers=2, max_concurrency=2)
+    reader_end, writer_end = socket.socketpair()
+    reader_done = threading.Event()
+
+    def produce():
+        try:
+            while True:
+                # Blocks like a read from an exec socket with no output yet
+                data = reader_end.recv(1024)
+                if not data:
+                    return
+                yield data
+        finally:
+            reader_done.set()
+
+    def close():
+        reader_end.shutdown(socket.SHUT_RDWR)
+
+    stream = executor.iterate(produce, queue_size=4, timeout=None, close=close)
+    writer_end.sendall(b"first")
+    assert await stream.__anext__() == b"first"
+    # The consumer goes away while the reader is blocked in recv
+    await stream.aclose()
+    released = await asyncio.get_running_loop().run_in_executor(None, reader_done.wait, 5)
+    executor.stream_pool.shutdown(wait=False)
+    reader_end.close()
+    writer_end.close()
+    return released
+
+def test_abandoned_iterate_releases_its_reader_thread():
+    assert asyncio.run(_abandon_blocked_iterate())
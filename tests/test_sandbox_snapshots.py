@@ -0,0 +1,74 @@
+import asyncio
+import io
+
+import docker
+import pytest
+
+from infrastructure.docker_executor import DockerExecutor
+from infrastructure.sandbox_snapshots import SandboxSnapshotStore, config_changes
+
+DOCKERFILE = b"""FROM busybox
+ENV GREETING="hello world" PRICE=\\$5
+WORKDIR /srv/app
+USER nobody
+EXPOSE 5900/tcp 8080
+LABEL org.example.role=sandbox "org.example.note"="two words"
+VOLUME ["/data"]
+STOPSIGNAL SIGINT
+HEALTHCHECK --interval=30s --timeout=5s --retries=2 CMD test -d /srv/app
+ENTRYPOINT ["/bin/sh", "-c"]
+CMD ["sleep 3600"]
+"""
+
+# Fields of an image config that flattening must carry over
+KEPT = ["Env", "Entrypoint", "Cmd", "WorkingDir", "User", "ExposedPorts", "Labels", "Volumes", "StopSignal", "Healthcheck"]
+
+def test_config_changes_cover_every_field():
+    config = {
+        "Env": ["PATH=/usr/bin"],
+        "Entrypoint": ["/init"],
+        "Cmd": ["bash"],
+        "Shell": ["/bin/bash", "-c"],
+        "WorkingDir": "/home/ubuntu",
+        "User": "ubuntu",
+        "StopSignal": "SIGTERM",
+        "ExposedPorts": {"5900/tcp": {}},
+        "Volumes": {"/data": {}},
+        "Labels": {"role": "sandbox"},
+        "OnBuild": ["RUN true"],
+        "Healthcheck": {"Test": ["CMD", "true"], "Interval": 30_000_000_000}
+    }
+
+    instructions = {change.split(" ", 1)[0] for change in config_changes(config)}
+
+    assert instructions == {
+        "ENV", "ENTRYPOINT", "CMD", "SHELL", "WORKDIR", "USER", "STOPSIGNAL",
+        "EXPOSE", "VOLUME", "LABEL", "ONBUILD", "HEALTHCHECK"
+    }
+    assert config_changes({}) == []
+
+def _docker() -> docker.DockerClient:
+    try:
+        client = docker.from_env()
+        client.ping()
+        return client
+    except Exception:
+        pytest.skip("needs a Docker daemon")
+
+def test_flatten_keeps_image_config():
+    client = _docker()
+    image, _ = client.images.build(fileobj=io.BytesIO(DOCKERFILE), rm=True)
+    container = client.containers.create(image.id)
+    flattened = None
+    try:
+        store = SandboxSnapshotStore(client, DockerExecutor())
+        base = {"config": image.attrs["Config"]}
+        flattened = asyncio.run(store._flatten(container, base))
+        before = {field: image.attrs["Config"].get(field) for field in KEPT}
+        after = {field: flattened.attrs["Config"].get(field) for field in KEPT}
+        assert after == before
+    finally:
+        container.remove(force=True)
+        if flattened is not None:
+            client.images.remove(flattened.id, force=True)
+        client.images.remove(image.id, force=True)
@@ -0,0 +1,36 @@
+import asyncio
+
+from infrastructure.tool_result_cache import ToolResultCache
+
+class MissingRedis:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, expire=None):
+        pass
+
+async def _cancel_leader():
+    cache = ToolResultCache(MissingRedis())
+    runs = []
+
+    async def run():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"success": True, "run": len(runs)}
+
+    leader = asyncio.ensure_future(cache.get_or_run("tool", "key", 10, run))
+    await asyncio.sleep(0.01)
+    follower = asyncio.ensure_future(cache.get_or_run("tool", "key", 10, run))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    leader_result = (await asyncio.gather(leader, return_exceptions=True))[0]
+    return leader_result, await follower, runs
+
+def test_cancelled_leader_does_not_cancel_followers():
+    leader_result, (output, source), runs = asyncio.run(_cancel_leader())
+
+    assert isinstance(leader_result, asyncio.CancelledError)
+    # The follower ran the tool itself instead of inheriting the cancellation
+    assert output == {"success": True, "run": 2}
+    assert source is None
+    assert len(runs) == 2